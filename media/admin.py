@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import Media, OneWeekVideoStatics
+from .models import Media, MediaEngagementBucket, OneWeekVideoStatics
 
 # Register your models here.
 admin.site.register(Media)
-admin.site.register(OneWeekVideoStatics)
\ No newline at end of file
+admin.site.register(OneWeekVideoStatics)
+admin.site.register(MediaEngagementBucket)
\ No newline at end of file
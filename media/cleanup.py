@@ -0,0 +1,59 @@
+import atexit
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from pororohub.counters import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+
+def delete_files(storage, names):
+    """저장소에 delete_many 가 있으면 (R2) 한꺼번에, 아니면 하나씩 삭제"""
+    if hasattr(storage, 'delete_many'):
+        storage.delete_many(names)
+        return
+    for name in names:
+        storage.delete(name)
+
+
+class FileDeleter(WriteBehindBuffer):
+    """
+    삭제된 행의 파일을 커밋 후에 모아서 백그라운드 스레드에서 저장소별로 한꺼번에 지운다.
+    연쇄 삭제(사용자 -> 게시글/미디어)는 행마다 post_delete 를 보내므로 여기서 모아야
+    R2 에는 파일마다가 아니라 1000개마다 DeleteObjects 요청 하나만 간다.
+    FILE_DELETE_FLUSH_INTERVAL 초마다, 그리고 종료할 때 한 번 더 비운다
+    """
+    interval_setting = 'FILE_DELETE_FLUSH_INTERVAL'
+
+    def __init__(self):
+        super().__init__('file-delete')
+        self._pending = defaultdict(set) # storage -> 파일 이름
+
+    def delete_on_commit(self, field_file):
+        """FieldFile 의 파일을 현재 트랜잭션이 커밋되면 삭제 (롤백되면 그대로 둠)"""
+        if not field_file:
+            return
+        storage, name = field_file.storage, field_file.name
+        transaction.on_commit(lambda: self.add(storage, name))
+
+    def add(self, storage, name):
+        with self._lock:
+            self._pending[storage].add(name)
+        self._ensure_worker()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, defaultdict(set)
+
+        for storage, names in batch.items():
+            try:
+                delete_files(storage, sorted(names))
+            except Exception:
+                # 지우지 못한 파일은 고아로 남을 뿐이므로 다시 쌓지 않음
+                logger.exception('Failed to delete %d files from %s', len(names), type(storage).__name__)
+
+
+file_deleter = FileDeleter()
+atexit.register(file_deleter.flush)
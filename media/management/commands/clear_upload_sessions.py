@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from media.models import UploadSession
+from media.uploads import remove_upload_files, session_paths
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired resumable upload sessions and their partial files'
+
+    def handle(self, *args, **options):
+        expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+        removed = 0
+        for session in expired.iterator():
+            part, final = session_paths(session)
+            remove_upload_files(part)
+            session.delete()
+            removed += 1
+        self.stdout.write(f'Removed {removed} expired upload sessions')
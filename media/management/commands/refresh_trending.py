@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from media.trending import rebuild_trending, refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Folds new hourly engagement buckets into OneWeekVideoStatics and expires old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every score from the buckets, e.g. after changing weights')
+
+    def handle(self, *args, **options):
+        applied, expired = (rebuild_trending if options['rebuild'] else refresh_trending)()
+        self.stdout.write(f'Applied {applied} buckets, expired {expired}')
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_taxonomy(apps, schema_editor):
+    from media.models import normalize_category, split_tags
+
+    Media = apps.get_model('media', 'Media')
+    MediaTag = apps.get_model('media', 'MediaTag')
+    MediaCategory = apps.get_model('media', 'MediaCategory')
+    rows = list(Media.objects.values_list('id', 'tags', 'category'))
+
+    tag_names = {name for _, tags, _ in rows for name in split_tags(tags)}
+    MediaTag.objects.bulk_create([MediaTag(name=name) for name in tag_names], ignore_conflicts=True)
+    tag_ids = dict(MediaTag.objects.values_list('name', 'id'))
+    categories = {normalize_category(category) for _, _, category in rows} - {''}
+    MediaCategory.objects.bulk_create([MediaCategory(name=name) for name in categories], ignore_conflicts=True)
+    category_ids = dict(MediaCategory.objects.values_list('name', 'id'))
+
+    Through = Media.tag_set.through
+    Through.objects.bulk_create([
+        Through(media_id=media_id, mediatag_id=tag_ids[name])
+        for media_id, tags, _ in rows for name in split_tags(tags)
+    ], batch_size=1000, ignore_conflicts=True)
+    for media_id, _, category in rows:
+        category = normalize_category(category)
+        if category:
+            Media.objects.filter(pk=media_id).update(media_category=category_ids[category])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actor', '0004_alter_actor_id'),
+        ('media', '0005_media_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MediaTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='media_category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='media', to='media.mediacategory'),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='media', to='media.mediatag'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['is_video', 'length'], name='media_media_is_vide_462fd5_idx'),
+        ),
+        migrations.RunPython(backfill_taxonomy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:42
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actor', '0004_alter_actor_id'),
+        ('media', '0006_mediacategory_mediatag_media_media_category_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='media',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='media_title_trgm'),
+        ),
+    ]
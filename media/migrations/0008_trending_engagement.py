@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0007_media_media_title_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refreshed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='oneweekvideostatics',
+            name='dislikes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='oneweekvideostatics',
+            name='likes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='oneweekvideostatics',
+            name='score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='oneweekvideostatics',
+            name='views',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='oneweekvideostatics',
+            name='points',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='MediaEngagementBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('dislikes', models.IntegerField(default=0)),
+                ('applied_views', models.IntegerField(default=0)),
+                ('applied_likes', models.IntegerField(default=0)),
+                ('applied_dislikes', models.IntegerField(default=0)),
+                ('dirty', models.BooleanField(default=True)),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagement_buckets', to='media.media')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='media_media_hour_913ffd_idx'), models.Index(condition=models.Q(('dirty', True)), fields=['hour'], name='engagement_bucket_dirty')],
+                'constraints': [models.UniqueConstraint(fields=('media', 'hour'), name='media_engagement_bucket_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:54
+
+import media.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0009_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='content_type',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='file',
+            field=models.FileField(blank=True, editable=False, max_length=255, null=True, storage=media.storage.media_storage, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+import math
+
+from django.conf import settings
+from django.db import migrations
+
+
+def anchor_scores(apps, schema_editor):
+    # 이전 점수는 마지막 갱신 시점의 감쇠 점수이므로 그 시점 기준 로그 값으로 바꿈
+    OneWeekVideoStatics = apps.get_model('media', 'OneWeekVideoStatics')
+    TrendingWatermark = apps.get_model('media', 'TrendingWatermark')
+    watermark = TrendingWatermark.objects.filter(pk=1).first()
+    if watermark is None or watermark.refreshed_at is None:
+        return
+    half_lives = watermark.refreshed_at.timestamp() / (settings.TRENDING_HALF_LIFE_HOURS * 60 * 60)
+    rows = list(OneWeekVideoStatics.objects.exclude(score=0))
+    for statics in rows:
+        statics.score = math.copysign(math.log2(abs(statics.score)) + half_lives, statics.score)
+    OneWeekVideoStatics.objects.bulk_update(rows, ['score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0010_media_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(anchor_scores, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,40 @@
+from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Upper
 
 from actor.models import Actor
+from .storage import media_storage
+
+
+def split_tags(tags):
+    """콤마로 구분된 태그 문자열 -> 정규화된(소문자, 중복 제거) 태그 이름 목록"""
+    names = []
+    for name in (tags or '').split(','):
+        name = name.strip().lower()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def normalize_category(category):
+    return (category or '').strip().lower()[:100]
+
+
+class MediaTag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class MediaCategory(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
 
 # Create your models here.
 class Media(models.Model):
@@ -16,8 +50,114 @@ class Media(models.Model):
     dislikes = models.IntegerField(default=0)
     views = models.IntegerField(default=0)
     length = models.IntegerField(default=0)
+    # 원본 파일 (업로드 핸들러가 저장하면서 계산한 값들)
+    file = models.FileField(storage=media_storage, max_length=255, null=True, blank=True, editable=False)
+    content_type = models.CharField(max_length=100, null=True, blank=True, editable=False) # 매직 바이트로 판별한 형식
+    file_size = models.BigIntegerField(null=True, blank=True, editable=False)
+    sha256 = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    # tags, category 텍스트 컬럼을 정규화해서 저장 (save 시 자동 동기화, 검색 필터용)
+    tag_set = models.ManyToManyField(MediaTag, related_name='media', blank=True)
+    media_category = models.ForeignKey(MediaCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='media')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_video', 'length']),
+            # title__icontains는 UPPER(title) LIKE '%q%'로 실행되므로 같은 식에 트라이그램 인덱스
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='media_title_trgm'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 불러올 때의 tags, category 값을 기억해 두고 바뀌었을 때만 동기화
+        if 'tags' in instance.__dict__ and 'category' in instance.__dict__:
+            instance._synced_taxonomy = (instance.tags, instance.category)
+        if 'likes' in instance.__dict__ and 'dislikes' in instance.__dict__:
+            instance._recorded_reactions = (instance.likes, instance.dislikes)
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if getattr(self, '_synced_taxonomy', None) != (self.tags, self.category):
+            self.sync_taxonomy()
+
+        # 좋아요/싫어요 변화량을 트렌딩 집계용 시간 버킷에 기록
+        likes, dislikes = getattr(self, '_recorded_reactions', (0, 0))
+        if (self.likes, self.dislikes) != (likes, dislikes):
+            from .trending import record_engagement
+            record_engagement({self.pk: (0, self.likes - likes, self.dislikes - dislikes)})
+            self._recorded_reactions = (self.likes, self.dislikes)
+
+    def sync_taxonomy(self):
+        names = split_tags(self.tags)
+        existing = {tag.name: tag for tag in MediaTag.objects.filter(name__in=names)}
+        missing = [MediaTag(name=name) for name in names if name not in existing]
+        if missing:
+            MediaTag.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = {tag.name: tag for tag in MediaTag.objects.filter(name__in=names)}
+        self.tag_set.set([existing[name] for name in names])
+
+        category = normalize_category(self.category)
+        category_id = MediaCategory.objects.get_or_create(name=category)[0].pk if category else None
+        if category_id != self.media_category_id:
+            Media.objects.filter(pk=self.pk).update(media_category=category_id)
+            self.media_category_id = category_id
+
+        self._synced_taxonomy = (self.tags, self.category)
 
 
 class OneWeekVideoStatics(models.Model):
     id = models.OneToOneField(Media, on_delete=models.CASCADE, primary_key=True)
-    points = models.IntegerField()
\ No newline at end of file
+    # 최근 TRENDING_WINDOW_DAYS 동안의 가중 참여 합계(감쇠 없음)
+    points = models.IntegerField(default=0)
+    # 시간 감쇠를 적용한 트렌딩 점수를 시간 기준 로그 값으로 저장 (trending.anchored_score, 정렬에 사용)
+    score = models.FloatField(default=0, db_index=True)
+    views = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    dislikes = models.IntegerField(default=0)
+
+
+class MediaEngagementBucket(models.Model):
+    """
+    미디어별 한 시간 단위 조회/좋아요/싫어요 집계.
+    applied_* 는 이미 OneWeekVideoStatics에 반영된 값이고, dirty 는 반영 이후 값이 바뀌었다는 표시
+    """
+    media = models.ForeignKey(Media, on_delete=models.CASCADE, related_name='engagement_buckets')
+    hour = models.DateTimeField()
+    views = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    dislikes = models.IntegerField(default=0)
+    applied_views = models.IntegerField(default=0)
+    applied_likes = models.IntegerField(default=0)
+    applied_dislikes = models.IntegerField(default=0)
+    dirty = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['media', 'hour'], name='media_engagement_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+            # 갱신할 버킷만 빠르게 찾기 위한 부분 인덱스
+            models.Index(fields=['hour'], condition=Q(dirty=True), name='engagement_bucket_dirty'),
+        ]
+
+
+class TrendingWatermark(models.Model):
+    """트렌딩 집계를 마지막으로 갱신한 시각 (pk=1 한 행만 사용)"""
+    refreshed_at = models.DateTimeField(null=True)
+
+
+class UploadSession(models.Model):
+    """
+    이어올리기(resumable) 업로드 세션. 청크는 upload/<type>/<id>/original.<ext>.part 의
+    해당 위치에 바로 쓰이고, 받은 바이트 구간만 received 에 기록한다
+    """
+    id = models.TextField(primary_key=True) # 완료되면 그대로 Media id가 됨
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=200)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    received = models.JSONField(default=list) # 받은 구간 [[시작, 끝), ...] (정렬, 병합된 상태)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
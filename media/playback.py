@@ -0,0 +1,100 @@
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import CloudflareR2Storage
+from .uploads import READ_SIZE
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Range 헤더 -> (start, end) (end 는 포함하지 않음).
+    형식이 틀렸거나 여러 구간이면 None (무시하고 전체 응답), 파일 범위를 벗어나면 False (416)
+    """
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first: # 'bytes=-500': 마지막 500 바이트
+        if int(last) == 0 or size == 0:
+            return False
+        return max(size - int(last), 0), size
+    start = int(first)
+    if start >= size:
+        return False
+    if last and int(last) < start:
+        return None
+    return start, min(int(last) + 1, size) if last else size
+
+
+def if_range_matches(request, etag, last_modified):
+    """If-Range 가 없거나 현재 파일과 같을 때만 Range 를 따름 (다르면 전체를 다시 보냄)"""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag # 약한 ETag 는 Range 에 쓸 수 없음
+    return parse_http_date_safe(value) == last_modified
+
+
+def read_range(storage, name, start, length):
+    # 첫 조각을 보낼 때 파일을 열기 때문에 본문을 보내지 않는 응답(HEAD, 끊긴 연결)은 파일을 열지 않음
+    file = storage.open(name)
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def playback_response(request, media):
+    """
+    권한 확인이 끝난 미디어의 원본을 보내는 응답.
+    MEDIA_ACCEL_REDIRECT 이고 로컬 저장소면 nginx 에 X-Accel-Redirect 로 넘겨서 sendfile 로 보내게 하고
+    (Range/If-Range/ETag 도 nginx 가 처리), 아니면 Django 가 요청한 구간만 읽어서 스트리밍한다.
+    R2 파일은 Range GET 으로 그 구간만 받아오므로 탐색할 때 파일 전체를 옮기지 않음
+    """
+    storage = media.file.storage
+    if settings.MEDIA_ACCEL_REDIRECT and not isinstance(storage, CloudflareR2Storage):
+        response = HttpResponse(content_type=media.content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(media.file.name)
+        return response
+
+    etag = '"{}"'.format(media.sha256 or '{}-{}'.format(media.pk, media.file_size))
+    last_modified = int(media.uploaded_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        size = media.file_size if media.file_size is not None else storage.size(media.file.name)
+        byte_range = None
+        if if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+        else:
+            start, end = byte_range or (0, size)
+            response = StreamingHttpResponse(
+                read_range(storage, media.file.name, start, end - start), status=206 if byte_range else 200,
+                content_type=media.content_type or 'application/octet-stream'
+            )
+            response['Content-Length'] = end - start
+            if byte_range:
+                response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end - 1, size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private'
+    return response
@@ -1,11 +1,19 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Media, OneWeekVideoStatics
 
 class MediaSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField() # 저장 경로 대신 권한을 확인하는 재생 API 주소
+
     class Meta:
         model = Media
-        exclude = ('is_video',)
-        read_only_fields = ('id', 'actor', 'uploaded_at', 'is_video')
+        exclude = ('is_video', 'tag_set', 'media_category')
+        read_only_fields = ('id', 'actor', 'uploaded_at', 'is_video', 'views', 'likes', 'dislikes') # 반응 수는 트렌딩 점수에 쓰이므로 직접 고칠 수 없음
+
+    def get_file(self, obj):
+        if not obj.file:
+            return None
+        return reverse('play-video' if obj.is_video else 'photo-file', kwargs={'mid': obj.pk})
 
 class OneWeekVideoStaticsSerializer(serializers.ModelSerializer):
     class Meta:
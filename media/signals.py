@@ -0,0 +1,27 @@
+import logging
+
+from django.db import DatabaseError
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from pororohub.counters import views_flushed
+from .cleanup import file_deleter
+from .models import Media
+from .trending import record_engagement
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(views_flushed, sender=Media)
+def record_view_engagement(sender, counts, **kwargs):
+    # 조회수는 이미 반영됐으므로 버킷 기록에 실패해도 트렌딩 집계만 조금 덜 정확해질 뿐
+    try:
+        record_engagement({media_id: (amount, 0, 0) for media_id, amount in counts.items()})
+    except DatabaseError:
+        logger.exception('Failed to record view engagement for %d media', len(counts))
+
+
+# 연쇄 삭제로 지워진 미디어도 포함. 파일은 커밋 후 다른 파일들과 함께 한꺼번에 삭제
+@receiver(post_delete, sender=Media)
+def delete_media_file(sender, instance, **kwargs):
+    file_deleter.delete_on_commit(instance.file)
@@ -1,39 +1,304 @@
+import io
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-from django.core.files.storage import Storage
-from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.core.files.base import File
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-class CloudflareR2Storage(Storage):
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 1000 # DeleteObjects 요청 하나에 넣을 수 있는 최대 키 수
+
+
+class OperationMetrics:
+    """
+    S3 API 호출별 횟수, 실패 수, 지연 시간(합계/최대)을 프로세스마다 집계.
+    botocore 이벤트에 붙이므로 멀티파트/Range 요청까지 모든 호출이 잡힌다.
+    get_object 는 응답 헤더를 받을 때까지의 시간 (본문 스트리밍 제외)
+    """
     def __init__(self):
-        self.access_key = settings.CLOUDFLARE_R2_ACCESS_KEY_ID
-        self.secret_key = settings.CLOUDFLARE_R2_SECRET_ACCESS_KEY
-        self.bucket_name = settings.CLOUDFLARE_R2_BUCKET_NAME
-        self.endpoint_url = settings.CLOUDFLARE_R2_ENDPOINT_URL
-        self.custom_domain = settings.CLOUDFLARE_R2_CUSTOM_DOMAIN
-        
-        if self.access_key and self.secret_key and self.bucket_name and self.endpoint_url:
-            self.client = boto3.client(
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: [0, 0, 0.0, 0.0])
+
+    def register(self, client):
+        client.meta.events.register('before-call.s3', self.before_call)
+        client.meta.events.register('after-call.s3', self.after_call)
+        client.meta.events.register('after-call-error.s3', self.after_call_error)
+
+    def before_call(self, model, context, **kwargs):
+        context['metrics_started'] = (model.name, time.monotonic())
+
+    def after_call(self, http_response, context, **kwargs):
+        self.record(context, failed=http_response.status_code >= 500)
+
+    def after_call_error(self, context, **kwargs): # 연결 실패 등 응답을 받지 못한 경우
+        self.record(context, failed=True)
+
+    def record(self, context, failed):
+        operation, started = context.pop('metrics_started', (None, None))
+        if operation is None:
+            return
+        elapsed = time.monotonic() - started
+        with self._lock:
+            stats = self._stats[operation]
+            stats[0] += 1
+            stats[1] += failed
+            stats[2] += elapsed
+            stats[3] = max(stats[3], elapsed)
+        if elapsed >= settings.R2_SLOW_OPERATION_SECONDS:
+            logger.warning('Slow R2 %s: %.2fs', operation, elapsed)
+
+    def snapshot(self, reset=False):
+        """{operation: {'count', 'failed', 'avg_ms', 'max_ms'}}"""
+        with self._lock:
+            stats = self._stats
+            if reset:
+                self._stats = defaultdict(lambda: [0, 0, 0.0, 0.0])
+            return {
+                operation: {
+                    'count': count, 'failed': failed,
+                    'avg_ms': total / count * 1000 if count else 0.0, 'max_ms': longest * 1000,
+                }
+                for operation, (count, failed, total, longest) in stats.items()
+            }
+
+
+operation_metrics = OperationMetrics()
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def r2_client(endpoint_url, access_key, secret_key):
+    """
+    같은 설정의 클라이언트를 프로세스 안에서 공유 (boto3 클라이언트는 스레드 안전).
+    연결 풀(R2_MAX_POOL_CONNECTIONS)과 keep-alive 연결을 스토리지 인스턴스마다 새로 만들지 않음
+    """
+    global _clients_pid
+    with _clients_lock:
+        # 포크된 gunicorn 워커는 부모 프로세스의 연결을 물려받지 않도록 새로 만든다
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        key = (endpoint_url, access_key, secret_key)
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = boto3.session.Session().client(
                 's3',
-                endpoint_url=self.endpoint_url,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-                region_name='auto'
+                endpoint_url=endpoint_url,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name='auto',
+                config=Config(
+                    max_pool_connections=settings.R2_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    retries={'mode': 'standard'},
+                ),
             )
+            operation_metrics.register(client)
+        return client
+
+
+class MultipartUpload:
+    """
+    R2 멀티파트 업로드. write()로 받은 데이터를 R2_PART_SIZE 파트로 잘라 여러 스레드에서 동시에 올린다.
+    올라가는 중인 파트가 R2_UPLOAD_CONCURRENCY 개면 write()가 하나 끝날 때까지 기다리므로
+    메모리에는 (R2_UPLOAD_CONCURRENCY + 1) 파트까지만 있음
+    """
+    def __init__(self, storage, name, content_type):
+        self.storage = storage
+        self.name = name
+        self.upload_id = storage.client.create_multipart_upload(
+            Bucket=storage.bucket_name, Key=name, ContentType=content_type
+        )['UploadId']
+        self.slots = threading.BoundedSemaphore(settings.R2_UPLOAD_CONCURRENCY)
+        self.executor = ThreadPoolExecutor(max_workers=settings.R2_UPLOAD_CONCURRENCY, thread_name_prefix='r2-upload')
+        self.futures = []
+        self.buffer = bytearray()
+        self.error = None
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= settings.R2_PART_SIZE:
+            self.submit(bytes(self.buffer[:settings.R2_PART_SIZE]))
+            del self.buffer[:settings.R2_PART_SIZE]
+
+    def submit(self, body):
+        self.slots.acquire()
+        if self.error is not None: # 앞 파트가 실패했으면 나머지는 올리지 않음
+            self.slots.release()
+            raise self.error
+        future = self.executor.submit(self.upload_part, len(self.futures) + 1, body)
+        future.add_done_callback(self.part_done)
+        self.futures.append(future)
+
+    def upload_part(self, number, body):
+        response = self.storage.client.upload_part(
+            Bucket=self.storage.bucket_name, Key=self.name, UploadId=self.upload_id, PartNumber=number, Body=body
+        )
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def part_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.error = future.exception()
+        self.slots.release()
+
+    def close(self):
+        try:
+            if self.buffer or not self.futures: # 마지막 파트는 R2_PART_SIZE 보다 작아도 됨
+                self.submit(bytes(self.buffer))
+                self.buffer = bytearray()
+            parts = [future.result() for future in self.futures]
+            self.storage.client.complete_multipart_upload(
+                Bucket=self.storage.bucket_name, Key=self.name, UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            self.abort()
+            raise
+        self.executor.shutdown()
+
+    def abort(self):
+        self.executor.shutdown(cancel_futures=True)
+        self.buffer = bytearray()
+        self.storage.client.abort_multipart_upload(
+            Bucket=self.storage.bucket_name, Key=self.name, UploadId=self.upload_id
+        )
+
+
+class RangedReader(io.RawIOBase):
+    """
+    R2 객체를 필요할 때만 받아오는 읽기 전용 파일. 처음 읽을 때 현재 위치부터 끝까지
+    Range GET 하나를 열어 스트리밍으로 읽고, 다른 위치로 seek 하면 그 응답을 닫고
+    다음 읽기에서 새 위치부터 다시 요청한다
+    """
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+        self.position = 0
+        self.body = None
+        self._size = None
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self.storage.size(self.name)
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position {}".format(offset))
+        if offset != self.position:
+            self.close_body()
+            self.position = offset
+        return self.position
+
+    def readinto(self, buffer):
+        if self._size is not None and self.position >= self._size:
+            return 0
+        if self.body is None:
+            try:
+                response = self.storage.client.get_object(
+                    Bucket=self.storage.bucket_name, Key=self.name, Range='bytes={}-'.format(self.position)
+                )
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') == 'InvalidRange': # 끝 이후를 요청
+                    return 0
+                raise Exception(f"Failed to download from R2: {str(e)}")
+            # 'bytes 0-99/100' 의 전체 크기 (HEAD 요청 없이 알 수 있음)
+            content_range = response.get('ContentRange')
+            if content_range:
+                self._size = int(content_range.rsplit('/', 1)[1])
+            self.body = response['Body']
+        data = self.body.read(len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def close_body(self):
+        if self.body is not None:
+            self.body.close()
+            self.body = None
+
+    def close(self):
+        self.close_body()
+        super().close()
+
+
+class R2File(File):
+    """RangedReader를 R2_READ_BUFFER_SIZE 단위로 미리 읽는 Django File"""
+    def __init__(self, storage, name):
+        self.reader = RangedReader(storage, name)
+        super().__init__(io.BufferedReader(self.reader, buffer_size=settings.R2_READ_BUFFER_SIZE), name=name)
+        self.mode = 'rb'
+
+    @property
+    def size(self):
+        return self.reader.size
+
+
+class CloudflareR2Storage(Storage):
+    """
+    인자를 주면 설정 대신 사용 (endpoint_url 로 MinIO 등 S3 호환 서버를 가리켜 로컬에서 테스트할 때)
+    """
+    def __init__(self, access_key=None, secret_key=None, bucket_name=None, endpoint_url=None, custom_domain=None):
+        self.access_key = access_key or getattr(settings, 'CLOUDFLARE_R2_ACCESS_KEY_ID', '')
+        self.secret_key = secret_key or getattr(settings, 'CLOUDFLARE_R2_SECRET_ACCESS_KEY', '')
+        self.bucket_name = bucket_name or getattr(settings, 'CLOUDFLARE_R2_BUCKET_NAME', '')
+        self.endpoint_url = endpoint_url or getattr(settings, 'CLOUDFLARE_R2_ENDPOINT_URL', '')
+        self.custom_domain = custom_domain or getattr(settings, 'CLOUDFLARE_R2_CUSTOM_DOMAIN', '')
+
+        if self.access_key and self.secret_key and self.bucket_name and self.endpoint_url:
+            self.client = r2_client(self.endpoint_url, self.access_key, self.secret_key)
         else:
             self.client = None
 
     def _save(self, name, content):
         if not self.client:
             raise ValueError("Cloudflare R2 credentials not configured")
-        
+
+        content_type = content.content_type if hasattr(content, 'content_type') else 'application/octet-stream'
         try:
-            self.client.put_object(
-                Bucket=self.bucket_name,
-                Key=name,
-                Body=content.read(),
-                ContentType=content.content_type if hasattr(content, 'content_type') else 'application/octet-stream'
-            )
+            # 작은 파일은 PUT 한 번, 큰 파일은 파트 단위로 나눠 올려 전체를 메모리에 올리지 않음
+            if content.size is not None and content.size <= settings.R2_MULTIPART_THRESHOLD:
+                self.client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=name,
+                    Body=b''.join(content.chunks()),
+                    ContentType=content_type
+                )
+                return name
+
+            upload = MultipartUpload(self, name, content_type)
+            try:
+                for chunk in content.chunks():
+                    upload.write(chunk)
+            except BaseException:
+                upload.abort()
+                raise
+            upload.close()
             return name
         except ClientError as e:
             raise Exception(f"Failed to upload to R2: {str(e)}")
@@ -41,26 +306,74 @@ class CloudflareR2Storage(Storage):
     def _open(self, name, mode='rb'):
         if not self.client:
             raise ValueError("Cloudflare R2 credentials not configured")
-        
-        try:
-            response = self.client.get_object(Bucket=self.bucket_name, Key=name)
-            return ContentFile(response['Body'].read())
-        except ClientError as e:
-            raise Exception(f"Failed to download from R2: {str(e)}")
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError("R2 files can only be opened for reading")
+
+        return R2File(self, name)
 
     def delete(self, name):
         if not self.client:
             raise ValueError("Cloudflare R2 credentials not configured")
-        
+
         try:
             self.client.delete_object(Bucket=self.bucket_name, Key=name)
         except ClientError as e:
             raise Exception(f"Failed to delete from R2: {str(e)}")
 
+    def delete_many(self, names):
+        """여러 파일을 DeleteObjects 요청 하나당 DELETE_BATCH_SIZE 개씩 삭제"""
+        if not self.client:
+            raise ValueError("Cloudflare R2 credentials not configured")
+
+        names = list(dict.fromkeys(names))
+        for i in range(0, len(names), DELETE_BATCH_SIZE):
+            try:
+                response = self.client.delete_objects(Bucket=self.bucket_name, Delete={
+                    'Objects': [{'Key': name} for name in names[i:i + DELETE_BATCH_SIZE]],
+                    'Quiet': True,
+                })
+            except ClientError as e:
+                raise Exception(f"Failed to delete from R2: {str(e)}")
+            errors = response.get('Errors')
+            if errors:
+                raise Exception(f"Failed to delete {len(errors)} files from R2: {errors[0].get('Message')}")
+
+    def head_many(self, names):
+        """{name: head_object 응답 또는 없으면 None}. R2_BATCH_CONCURRENCY 개의 요청을 동시에 보냄"""
+        if not self.client:
+            raise ValueError("Cloudflare R2 credentials not configured")
+
+        def head(name):
+            try:
+                return self.client.head_object(Bucket=self.bucket_name, Key=name)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                    return None
+                raise Exception(f"Failed to get file info from R2: {str(e)}")
+
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(settings.R2_BATCH_CONCURRENCY, len(names))) as executor:
+            return dict(zip(names, executor.map(head, names)))
+
+    def exists_many(self, names):
+        """{name: 존재 여부}"""
+        if not self.client:
+            return {name: False for name in names}
+        return {name: response is not None for name, response in self.head_many(names).items()}
+
+    def size_many(self, names):
+        """{name: 크기, 없는 파일은 None}"""
+        return {
+            name: response['ContentLength'] if response is not None else None
+            for name, response in self.head_many(names).items()
+        }
+
     def exists(self, name):
         if not self.client:
             return False
-        
+
         try:
             self.client.head_object(Bucket=self.bucket_name, Key=name)
             return True
@@ -75,10 +388,14 @@ class CloudflareR2Storage(Storage):
     def size(self, name):
         if not self.client:
             raise ValueError("Cloudflare R2 credentials not configured")
-        
+
         try:
             response = self.client.head_object(Bucket=self.bucket_name, Key=name)
             return response['ContentLength']
         except ClientError as e:
             raise Exception(f"Failed to get file size from R2: {str(e)}")
 
+
+def media_storage():
+    """미디어 원본 파일 저장소: MEDIA_STORAGE = 'r2' 이면 Cloudflare R2, 아니면 MEDIA_ROOT"""
+    return CloudflareR2Storage() if settings.MEDIA_STORAGE == 'r2' else default_storage
@@ -1,3 +1,412 @@
-from django.test import TestCase
+import hashlib
+import io
+import math
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from botocore.exceptions import ClientError
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile, File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.http import UnreadablePostError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from search.cache import get_cache
+from .cleanup import FileDeleter
+from .models import Media, MediaCategory, MediaTag, OneWeekVideoStatics, UploadSession
+from .playback import parse_range
+from .serializers import MediaSerializer
+from .storage import CloudflareR2Storage, media_storage
+from .trending import (
+    bucket_hour, decay_rate, rebuild_trending, record_engagement, refresh_trending, score_value, weighted,
+)
+from .upload_handlers import LocalDestination
+from .uploads import parse_content_range
+
+
+class MediaSearchFilterTests(TestCase):
+    def setUp(self):
+        get_cache().clear() # 다른 테스트에서 캐시된 검색 결과를 쓰지 않도록
+        self.client = APIClient()
+        self.short = Media.objects.create(id='short', title='Cat clip', tags='Cat, Funny, cat', category='Pets', length=30, views=5)
+        self.long = Media.objects.create(id='long', title='Cat movie', tags='cat', category=' pets ', length=600, views=9)
+        Media.objects.create(id='photo', title='Cat photo', tags='cat, funny', category='Pets', is_video=False)
+
+    def search(self, mtype='video', **params):
+        response = self.client.get(f'/media/search/{mtype}', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()]
+
+    def test_tags_and_category_are_normalized(self):
+        self.assertEqual(sorted(self.short.tag_set.values_list('name', flat=True)), ['cat', 'funny'])
+        self.assertEqual(MediaCategory.objects.count(), 1)
+        self.assertEqual(self.long.media_category.name, 'pets')
+
+        # 다시 저장해도 태그가 바뀌었을 때만 동기화
+        self.short.tags = 'funny'
+        self.short.save()
+        self.assertEqual(list(self.short.tag_set.values_list('name', flat=True)), ['funny'])
+        self.assertEqual(MediaTag.objects.count(), 2)
+
+    def test_filters(self):
+        self.assertEqual(self.search(tags='cat'), ['short', 'long'])
+        self.assertEqual(self.search(tags=['CAT', 'funny']), ['short'])
+        self.assertEqual(self.search(tags='cat,funny', mtype='image'), ['photo'])
+        self.assertEqual(self.search(category='PETS', orderBy='length'), ['short', 'long'])
+        self.assertEqual(self.search(q='cat', min_length=100), ['long'])
+        self.assertEqual(self.search(q='cat', max_length=100, orderBy='-views'), ['short'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/media/search/video').status_code, 400)
+        self.assertEqual(self.client.get('/media/search/video', {'q': 'cat', 'min_length': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/media/search/video', {'q': 'cat', 'orderBy': 'title'}).status_code, 400)
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.media = [Media.objects.create(id=f'trend{i}', title=str(i)) for i in range(4)]
+        self.start = timezone.now()
+        # 7시간 간격으로 (조회, 좋아요, 싫어요) 기록
+        self.events = [
+            {'trend0': (5, 0, 0), 'trend1': (0, 2, 0), 'trend2': (1, 0, 3)},
+            {'trend1': (3, 0, 0), 'trend3': (0, 1, 0)},
+            {'trend0': (0, 0, 2), 'trend2': (4, 1, 0), 'trend3': (2, 0, 0)},
+            {'trend1': (1, 1, 1), 'trend3': (0, 2, 0)},
+        ]
+
+    def record(self, refresh):
+        for step, events in enumerate(self.events):
+            at = self.start + timedelta(hours=7 * step)
+            record_engagement(events, at)
+            if refresh:
+                with CaptureQueriesContext(connection) as queries:
+                    refresh_trending(at)
+                # 시간이 지나도 저장된 점수 전체를 다시 감쇠시키지 않음
+                self.assertFalse([
+                    q for q in queries if q['sql'].startswith('UPDATE "media_oneweekvideostatics" SET "score"')
+                ])
+
+    def expected(self, now):
+        scores = {}
+        for step, events in enumerate(self.events):
+            age = (now - bucket_hour(self.start + timedelta(hours=7 * step))).total_seconds()
+            for media_id, counts in events.items():
+                scores[media_id] = scores.get(media_id, 0) + weighted(*counts) * math.exp(-decay_rate() * age)
+        return scores
+
+    def assertScores(self, now):
+        expected = self.expected(now)
+        statics = OneWeekVideoStatics.objects.order_by('-score', 'id')
+        for row in statics:
+            self.assertAlmostEqual(score_value(row.score, now), expected[row.pk])
+        self.assertEqual([row.pk for row in statics], sorted(expected, key=lambda media_id: -expected[media_id]))
+
+    def test_incremental_refresh_matches_the_decay_formula(self):
+        self.record(refresh=True)
+        self.assertScores(self.start + timedelta(hours=30))
+
+    def test_rebuild_matches_the_decay_formula(self):
+        self.record(refresh=False)
+        now = self.start + timedelta(hours=30)
+        rebuild_trending(now)
+        self.assertScores(now)
+
+    def test_reactions_are_read_only_through_the_api(self):
+        serializer = MediaSerializer(self.media[0], data={'title': 'x', 'likes': 999, 'views': 10 ** 6}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        media = Media.objects.get(pk='trend0')
+        self.assertEqual((media.title, media.likes, media.views), ('x', 0, 0))
+
+
+class ParseContentRangeTests(SimpleTestCase):
+    def test_valid(self):
+        self.assertEqual(parse_content_range('bytes 0-1023/4096'), (0, 1024, 4096))
+        self.assertEqual(parse_content_range('bytes 4095-4095/4096'), (4095, 4096, 4096))
+
+    def test_invalid(self):
+        for value in (None, '', 'bytes 0-1023/*', 'bytes 10-5/100', 'bytes 0-100/100', 'items 0-1/2', 'bytes=0-1/2'):
+            self.assertIsNone(parse_content_range(value), value)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_satisfiable(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 100))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 1000))
+        self.assertEqual(parse_range('bytes=900-5000', 1000), (900, 1000))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 1000))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 1000))
+
+    def test_ignored(self):
+        # 형식이 틀렸거나 여러 구간이면 무시하고 전체 파일로 응답
+        for header in (None, '', 'bytes=-', 'bytes=5-2', 'bytes=0-1,5-6', 'lines=0-1'):
+            self.assertIsNone(parse_range(header, 1000), header)
+
+    def test_unsatisfiable(self):
+        self.assertIs(parse_range('bytes=1000-', 1000), False)
+        self.assertIs(parse_range('bytes=-0', 1000), False)
+        self.assertIs(parse_range('bytes=-10', 0), False)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        settings = override_settings(MEDIA_ROOT=self.root, MEDIA_STORAGE='local', UPLOAD_CHUNK_MAX_SIZE=4096)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('uploader', 'uploader@example.com', 'pw'))
+        self.data = b'\x00\x00\x00\x14ftypqt  ' + os.urandom(9988)
+
+    def create_session(self, data=None, content_type='video/quicktime'):
+        data = self.data if data is None else data
+        response = self.client.post(
+            '/media/uploads', {'filename': 'clip.mov', 'content_type': content_type, 'size': len(data)}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put_chunk(self, upload_id, start, end, data=None):
+        data = self.data if data is None else data
+        body = data[start:end]
+        return self.client.generic(
+            'PUT', f'/media/uploads/{upload_id}', body, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(data)}', HTTP_X_CHUNK_SHA256=hashlib.sha256(body).hexdigest()
+        )
+
+    def upload(self):
+        upload_id = self.create_session()
+        for start in (8192, 0, 4096): # 순서와 상관없이 받음
+            self.assertEqual(self.put_chunk(upload_id, start, min(start + 4096, len(self.data))).status_code, 200)
+        response = self.client.post(f'/media/uploads/{upload_id}/complete')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_complete_moves_the_part_file_into_place(self):
+        media = self.upload()
+        path = os.path.join(self.root, 'video', media['id'], 'original.quicktime')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['original.quicktime'])
+        self.assertEqual(media['content_type'], 'video/quicktime')
+        self.assertEqual(media['file_size'], len(self.data))
+        self.assertFalse(UploadSession.objects.filter(pk=media['id']).exists())
+
+    def test_incomplete_upload_is_rejected(self):
+        upload_id = self.create_session()
+        self.put_chunk(upload_id, 0, 4096)
+        response = self.client.post(f'/media/uploads/{upload_id}/complete')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4096)
+        self.assertFalse(Media.objects.filter(pk=upload_id).exists())
+
+    def test_chunk_with_a_wrong_checksum_is_not_recorded(self):
+        upload_id = self.create_session()
+        response = self.client.generic(
+            'PUT', f'/media/uploads/{upload_id}', self.data[:4096], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-4095/{len(self.data)}', HTTP_X_CHUNK_SHA256='0' * 64
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['received'], [])
+
+    def test_content_that_is_not_the_declared_type_is_rejected(self):
+        data = b'<html>' + bytes(4090)
+        upload_id = self.create_session(data, 'video/mp4')
+        self.put_chunk(upload_id, 0, len(data), data)
+        self.assertEqual(self.client.post(f'/media/uploads/{upload_id}/complete').status_code, 415)
+        self.assertFalse(UploadSession.objects.filter(pk=upload_id).exists())
+
+    def test_playback_ranges(self):
+        media = self.upload()
+        url = media['file']
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+        # If-Range 가 현재 파일과 다르면 구간 대신 전체를 보냄
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        settings = override_settings(MEDIA_ROOT=self.root, MEDIA_STORAGE='local')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('direct', 'direct@example.com', 'pw'))
+        # 본문이 여러 청크로 나뉘어 들어오도록 핸들러 청크(64KB)보다 크게
+        self.data = b'\x00\x00\x00\x14ftypqt  ' + os.urandom(200 * 1024)
+
+    def upload(self, *contents):
+        files = [SimpleUploadedFile(f'clip{i}.mov', content) for i, content in enumerate(contents)]
+        return self.client.put('/media/upload', {'file': files}, format='multipart')
+
+    def stored_files(self):
+        return [os.path.join(path, name) for path, dirs, names in os.walk(self.root) for name in names]
+
+    def test_file_is_streamed_into_place(self):
+        response = self.upload(self.data)
+        self.assertEqual(response.status_code, 200)
+        media = Media.objects.get(pk=response.json()['id'])
+        self.assertEqual((media.content_type, media.file_size), ('video/quicktime', len(self.data)))
+        self.assertEqual(media.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(self.stored_files(), [os.path.join(self.root, media.file.name)])
+        with open(self.stored_files()[0], 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_only_the_first_file_part_is_stored(self):
+        response = self.upload(self.data, b'\x89PNG\r\n\x1a\n' + bytes(100))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content_type'], 'video/quicktime')
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_interrupted_upload_leaves_no_file(self):
+        write = LocalDestination.write
+        def fail_after_the_head(destination, data):
+            if destination.file.tell():
+                raise UnreadablePostError('connection reset')
+            write(destination, data)
+
+        with mock.patch.object(LocalDestination, 'write', fail_after_the_head):
+            with self.assertRaises(UnreadablePostError):
+                self.upload(self.data)
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Media.objects.exists())
+
+    def test_failed_media_row_removes_the_stored_file(self):
+        with mock.patch.object(Media, 'save', side_effect=IntegrityError), \
+                self.assertRaises(IntegrityError):
+            self.upload(self.data)
+        self.assertEqual(self.stored_files(), [])
+
+
+
+class FileDeleterTests(TestCase):
+    def setUp(self):
+        self.deleter = FileDeleter()
+        worker = mock.patch.object(self.deleter, '_ensure_worker') # 스레드 없이 flush() 를 직접 호출
+        worker.start()
+        self.addCleanup(worker.stop)
+
+    def test_deletes_committed_files_in_one_batch_per_storage(self):
+        r2, local = mock.Mock(), mock.Mock(spec=['delete'])
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('b.mp4', 'a.mp4', 'a.mp4'):
+                self.deleter.delete_on_commit(SimpleNamespace(storage=r2, name=name))
+            self.deleter.delete_on_commit(SimpleNamespace(storage=local, name='c.jpg'))
+        r2.delete_many.assert_not_called() # 커밋 직후가 아니라 flush 때 지움
+
+        self.deleter.flush()
+        r2.delete_many.assert_called_once_with(['a.mp4', 'b.mp4'])
+        local.delete.assert_called_once_with('c.jpg')
+
+        self.deleter.flush()
+        r2.delete_many.assert_called_once()
+
+    def test_rolled_back_files_are_kept(self):
+        storage = mock.Mock()
+        with self.captureOnCommitCallbacks(execute=False):
+            self.deleter.delete_on_commit(SimpleNamespace(storage=storage, name='a.mp4'))
+        self.deleter.flush()
+        storage.delete_many.assert_not_called()
+
+    def test_failed_storage_is_logged_and_not_retried(self):
+        broken, ok = mock.Mock(), mock.Mock()
+        broken.delete_many.side_effect = OSError('R2 down')
+        self.deleter.add(broken, 'a.mp4')
+        self.deleter.add(ok, 'b.mp4')
+
+        with self.assertLogs('media.cleanup', 'ERROR'):
+            self.deleter.flush()
+        ok.delete_many.assert_called_once_with(['b.mp4'])
+
+        self.deleter.flush()
+        broken.delete_many.assert_called_once()
+
+
+R2_TEST_ENDPOINT = os.environ.get('R2_TEST_ENDPOINT') # 예: moto 서버 (python -m moto.server -p 5055)
+
+
+@skipUnless(R2_TEST_ENDPOINT, 'R2_TEST_ENDPOINT (S3 호환 서버 주소)가 없으면 건너뜀')
+@override_settings(
+    CLOUDFLARE_R2_ACCESS_KEY_ID='test', CLOUDFLARE_R2_SECRET_ACCESS_KEY='test',
+    CLOUDFLARE_R2_BUCKET_NAME='pororohub-test', CLOUDFLARE_R2_ENDPOINT_URL=R2_TEST_ENDPOINT,
+    R2_MULTIPART_THRESHOLD=6 * 1024 * 1024, R2_PART_SIZE=5 * 1024 * 1024, R2_READ_BUFFER_SIZE=256 * 1024,
+)
+class R2StorageTests(TestCase):
+    def setUp(self):
+        self.storage = CloudflareR2Storage()
+        try:
+            self.storage.client.create_bucket(
+                Bucket=self.storage.bucket_name, CreateBucketConfiguration={'LocationConstraint': 'auto'}
+            )
+        except self.storage.client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+        self.data = os.urandom(11 * 1024 * 1024 + 17) # 파트 세 개
+
+    def test_multipart_save_and_ranged_reads(self):
+        with mock.patch.object(self.storage.client, 'upload_part', wraps=self.storage.client.upload_part) as upload_part:
+            name = self.storage.save('test/big.bin', File(io.BytesIO(self.data), name='big.bin'))
+        self.assertEqual(upload_part.call_count, 3)
+        self.assertEqual(self.storage.size(name), len(self.data))
+
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(10), self.data[:10])
+            f.seek(10 * 1024 * 1024)
+            self.assertEqual(f.read(100), self.data[10 * 1024 * 1024:10 * 1024 * 1024 + 100])
+            f.seek(-5, io.SEEK_END)
+            self.assertEqual(f.read(), self.data[-5:])
+            self.assertEqual(f.read(), b'')
+            f.seek(0)
+            self.assertEqual(b''.join(f.chunks()), self.data)
+
+        for content in (b'', b'small'):
+            name = self.storage.save('test/small.bin', ContentFile(content))
+            with self.storage.open(name) as f:
+                self.assertEqual(f.read(), content)
+
+    def test_failed_part_aborts_the_upload(self):
+        error = ClientError({'Error': {'Code': 'InternalError'}}, 'UploadPart')
+        with mock.patch.object(self.storage.client, 'upload_part', side_effect=error), \
+                self.assertRaisesMessage(Exception, 'Failed to upload to R2'):
+            self.storage.save('test/failed.bin', File(io.BytesIO(self.data), name='failed.bin'))
+        uploads = self.storage.client.list_multipart_uploads(Bucket=self.storage.bucket_name).get('Uploads', [])
+        self.assertFalse([upload for upload in uploads if upload['Key'] == 'test/failed.bin'])
+        self.assertFalse(self.storage.exists('test/failed.bin'))
+
+    @override_settings(MEDIA_STORAGE='r2')
+    def test_direct_upload_streams_into_the_bucket(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('r2', 'r2@example.com', 'pw'))
+        data = b'\x00\x00\x00\x14ftypqt  ' + self.data
+        response = client.put('/media/upload', {'file': SimpleUploadedFile('clip.mov', data)}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+
+        media = Media.objects.get(pk=response.json()['id'])
+        with media_storage().open(media.file.name) as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), media.sha256)
+        self.assertEqual(media.sha256, hashlib.sha256(data).hexdigest())
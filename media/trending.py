@@ -0,0 +1,171 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Media, MediaEngagementBucket, OneWeekVideoStatics, TrendingWatermark
+
+
+def bucket_hour(at=None):
+    return (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def record_engagement(events, at=None):
+    """
+    {media_id: (views, likes, dislikes)} 변화량을 해당 시간 버킷에 더한다.
+    INSERT ... ON CONFLICT 한 번으로 여러 미디어를 처리하고, 그 사이 삭제된 미디어는 건너뛴다.
+    """
+    rows = sorted((media_id, *counts) for media_id, counts in events.items() if any(counts))
+    if not rows:
+        return
+
+    bucket = MediaEngagementBucket._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    sql = f"""
+        INSERT INTO {bucket} (media_id, hour, views, likes, dislikes,
+                              applied_views, applied_likes, applied_dislikes, dirty)
+        SELECT m.id, %s, e.views, e.likes, e.dislikes, 0, 0, 0, true
+        FROM (VALUES {values}) AS e (id, views, likes, dislikes)
+        JOIN {Media._meta.db_table} m ON m.id = e.id
+        ON CONFLICT (media_id, hour) DO UPDATE SET
+            views = {bucket}.views + EXCLUDED.views,
+            likes = {bucket}.likes + EXCLUDED.likes,
+            dislikes = {bucket}.dislikes + EXCLUDED.dislikes,
+            dirty = true
+    """
+    params = [bucket_hour(at)]
+    for row in rows:
+        params.extend(row)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def decay_rate():
+    """초당 감쇠율 (TRENDING_HALF_LIFE_HOURS 마다 점수가 절반)"""
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 60 * 60)
+
+
+def half_lives(at):
+    """1970년부터 at 까지 지난 반감기 수"""
+    return at.timestamp() / (settings.TRENDING_HALF_LIFE_HOURS * 60 * 60)
+
+
+def anchored_score(value, now):
+    """
+    now 시점의 감쇠 점수 value 를 시간이 지나도 순서가 바뀌지 않는 값으로 바꾼다.
+    (hot_score 처럼 log2(점수) + 지난 반감기 수, 음수 점수는 부호를 뒤집어서 0 아래에 둠)
+    모든 점수가 같은 비율로 감쇠하므로 갱신 때마다 전체 행을 다시 쓸 필요가 없다
+    """
+    if not value:
+        return 0.0
+    return math.copysign(math.log2(abs(value)) + half_lives(now), value)
+
+
+def score_value(score, now):
+    """anchored_score 의 역: 저장된 점수의 now 시점 감쇠 점수"""
+    if not score:
+        return 0.0
+    return math.copysign(2 ** (abs(score) - half_lives(now)), score)
+
+
+def weighted(views, likes, dislikes):
+    weights = settings.TRENDING_WEIGHTS
+    return views * weights['views'] + likes * weights['likes'] + dislikes * weights['dislikes']
+
+
+def refresh_trending(now=None):
+    """
+    OneWeekVideoStatics를 증분 갱신한다.
+    - 점수는 시간 기준 로그 값(anchored_score)이라 감쇠를 위해 기존 행을 고치지 않음
+    - 윈도우를 벗어난 버킷은 반영했던 값만큼 빼고 삭제
+    - 반영 이후 바뀐(dirty) 버킷은 차이만 더함
+    그래서 비용은 전체 기록이 아니라 마지막 갱신 이후 바뀐 버킷 수에 비례한다.
+    반환값: (반영한 버킷 수, 만료된 버킷 수)
+    """
+    now = now or timezone.now()
+    rate = decay_rate()
+    window_start = bucket_hour(now) - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    # media_id -> [points, score, views, likes, dislikes] 변화량
+    deltas = defaultdict(lambda: [0, 0.0, 0, 0, 0])
+
+    def add(media_id, hour, views, likes, dislikes, sign):
+        weight = weighted(views, likes, dislikes) * sign
+        delta = deltas[media_id]
+        delta[0] += weight
+        delta[1] += weight * math.exp(-rate * max((now - hour).total_seconds(), 0))
+        delta[2] += views * sign
+        delta[3] += likes * sign
+        delta[4] += dislikes * sign
+
+    with transaction.atomic():
+        # 동시에 실행된 갱신은 여기서 순서대로 기다림
+        watermark = TrendingWatermark.objects.select_for_update().get_or_create(pk=1)[0]
+
+        expired_rows = list(MediaEngagementBucket.objects.select_for_update().filter(
+            hour__lt=window_start
+        ).values_list(
+            'pk', 'media_id', 'hour', 'applied_views', 'applied_likes', 'applied_dislikes'
+        ))
+        for pk, media_id, hour, views, likes, dislikes in expired_rows:
+            if views or likes or dislikes:
+                add(media_id, hour, views, likes, dislikes, -1)
+        MediaEngagementBucket.objects.filter(pk__in=[row[0] for row in expired_rows]).delete()
+
+        # 잠근 버킷은 커밋 전까지 record_engagement가 기다리므로 읽은 값이 그대로 applied가 된다
+        dirty_rows = list(MediaEngagementBucket.objects.select_for_update().filter(
+            dirty=True, hour__gte=window_start
+        ).values_list(
+            'pk', 'media_id', 'hour', 'views', 'likes', 'dislikes',
+            'applied_views', 'applied_likes', 'applied_dislikes'
+        ))
+        for pk, media_id, hour, views, likes, dislikes, applied_views, applied_likes, applied_dislikes in dirty_rows:
+            add(media_id, hour, views - applied_views, likes - applied_likes, dislikes - applied_dislikes, 1)
+        MediaEngagementBucket.objects.filter(pk__in=[row[0] for row in dirty_rows]).update(
+            applied_views=F('views'), applied_likes=F('likes'), applied_dislikes=F('dislikes'), dirty=False
+        )
+
+        write_statics(deltas, now)
+
+        watermark.refreshed_at = now
+        watermark.save(update_fields=['refreshed_at'])
+
+    return len(dirty_rows), len(expired_rows)
+
+
+def write_statics(deltas, now):
+    """변화량(now 시점 점수)을 OneWeekVideoStatics에 한꺼번에 반영하고, 윈도우 안에 참여가 없어진 미디어는 제거"""
+    existing = OneWeekVideoStatics.objects.in_bulk(list(deltas))
+    changed, created, emptied = [], [], set()
+    for media_id, (points, score, views, likes, dislikes) in deltas.items():
+        statics = existing.get(media_id)
+        if statics is None:
+            statics = OneWeekVideoStatics(id_id=media_id)
+            created.append(statics)
+        else:
+            changed.append(statics)
+        statics.points += points
+        statics.score = anchored_score(score_value(statics.score, now) + score, now)
+        statics.views += views
+        statics.likes += likes
+        statics.dislikes += dislikes
+        if not (statics.views or statics.likes or statics.dislikes):
+            emptied.add(media_id)
+
+    fields = ['points', 'score', 'views', 'likes', 'dislikes']
+    OneWeekVideoStatics.objects.bulk_update([s for s in changed if s.pk not in emptied], fields, batch_size=1000)
+    OneWeekVideoStatics.objects.bulk_create([s for s in created if s.pk not in emptied], batch_size=1000)
+    OneWeekVideoStatics.objects.filter(pk__in=emptied).delete()
+
+
+def rebuild_trending(now=None):
+    """집계를 처음부터 다시 계산 (가중치/감쇠 설정을 바꿨거나 부동소수 오차를 정리할 때)"""
+    with transaction.atomic():
+        TrendingWatermark.objects.select_for_update().get_or_create(pk=1)
+        OneWeekVideoStatics.objects.all().delete()
+        MediaEngagementBucket.objects.update(applied_views=0, applied_likes=0, applied_dislikes=0, dirty=True)
+        TrendingWatermark.objects.filter(pk=1).update(refreshed_at=None)
+        return refresh_trending(now)
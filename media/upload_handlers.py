@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+
+from .storage import CloudflareR2Storage, MultipartUpload, media_storage
+from .uploads import SNIFF_SIZE, media_type_of, original_name, sniff_content_type
+from .utils import gen_id
+
+logger = logging.getLogger(__name__)
+
+
+class LocalDestination:
+    def __init__(self, name):
+        self.path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'wb')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+            os.rmdir(os.path.dirname(self.path))
+        except OSError:
+            pass
+
+
+class StoredMediaFile(UploadedFile):
+    """
+    이미 최종 위치에 저장된 업로드 파일의 정보만 담은 객체 (본문을 다시 읽을 일이 없음).
+    형식을 판별하지 못했거나 허용되지 않는 형식이면 content_type 이 None
+    """
+    def __init__(self, name, content_type, size, media_id=None, storage_name=None, sha256=None):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.media_id = media_id
+        self.storage_name = storage_name
+        self.sha256 = sha256
+
+
+class DirectMediaUploadHandler(FileUploadHandler):
+    """
+    media 업로드 전용 핸들러. multipart 본문의 'file' 필드를 임시 파일 없이 최종 저장소
+    (MEDIA_ROOT 또는 R2 멀티파트 업로드)에 바로 쓰면서, 같은 흐름에서 크기와 SHA-256을 계산하고
+    앞부분 매직 바이트로 실제 형식을 판별한다. 형식은 클라이언트가 보낸 Content-Type을 믿지 않음
+    """
+    def __init__(self, request=None, allowed_types=()):
+        super().__init__(request)
+        self.allowed_types = allowed_types
+        self.taking = False # 지금 받는 파트가 저장할 'file' 파트인지
+        self.active = False
+        self.destination = None
+        self.media_id = None
+        self.stored_name = None # 저장을 마친 원본 (discard()에서 삭제)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        # 'file' 파트는 첫 번째 것만 저장하고 나머지는 버림
+        # (request.FILES['file']이 덮어써지면 먼저 저장한 원본이 고아가 됨)
+        self.taking = self.active = field_name == 'file' and self.media_id is None
+        if not self.active:
+            return
+        self.media_id = gen_id(16)
+        self.head = b''
+        self.sniffed = None
+        self.digest = hashlib.sha256()
+        self.size = 0
+        raise StopFutureHandlers()
+
+    def open_destination(self):
+        self.sniffed = sniff_content_type(self.head)
+        if self.sniffed not in self.allowed_types:
+            self.active = False # 나머지 본문은 버림
+            return
+        ftype = media_type_of(self.sniffed)
+        self.storage_name = original_name(ftype, self.media_id, self.sniffed.split('/')[-1])
+        storage = media_storage()
+        if isinstance(storage, CloudflareR2Storage):
+            self.destination = MultipartUpload(storage, self.storage_name, self.sniffed)
+        else:
+            self.destination = LocalDestination(self.storage_name)
+        self.write(self.head)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > settings.UPLOAD_MAX_SIZE:
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        self.digest.update(data)
+        self.destination.write(data)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return None
+        if self.destination is None:
+            self.head += raw_data # 판별에 필요한 만큼 모일 때까지
+            if len(self.head) >= SNIFF_SIZE:
+                self.open_destination()
+            return None
+        self.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.taking:
+            return None
+        self.taking = False
+        if self.destination is None and self.active: # SNIFF_SIZE 보다 작은 파일
+            self.open_destination()
+        if self.destination is None:
+            return StoredMediaFile(self.file_name, None, file_size)
+
+        destination, self.destination = self.destination, None
+        self.active = False
+        destination.close() # 실패하면 close()가 직접 abort
+        self.stored_name = self.storage_name
+        return StoredMediaFile(
+            self.file_name, self.sniffed, self.size,
+            media_id=self.media_id, storage_name=self.storage_name, sha256=self.digest.hexdigest()
+        )
+
+    def upload_interrupted(self):
+        if self.destination is not None:
+            destination, self.destination = self.destination, None
+            destination.abort()
+
+    def discard(self):
+        """
+        본문 파싱 중 예외(연결 끊김, R2 파트 업로드 실패 등)나 Media 생성 실패 시 호출.
+        Django는 StopUpload 때만 upload_interrupted()를 부르므로 나머지 경우는 뷰에서 정리함.
+        쓰던 파일은 중단하고 이미 저장한 원본은 삭제
+        """
+        try:
+            self.upload_interrupted()
+            if self.stored_name is not None:
+                media_storage().delete(self.stored_name)
+                self.stored_name = None
+        except Exception: # 원래 예외를 가리지 않도록 기록만
+            logger.exception('Failed to discard upload %s', self.media_id)
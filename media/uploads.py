@@ -0,0 +1,139 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+
+from .storage import CloudflareR2Storage, MultipartUpload, media_storage
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+READ_SIZE = 64 * 1024 # 요청 본문을 읽는 단위
+SNIFF_SIZE = 16 # 형식 판별에 필요한 앞부분 바이트 수
+
+
+def sniff_content_type(head):
+    """파일 앞부분(매직 바이트)으로 실제 형식 판별. 모르는 형식이면 None"""
+    if head[4:8] == b'ftyp':
+        return 'video/quicktime' if head[8:12] == b'qt  ' else 'video/mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video/webm'
+    if head.startswith(b'RIFF') and head[8:12] == b'AVI ':
+        return 'video/x-msvideo'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    return None
+
+
+def media_type_of(content_type):
+    return 'video' if content_type.startswith('video/') else 'image'
+
+
+def original_name(ftype, media_id, ext):
+    """저장소 안에서의 원본 파일 이름 (MEDIA_ROOT 기준 상대 경로 = R2 키)"""
+    return '{}/{}/original.{}'.format(ftype, media_id, ext)
+
+
+def original_path(ftype, media_id, ext):
+    return os.path.join(settings.MEDIA_ROOT, original_name(ftype, media_id, ext))
+
+
+def session_paths(session):
+    """세션 -> (청크를 쓰는 .part 경로, 완료 후 최종 경로)"""
+    final = original_path(media_type_of(session.content_type), session.id, session.content_type.split('/')[-1])
+    return final + '.part', final
+
+
+def store_upload(part, final, content_type):
+    """
+    다 받은 .part 파일을 원본 저장소에 넣고 저장소 안의 이름을 반환.
+    로컬 저장소면 이름만 바꾸고(다시 읽지 않음), R2 면 파트 단위로 올린 뒤 로컬 파일을 지움
+    """
+    name = os.path.relpath(final, settings.MEDIA_ROOT)
+    storage = media_storage()
+    if not isinstance(storage, CloudflareR2Storage):
+        os.replace(part, final)
+        return name
+
+    upload = MultipartUpload(storage, name, content_type)
+    try:
+        with open(part, 'rb') as f:
+            while data := f.read(settings.R2_PART_SIZE):
+                upload.write(data)
+    except BaseException:
+        upload.abort()
+        raise
+    upload.close()
+    remove_upload_files(part)
+    return name
+
+
+def remove_upload_files(part):
+    """중단/만료된 세션의 .part 파일과 (비어 있으면) 디렉터리 삭제"""
+    try:
+        os.remove(part)
+        os.rmdir(os.path.dirname(part))
+    except OSError:
+        pass
+
+
+def parse_content_range(value):
+    """'bytes 0-1023/4096' -> (0, 1024, 4096). 끝은 포함하지 않는 값으로 바꿔서 반환"""
+    match = CONTENT_RANGE_RE.match(value or '')
+    if not match:
+        return None
+    start, last, total = map(int, match.groups())
+    if last < start or last >= total:
+        return None
+    return start, last + 1, total
+
+
+def merge_range(ranges, start, end):
+    merged = []
+    for lo, hi in sorted([*ranges, [start, end]]):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def covers(ranges, start, end):
+    return any(lo <= start and end <= hi for lo, hi in ranges)
+
+
+def overlaps(ranges, start, end):
+    return any(lo < end and start < hi for lo, hi in ranges)
+
+
+def contiguous_offset(ranges):
+    """처음부터 빈틈없이 받은 바이트 수 (클라이언트가 이어서 보낼 위치)"""
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def write_chunk(path, start, stream, length, sha256):
+    """
+    stream 에서 length 바이트를 읽으면서 파일의 start 위치에 바로 쓴다 (메모리에 모아두지 않음).
+    다 받았고 SHA-256이 맞으면 True. 틀린 경우 쓴 바이트는 받은 구간으로 기록되지 않으므로
+    같은 청크를 다시 보내면 덮어써진다
+    """
+    digest = hashlib.sha256()
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        offset, remaining = start, length
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            os.pwrite(fd, data, offset)
+            digest.update(data)
+            offset += len(data)
+            remaining -= len(data)
+    finally:
+        os.close(fd)
+    return remaining == 0 and digest.hexdigest() == sha256.lower()
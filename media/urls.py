@@ -1,6 +1,9 @@
 from django.urls import path
 
-from .views import get_trending_videos, search_media, upload_media, upload_video, VideoView, PhotoView
+from .views import (
+    get_trending_videos, search_media, upload_media, upload_video, create_upload, complete_upload,
+    UploadSessionView, VideoView, PhotoView, play_media
+)
 
 urlpatterns = [
     path('trending', get_trending_videos),
@@ -8,6 +11,11 @@ urlpatterns = [
     path('upload', upload_media),
     path('upload/video', upload_video),
     path('upload/image', upload_media),
+    path('uploads', create_upload),
+    path('uploads/<str:upload_id>', UploadSessionView.as_view()),
+    path('uploads/<str:upload_id>/complete', complete_upload),
     path('video/<str:vid>', VideoView.as_view()),
-    path('photo/<str:iid>', PhotoView.as_view())
+    path('video/<str:mid>/play', play_media, {'is_video': True}, name='play-video'),
+    path('photo/<str:iid>', PhotoView.as_view()),
+    path('photo/<str:mid>/file', play_media, {'is_video': False}, name='photo-file')
 ]
@@ -1,6 +1,11 @@
 import os
+from datetime import timedelta
 
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.generics import get_object_or_404
@@ -9,10 +14,23 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from actor.models import Actor
-from .models import Media
+from pororohub.counters import view_counter
+from pororohub.pagination import StandardPagination
+from search.cache import cached_result, capped_ids, normalize_query
+from search.engine import get_index, search_enabled
+from .models import Media, UploadSession, split_tags
+from .playback import playback_response
 from .serializers import MediaSerializer
+from .upload_handlers import DirectMediaUploadHandler
+from .uploads import (
+    SNIFF_SIZE, contiguous_offset, covers, media_type_of, merge_range, overlaps,
+    parse_content_range, remove_upload_files, session_paths, sniff_content_type, store_upload, write_chunk
+)
 from .utils import gen_id
 
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 ALLOWED_VIDEO_TYPES = [
     'video/mp4',
     'video/webm',
@@ -29,13 +47,38 @@ ALLOWED_IMAGE_TYPES = [
     'image/webp',
 ]
 
+def paginate_by_cursor(queryset, request):
+    paginator = StandardPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = MediaSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+def page_bounds(request):
+    """page, page_size 쿼리 -> (offset, limit). 페이지 크기는 최대 MAX_PAGE_SIZE로 제한"""
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+        page_size = min(max(int(request.GET.get("page_size", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page, page_size = 1, PAGE_SIZE
+    return (page - 1) * page_size, page_size
+
+def paginate_media_ids(media_ids, request):
+    offset, limit = page_bounds(request)
+    page = media_ids[offset:offset + limit] # id 목록에서 페이지 부분만 잘라내기
+    media = Media.objects.in_bulk(page) # 해당 페이지의 미디어만 DB에서 가져오기
+    serializer = MediaSerializer([media[media_id] for media_id in page if media_id in media], many=True)
+    return Response(serializer.data)
+
 # Create your views here.
 @api_view(["GET"])
 def get_trending_videos(request):
-    rs = Media.objects.filter(is_video=True, oneweekvideostatics__isnull=False).order_by('-oneweekvideostatics__points') # 한 주의 비디오 상위 랭킹 집합(포인트로 나열); 비디오 정보 집합
+    rs = Media.objects.filter(is_video=True, oneweekvideostatics__isnull=False).select_related('oneweekvideostatics').order_by('-oneweekvideostatics__score', 'id') # 한 주의 비디오 상위 랭킹 집합(감쇠 점수로 나열, refresh_trending이 갱신); 비디오 정보 집합
 
     # rs = vq.intersection(q)
     #rs = vq.union(q) # 합집합
+    if 'cursor' in request.GET: # 커서 모드: COUNT/OFFSET 없이 다음 페이지 커서로 이어서 가져오기
+        return paginate_by_cursor(rs, request)
+
     paginator = Paginator(rs, 20) # 나눠서 가져오기 (페이지당 20개의 영상)
     page_number = request.GET.get("page") # 파라미터에서 'page' 쿼리 가져오기 (페이지 번호)
     page = paginator.get_page(page_number) # 가져온 페이지 번호에 해당되는 부분 가져오기
@@ -45,21 +88,77 @@ def get_trending_videos(request):
 
 @api_view(["GET"])
 def search_media(request, mtype):
-    q = request.GET.get('q')
-    if not q: return Response(status=status.HTTP_400_BAD_REQUEST)
+    q = request.GET.get('q', '').strip()
+    tag_names = [name for value in request.GET.getlist('tags') for name in split_tags(value)] # ?tags=a&tags=b 또는 ?tags=a,b
+    category = request.GET.get('category', '').strip().lower()
+    actor = request.GET.get('actor')
+    try:
+        min_length = int(request.GET['min_length']) if request.GET.get('min_length') else None
+        max_length = int(request.GET['max_length']) if request.GET.get('max_length') else None
+        actor = int(actor) if actor else None
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    if not (q or tag_names or category or actor): return Response(status=status.HTTP_400_BAD_REQUEST) # 검색어나 필터 중 하나는 있어야 함
 
     order = request.GET.get("orderBy") # 무엇으로 정렬할 것 인지
     if not order: order = "views"
 
     ov = order if not order.startswith("-") else order[1:] # 정렬 요소 앞에 -가 붙으면 역정렬
-    if not (ov == "views" or ov == "likes" or ov == "comments"): return Response(status=status.HTTP_400_BAD_REQUEST) # 만약에 지정된 정렬 요소가 아니라면 400 오류
+    if ov not in ("views", "likes", "length", "uploaded_at"): return Response(status=status.HTTP_400_BAD_REQUEST) # 만약에 지정된 정렬 요소가 아니라면 400 오류
 
-    media = Media.objects.filter(is_video=(mtype=="video"), title__icontains=q).order_by(order) # q는 검색문
-    paginator = Paginator(media, 440)  # 나눠서 가져오기 (페이지당 20개의 영상)
-    page_number = request.GET.get("page")  # 파라미터에서 'page' 쿼리 가져오기 (페이지 번호)
-    page = paginator.get_page(page_number)  # 가져온 페이지 번호에 해당되는 부분 가져오기
+    is_video = mtype == "video"
+    cache_params = { # 정규화된 검색 조건 (캐시 키)
+        'q': normalize_query(q), 'type': mtype, 'order': order, 'tags': sorted(tag_names),
+        'category': category, 'min_length': min_length, 'max_length': max_length, 'actor': actor,
+    }
 
-    serializer = MediaSerializer(page, many=True)
+    if q and search_enabled(): # 인덱스 검색: 메모리에서 찾고 정렬한 뒤 해당 페이지의 미디어만 DB에서 가져오기
+        def where(meta):
+            return (
+                meta['is_video'] == is_video
+                and (min_length is None or meta['length'] >= min_length)
+                and (max_length is None or meta['length'] <= max_length)
+                and (actor is None or meta['actor'] == actor)
+            )
+
+        all_of = [('tags', name) for name in tag_names] + ([('category', category)] if category else [])
+        def search():
+            return [media_id for media_id, score in get_index('media').search(q, where, order, all_of=all_of)[0]]
+
+        # 결과가 SEARCH_CACHE_MAX_RESULTS보다 많으면 None이 캐시되고 매번 다시 검색
+        result = cached_result('media', cache_params, ('media',), lambda: capped_ids(search()))
+        media_ids = result['hits']
+        if media_ids is None:
+            media_ids = search()
+        return paginate_media_ids(media_ids, request)
+
+    media = Media.objects.filter(is_video=is_video)
+    if q:
+        media = media.filter(title__icontains=q) # UPPER(title) 트라이그램 인덱스 사용
+    if tag_names: # 모든 태그를 가진 미디어: 태그마다 조인하지 않고 서브쿼리 하나로
+        media = media.filter(pk__in=Media.tag_set.through.objects.filter(
+            mediatag__name__in=tag_names
+        ).values('media_id').annotate(n=Count('mediatag_id')).filter(n=len(tag_names)).values('media_id'))
+    if category:
+        media = media.filter(media_category__name=category)
+    if min_length is not None:
+        media = media.filter(length__gte=min_length)
+    if max_length is not None:
+        media = media.filter(length__lte=max_length)
+    if actor is not None:
+        media = media.filter(actor_id=actor)
+    media = media.order_by(order, 'id')
+
+    if 'cursor' in request.GET:
+        return paginate_by_cursor(media, request)
+
+    # 정렬된 id 목록을 캐시 (미디어가 수정되면 무효화, 조회수 변화는 SEARCH_CACHE_TIMEOUT 동안 반영 안 됨)
+    result = cached_result('media', cache_params, ('media',), lambda: capped_ids(media.values_list('id', flat=True)))
+    if result['hits'] is not None:
+        return paginate_media_ids(result['hits'], request)
+
+    offset, limit = page_bounds(request) # COUNT 없이 필요한 만큼만 잘라서 가져오기
+    serializer = MediaSerializer(media[offset:offset + limit], many=True)
     return Response(serializer.data)
 
 
@@ -68,66 +167,191 @@ def search_media(request, mtype):
 def upload_media(request, format=None):
     if not request.user.is_authenticated: 
         return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    # 본문을 읽기 전에 핸들러를 바꿔서 임시 파일 없이 최종 저장소로 바로 스트리밍
+    handler = DirectMediaUploadHandler(request._request, ALLOWED_VIDEO_TYPES + ALLOWED_IMAGE_TYPES)
+    request._request.upload_handlers = [handler]
+    try:
+        files = request.FILES
+    except Exception: # 쓰다 만 파일이나 이미 저장한 원본이 남지 않도록
+        handler.discard()
+        raise
     
-    if "file" not in request.FILES:
+    if "file" not in files:
         return Response(
             {"detail": "No file provided"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    file_obj = request.FILES["file"]
+    file_obj = files["file"]
     
-    is_video = file_obj.content_type in ALLOWED_VIDEO_TYPES
-    is_image = file_obj.content_type in ALLOWED_IMAGE_TYPES
-    
-    if not is_video and not is_image:
+    if file_obj.content_type is None: # 매직 바이트로 판별한 형식이 허용 목록에 없음 (저장하지 않음)
         return Response(
-            {"detail": f"Unsupported media type: {file_obj.content_type}"},
+            {"detail": "Unsupported media type"},
             status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
         )
 
-    id = gen_id(16)
-    ftype = 'video' if is_video else 'image'
-    ext = file_obj.content_type.split('/')[-1]
-    
-    upload_path = './upload/{}/{}'.format(ftype, id)
-    os.makedirs(upload_path, exist_ok=True)
-    
-    destination = open('{}/original.{}'.format(upload_path, ext), 'wb+')
-    
-    for chunk in file_obj.chunks():
-        destination.write(chunk)
-    
-    destination.close()
+    try:
+        media = create_media(
+            request, file_obj.media_id, file_obj.name, file_obj.content_type in ALLOWED_VIDEO_TYPES,
+            file=file_obj.storage_name, content_type=file_obj.content_type, file_size=file_obj.size, sha256=file_obj.sha256
+        )
+    except Exception: # Media 행을 못 만들면 저장한 원본도 삭제
+        handler.discard()
+        raise
+    serializer = MediaSerializer(media, many=False)
+    return Response(serializer.data)
 
-    media = Media()
+def create_media(request, id, title, is_video, **fields):
+    media = Media(**fields)
     media.id = id
-    media.title = file_obj.name
+    media.title = title
     try:
         media.actor = Actor.objects.get(id=request.user.id)
     except Actor.DoesNotExist:
         pass
     media.is_video = is_video
     media.save()
-
-    serializer = MediaSerializer(media, many=False)
-    return Response(serializer.data)
+    return media
 
 @api_view(["PUT"])
 @parser_classes([MultiPartParser])
 def upload_video(request, format=None):
     return upload_media(request, format)
 
+def upload_state(session):
+    return {
+        "id": session.id,
+        "size": session.size,
+        "offset": contiguous_offset(session.received), # 여기서부터 이어서 보내면 됨
+        "received": session.received,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+        "expires_at": session.expires_at,
+    }
+
+@api_view(["POST"])
+def create_upload(request):
+    """이어올리기 세션 생성: {"filename", "content_type", "size"}"""
+    if not request.user.is_authenticated:
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    content_type = request.data.get("content_type", "")
+    try:
+        size = int(request.data.get("size"))
+    except (TypeError, ValueError):
+        return Response({"detail": "size is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if content_type not in ALLOWED_VIDEO_TYPES and content_type not in ALLOWED_IMAGE_TYPES:
+        return Response({"detail": f"Unsupported media type: {content_type}"}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        return Response({"detail": f"size must be between 1 and {settings.UPLOAD_MAX_SIZE}"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    session = UploadSession(
+        id=gen_id(16),
+        user=request.user,
+        filename=str(request.data.get("filename") or "")[:200],
+        content_type=content_type,
+        size=size,
+        expires_at=timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+    )
+    part, final = session_paths(session)
+    os.makedirs(os.path.dirname(part), exist_ok=True)
+    with open(part, "wb") as f:
+        f.truncate(size) # 빈 공간을 미리 잡아두고(sparse) 청크는 제자리에 씀
+    session.save()
+    return Response(upload_state(session), status=status.HTTP_201_CREATED)
+
+class UploadSessionView(APIView):
+    def get_session(self, request, upload_id):
+        return get_object_or_404(UploadSession, pk=upload_id, user_id=request.user.id, expires_at__gt=timezone.now())
+
+    def get(self, request, upload_id):
+        """받은 위치 확인 (연결이 끊겼다가 다시 이어 보낼 때)"""
+        if not request.user.is_authenticated: return Response(status=status.HTTP_401_UNAUTHORIZED)
+        return Response(upload_state(self.get_session(request, upload_id)))
+
+    def put(self, request, upload_id):
+        """
+        청크 하나 업로드. Content-Range: bytes <시작>-<끝>/<전체>, X-Chunk-SHA256: <hex> 헤더 필요.
+        순서는 상관없고, 이미 받은 청크를 다시 보내면 쓰지 않고 현재 상태만 돌려줌
+        """
+        if not request.user.is_authenticated: return Response(status=status.HTTP_401_UNAUTHORIZED)
+        session = self.get_session(request, upload_id)
+
+        byte_range = parse_content_range(request.headers.get("Content-Range"))
+        sha256 = request.headers.get("X-Chunk-SHA256")
+        if byte_range is None or byte_range[2] != session.size or not sha256:
+            return Response({"detail": "Content-Range and X-Chunk-SHA256 headers are required"}, status=status.HTTP_400_BAD_REQUEST)
+        start, end, total = byte_range
+        if end - start > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response({"detail": f"Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if int(request.headers.get("Content-Length") or 0) != end - start:
+            return Response({"detail": "Content-Length doesn't match Content-Range"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if covers(session.received, start, end): # 응답을 못 받고 재전송한 청크
+            return Response(upload_state(session))
+        if overlaps(session.received, start, end): # 이미 받은 바이트를 덮어쓰지 않도록
+            return Response({"detail": "Chunk overlaps received bytes", **upload_state(session)}, status=status.HTTP_409_CONFLICT)
+
+        part, final = session_paths(session)
+        if not write_chunk(part, start, request.stream, end - start, sha256):
+            return Response({"detail": "Checksum mismatch or incomplete chunk", **upload_state(session)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic(): # 동시에 들어온 청크끼리 구간 기록이 덮어써지지 않게
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            session.received = merge_range(session.received, start, end)
+            session.save(update_fields=["received"])
+        return Response(upload_state(session))
+
+    def delete(self, request, upload_id):
+        if not request.user.is_authenticated: return Response(status=status.HTTP_401_UNAUTHORIZED)
+        session = self.get_session(request, upload_id)
+        part, final = session_paths(session)
+        remove_upload_files(part)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(["POST"])
+def complete_upload(request, upload_id):
+    """모든 바이트를 받았으면 .part 파일을 원본 저장소에 넣고(로컬이면 이름만 바꿈) 미디어 생성"""
+    if not request.user.is_authenticated:
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    with transaction.atomic():
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update(), pk=upload_id, user_id=request.user.id, expires_at__gt=timezone.now()
+        )
+        if session.received != [[0, session.size]]:
+            return Response({"detail": "Upload is incomplete", **upload_state(session)}, status=status.HTTP_409_CONFLICT)
+
+        part, final = session_paths(session)
+        with open(part, "rb") as f:
+            sniffed = sniff_content_type(f.read(SNIFF_SIZE)) # 앞부분만 읽어 실제 형식 확인
+        if sniffed is None or media_type_of(sniffed) != media_type_of(session.content_type):
+            remove_upload_files(part)
+            session.delete()
+            return Response({"detail": "Unsupported media type"}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        name = store_upload(part, final, sniffed)
+        media = create_media(
+            request, session.id, session.filename, media_type_of(session.content_type) == "video",
+            file=name, content_type=sniffed, file_size=session.size
+        )
+        session.delete()
+
+    serializer = MediaSerializer(media)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 class VideoView(APIView):
     def get(self, request, vid):
-        video = get_object_or_404(Media, pk=vid, is_media=True)
+        video = get_object_or_404(Media, pk=vid, is_video=True)
+        video.views += view_counter.incr(video) # 조회수는 모아뒀다가 한꺼번에 DB에 반영
         serializer = MediaSerializer(video)
         return Response(serializer.data)
 
     def patch(self, request, vid):
         if not self.request.user.is_authenticated: return Response(status=status.HTTP_401_UNAUTHORIZED) # 유저가 로그인 되어있지 않다면 401 오류
 
-        v = Media.objects.get(pk=vid, is_media=True)
+        v = Media.objects.get(pk=vid, is_video=True)
         if v.actor.id != self.request.user.id: return Response(status=status.HTTP_404_NOT_FOUND) # 유저가 다른 사람의 영상을 수정하려고 할 때
 
         serializer = MediaSerializer(v, data=request.data) # 입력 값 역직렬화
@@ -136,16 +360,28 @@ class VideoView(APIView):
             return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(["GET", "HEAD"])
+def play_media(request, mid, is_video):
+    """
+    원본 파일 재생/다운로드. 메타데이터 조회(VideoView, PhotoView)와 같은 기준으로 여기서 확인한 뒤에만
+    파일을 보내므로 nginx 의 저장 경로는 외부에서 직접 열 수 없음
+    """
+    media = get_object_or_404(Media, pk=mid, is_video=is_video)
+    if not media.file:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return playback_response(request, media)
+
 class PhotoView(APIView):
     def get(self, request, iid):
-        img = get_object_or_404(Media, pk=iid, is_media=False)
+        img = get_object_or_404(Media, pk=iid, is_video=False)
+        img.views += view_counter.incr(img)
         serializer = MediaSerializer(img)
         return Response(serializer.data)
 
     def patch(self, request, iid):
         if not self.request.user.is_authenticated: return Response(status=status.HTTP_401_UNAUTHORIZED) # 유저가 로그인 되어있지 않다면 401 오류
 
-        v = Media.objects.get(pk=iid, is_media=False)
+        v = Media.objects.get(pk=iid, is_video=False)
         if v.actor.id != self.request.user.id: return Response(status=status.HTTP_404_NOT_FOUND) # 유저가 다른 사람의 이미지를 수정하려고 할 때
 
         serializer = MediaSerializer(v, data=request.data) # 입력 값 역직렬화
@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent after a batch has been written, with sender=model and counts={pk: n}.
+views_flushed = Signal()
+
+
+class WriteBehindBuffer:
+    """
+    Base of the in-process write-behind buffers: subclasses collect pending
+    writes under ``_lock`` and implement ``flush()``. A daemon thread, one
+    per process, calls it every ``interval_setting`` seconds, or early
+    after ``wake()``.
+    """
+    interval_setting = 'VIEW_COUNTER_FLUSH_INTERVAL'
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def flush(self):
+        raise NotImplementedError
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _ensure_worker(self):
+        # Started lazily so that each forked gunicorn worker gets its own
+        # thread; threads don't survive a fork, so is_alive() is False there.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(getattr(settings, self.interval_setting))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Anything escaping flush() would end the thread and with it
+                # every later flush, so log it and keep going.
+                logger.exception('Unexpected error while flushing %s', self.name)
+            finally:
+                connections.close_all()
+
+
+class WriteBehindCounter(WriteBehindBuffer):
+    """
+    Buffers increments of an integer column in process memory and writes
+    them back in batches.
+
+    Increments for the same row are merged, and each flush issues one
+    ``UPDATE ... SET field = field + n WHERE pk IN (...)`` per distinct n,
+    so a burst of reads on one row costs a single write instead of one
+    row lock per request. A daemon thread flushes every
+    ``VIEW_COUNTER_FLUSH_INTERVAL`` seconds, or early once
+    ``VIEW_COUNTER_MAX_PENDING`` rows are buffered, and once more at exit.
+    """
+
+    def __init__(self, field):
+        super().__init__(f'{field}-counter')
+        self.field = field
+        self._pending = defaultdict(Counter)
+
+    def incr(self, instance, amount=1):
+        """Buffers an increment and returns the amount still pending for the row."""
+        model = instance._meta.concrete_model
+        with self._lock:
+            counts = self._pending[model]
+            counts[instance.pk] += amount
+            pending = counts[instance.pk]
+            buffered = sum(len(c) for c in self._pending.values())
+
+        self._ensure_worker()
+        if buffered >= settings.VIEW_COUNTER_MAX_PENDING:
+            self.wake()
+        return pending
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, defaultdict(Counter)
+
+        for model, counts in batch.items():
+            if not counts:
+                continue
+            try:
+                self._write(model, counts)
+            except Exception:
+                logger.exception('Failed to flush %s.%s counters, requeueing', model.__name__, self.field)
+                with self._lock:
+                    self._pending[model].update(counts)
+                continue
+            try:
+                views_flushed.send(sender=model, counts=dict(counts))
+            except Exception:
+                # The counts are already written; only the receivers' side effects are lost.
+                logger.exception('views_flushed receiver failed for %s', model.__name__)
+
+    def _write(self, model, counts):
+        by_amount = defaultdict(list)
+        for pk, amount in counts.items():
+            by_amount[amount].append(pk)
+
+        with transaction.atomic():
+            for amount, pks in by_amount.items():
+                model.objects.filter(pk__in=sorted(pks)).update(**{self.field: F(self.field) + amount})
+
+
+view_counter = WriteBehindCounter('views')
+atexit.register(view_counter.flush)
@@ -0,0 +1,203 @@
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Model, Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_SALT = 'pororohub.pagination.cursor'
+
+
+def get_keyset_ordering(queryset):
+    """
+    Returns the queryset ordering as a list of field names with the primary
+    key appended as a tie breaker, or None when the ordering can't be used
+    as a keyset (e.g. it contains expressions).
+    """
+    if queryset.query.order_by:
+        ordering = list(queryset.query.order_by)
+    elif queryset.query.default_ordering:
+        ordering = list(queryset.model._meta.ordering)
+    else:
+        ordering = []
+
+    if not all(isinstance(field, str) and field != '?' for field in ordering):
+        return None
+
+    pk_name = queryset.model._meta.pk.name
+    names = [field.lstrip('-') for field in ordering]
+    if 'pk' not in names and pk_name not in names:
+        ordering.append(pk_name)
+    return ordering
+
+
+def get_keyset_values(obj, ordering):
+    values = []
+    for field in ordering:
+        value = obj
+        for attr in field.lstrip('-').split('__'):
+            value = getattr(value, 'pk' if attr == 'pk' else attr)
+        # Ordering by a foreign key orders by its id
+        values.append(value.pk if isinstance(value, Model) else value)
+    return values
+
+
+def encode_cursor(values, ordering):
+    """
+    Signs the keyset values of the last row together with the ordering they
+    belong to, so a cursor from another sort is rejected instead of misapplied.
+    """
+    payload = {
+        'o': ','.join(ordering),
+        'v': [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values],
+    }
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise NotFound('Invalid cursor')
+
+    if (
+        not isinstance(payload, dict)
+        or payload.get('o') != ','.join(ordering)
+        or not isinstance(payload.get('v'), list)
+        or len(payload['v']) != len(ordering)
+    ):
+        raise NotFound('Invalid cursor')
+    return [parse_datetime(v['dt']) if isinstance(v, dict) else v for v in payload['v']]
+
+
+def is_nullable(model, name):
+    """True if the (possibly related) field path can be NULL in a query row."""
+    for attr in name.split('__'):
+        field = model._meta.pk if attr == 'pk' else model._meta.get_field(attr)
+        if field.null or (field.is_relation and not field.concrete):
+            return True
+        if not field.is_relation:
+            return False
+        model = field.related_model
+    return False
+
+
+def keyset_filter(ordering, values, model):
+    """
+    Builds the "strictly after this row" condition for a keyset ordering:
+    (a > x) OR (a = x AND b > y) OR ... with the comparison flipped for
+    descending fields.
+
+    NULLs sort last ascending and first descending (PostgreSQL's default),
+    and never compare equal or unequal, so nullable fields get explicit
+    IS NULL / IS NOT NULL branches.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        if value is None:
+            # Only non-NULL values follow a NULL, and only when descending.
+            after = Q(**{f'{name}__isnull': False}) if descending else None
+        else:
+            after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            if not descending and is_nullable(model, name):
+                after |= Q(**{f'{name}__isnull': True})
+        if after is not None:
+            condition |= Q(**equal) & after
+        # exact=None is turned into IS NULL by the ORM
+        equal[name] = value
+    return condition
+
+
+def paginate_keyset(queryset, ordering, cursor, page_size, exclude=None, max_batches=10):
+    """
+    Returns (objects, next_values) for one page of a keyset ordered queryset.
+    next_values is None on the last page.
+
+    Objects for which ``exclude(obj)`` is true are skipped and further rows
+    are read to fill the page, up to ``max_batches`` batches of a page each;
+    past that the page comes back short with a cursor after the last row read.
+    """
+    queryset = queryset.order_by(*ordering)
+    after = decode_cursor(cursor, ordering) if cursor else None
+    page = []
+    for _ in range(max_batches if exclude is not None else 1):
+        batch = queryset.filter(keyset_filter(ordering, after, queryset.model)) if after is not None else queryset
+        objects = list(batch[:page_size + 1])
+        for obj in objects:
+            if exclude is not None and exclude(obj):
+                continue
+            if len(page) == page_size:
+                return page, get_keyset_values(page[-1], ordering)
+            page.append(obj)
+        if len(objects) <= page_size:
+            return page, None
+        after = get_keyset_values(objects[-1], ordering)
+    return page, after
+
+
+class StandardPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in cursor mode.
+
+    Passing ``?cursor=`` (empty for the first page) switches to keyset
+    pagination over the queryset ordering plus the primary key. Cursor pages
+    skip the COUNT(*) query and the OFFSET scan, so deep pages cost the same
+    as the first one.
+
+    Setting ``exclude`` to a predicate drops matching objects before the
+    page is cut (see paginate_keyset); it always uses cursor mode, since
+    page numbers can't be kept stable around skipped rows.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    cursor_mode = False
+    exclude = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            (self.exclude is not None or self.cursor_query_param in request.query_params)
+            and isinstance(queryset, QuerySet)
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        ordering = get_keyset_ordering(queryset)
+        if ordering is None:
+            self.cursor_mode = False
+            page = super().paginate_queryset(queryset, request, view)
+            return [obj for obj in page if not self.exclude(obj)] if self.exclude is not None else page
+
+        self.request = request
+        objects, next_values = paginate_keyset(
+            queryset,
+            ordering,
+            request.query_params.get(self.cursor_query_param),
+            self.get_page_size(request),
+            self.exclude,
+        )
+        self.next_cursor = encode_cursor(next_values, ordering) if next_values is not None else None
+        return objects
+
+    def get_next_cursor_link(self):
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return Response({
+                'next': self.get_next_cursor_link(),
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
     'actor',
     'media',
     'post',
+    'search',
 ]
 
 MIDDLEWARE = [
@@ -148,6 +150,89 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # CLOUDFLARE_R2_CUSTOM_DOMAIN = ''
 
+# Write-behind view counters (pororohub/counters.py)
+VIEW_COUNTER_FLUSH_INTERVAL = 5  # seconds between batched UPDATEs
+VIEW_COUNTER_MAX_PENDING = 1000  # buffered rows that trigger an early flush
+
+# Recommendations (post/scoring.py)
+RECOMMENDATION_SCORER = 'post.scoring.ContentScorer'
+RECOMMENDATION_MATRIX_TTL = 60  # seconds a process reuses its post x tag matrix
+SIMILAR_POSTS_PER_POST = 20  # neighbors stored per post by build_similar_posts
+RECOMMENDATION_CF_MODEL_DIR = BASE_DIR / 'var' / 'cf_model'  # written by train_cf_model
+RECOMMENDATION_CF_WEIGHT = 3.0  # weight of the [0, 1] CF score added to the content score
+RECOMMENDATION_CF_RELOAD_INTERVAL = 60  # seconds between checks for a retrained model
+RECOMMENDATION_STORE_SIZE = 100  # posts kept per user in UserRecommendation
+RECOMMENDATION_STORE_TTL = 6 * 60 * 60  # seconds before a stored list is recomputed on read
+RECOMMENDATION_LIKE_BOOST = 5.0  # added to a liked post's neighbors when re-ranking
+SEEN_FILTER_CAPACITY = 5000  # posts per Bloom filter generation (two are kept per user)
+SEEN_FILTER_ERROR_RATE = 0.01  # false positive rate, i.e. unseen posts wrongly skipped
+SEEN_FILTER_FLUSH_INTERVAL = 5  # seconds between batched writes of viewed posts (post/seen.py)
+SEEN_FILTER_MAX_PENDING = 1000  # buffered users that trigger an early flush
+
+# Trending tags and categories (post/activity.py)
+ACTIVITY_BUCKET_SECONDS = 5 * 60  # granularity of the activity buckets, and so of the windows
+ACTIVITY_WINDOWS = {'1h': 60 * 60, '24h': 24 * 60 * 60, '7d': 7 * 24 * 60 * 60}  # seconds per ?window=
+ACTIVITY_WEIGHTS = {'posts': 3, 'likes': 1}  # score per published post and per like
+
+# Hot ranking of the popular feed (post.models.hot_score)
+HOT_SCORE_HALF_LIFE_HOURS = 12  # a post needs twice the engagement to rank like one this much newer
+HOT_SCORE_WEIGHTS = {'likes': 1.0, 'views': 0.1}  # engagement per like and per view
+
+# Personalized feed inboxes (post/feed.py)
+FEED_INBOX_SIZE = 500  # newest post ids kept per user
+FEED_FANOUT_MAX_SUBSCRIBERS = 10000  # terms followed by more users are read at request time instead
+FEED_FANOUT_BATCH_SIZE = 1000  # inboxes written per upsert
+FEED_SUBSCRIBER_COUNT_TTL = 300  # seconds a process reuses a term's subscriber count for push/pull
+FEED_SUBSCRIBER_COUNT_MAX_TERMS = 100000  # cached term counts per process before the cache is reset
+
+# Search (search/engine.py)
+SEARCH_BACKEND = 'database'  # 'database' (Postgres full-text) or 'index' (in-process inverted index)
+SEARCH_INDEX_DIR = BASE_DIR / 'var' / 'search'  # snapshots written by build_search_index
+SEARCH_INDEX_REFRESH_INTERVAL = 5  # seconds between reads of the change log per process
+SEARCH_INDEX_CHANGE_RETENTION = 7 * 24 * 60 * 60  # seconds of change log kept; older indexes are rebuilt
+SEARCH_INDEX_MAX_HOLE_RATIO = 0.25  # share of empty ordinals (removed documents) that triggers compaction
+SEARCH_AUTOCOMPLETE_TTL = 300  # seconds before a process rebuilds its autocomplete prefix indexes
+SEARCH_CACHE_ALIAS = 'search'
+SEARCH_CACHE_TIMEOUT = 300  # seconds a cached result list lives even without writes
+SEARCH_CACHE_MAX_RESULTS = 5000  # longer result lists are not cached
+
+# Trending videos (media/trending.py)
+TRENDING_WINDOW_DAYS = 7  # hourly engagement buckets kept in OneWeekVideoStatics
+TRENDING_HALF_LIFE_HOURS = 24  # age at which a bucket counts half
+TRENDING_WEIGHTS = {'views': 1, 'likes': 5, 'dislikes': -3}  # per engagement event
+
+# Resumable uploads (media/uploads.py)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # chunk size suggested to clients
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024  # larger chunks are rejected; keep below nginx's client_max_body_size
+UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024  # bytes per uploaded file
+UPLOAD_SESSION_TTL = 24 * 60 * 60  # seconds an unfinished upload can be resumed
+MEDIA_STORAGE = 'local'  # where uploaded originals go: 'local' (MEDIA_ROOT) or 'r2'
+
+# Cloudflare R2 transfers (media/storage.py)
+R2_MULTIPART_THRESHOLD = 16 * 1024 * 1024  # larger saves are uploaded in parts instead of one PUT
+R2_PART_SIZE = 8 * 1024 * 1024  # bytes per multipart part (5MB minimum except the last)
+R2_UPLOAD_CONCURRENCY = 4  # parts uploaded at once, and so parts held in memory per upload
+R2_READ_BUFFER_SIZE = 1024 * 1024  # read-ahead of files opened from R2
+R2_MAX_POOL_CONNECTIONS = 32  # HTTP connections per process, shared by every R2 call
+R2_BATCH_CONCURRENCY = 16  # HEAD requests in flight for exists_many/size_many
+R2_SLOW_OPERATION_SECONDS = 2.0  # R2 calls slower than this are logged as warnings
+MEDIA_ACCEL_REDIRECT = False  # let nginx send played files (X-Accel-Redirect) instead of streaming them from Django
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'  # nginx internal location aliased to MEDIA_ROOT
+FILE_DELETE_FLUSH_INTERVAL = 2  # seconds between batched deletes of files of deleted rows (media/cleanup.py)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Per-process LRU for development; settings_prod switches to Redis so
+    # cached results and generation counters are shared across workers.
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'search',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
     'http://127.0.0.1:5173',
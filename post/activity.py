@@ -0,0 +1,165 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+
+def bucket_start(at):
+    size = settings.ACTIVITY_BUCKET_SECONDS
+    return datetime.fromtimestamp(int(at.timestamp()) // size * size, tz=dt_timezone.utc)
+
+
+def activity_score(posts, likes):
+    weights = settings.ACTIVITY_WEIGHTS
+    return posts * weights['posts'] + likes * weights['likes']
+
+
+def record_activity(events, at=None):
+    """
+    Adds {(kind, item_id): (posts, likes)} to the current bucket and to the
+    counters of every window, as one upsert per table.
+    """
+    from .models import ActivityBucket, ActivityCounter
+
+    events = sorted((key, counts) for key, counts in events.items() if any(counts))
+    if not events:
+        return
+
+    start = bucket_start(at or timezone.now())
+    bucket_rows = [(kind, item_id, start, posts, likes) for (kind, item_id), (posts, likes) in events]
+    counter_rows = [
+        (kind, item_id, span, posts, likes, activity_score(posts, likes))
+        for (kind, item_id), (posts, likes) in events
+        for span in sorted(settings.ACTIVITY_WINDOWS)
+    ]
+
+    buckets = ActivityBucket._meta.db_table
+    counters = ActivityCounter._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {buckets} (kind, item_id, start, posts, likes)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(bucket_rows))}
+            ON CONFLICT (kind, item_id, start) DO UPDATE SET
+                posts = {buckets}.posts + EXCLUDED.posts,
+                likes = {buckets}.likes + EXCLUDED.likes
+        """, [value for row in bucket_rows for value in row])
+        cursor.execute(f"""
+            INSERT INTO {counters} (kind, item_id, span, posts, likes, score)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(counter_rows))}
+            ON CONFLICT (kind, span, item_id) DO UPDATE SET
+                posts = {counters}.posts + EXCLUDED.posts,
+                likes = {counters}.likes + EXCLUDED.likes,
+                score = {counters}.score + EXCLUDED.score
+        """, [value for row in counter_rows for value in row])
+
+
+def post_activity(post_ids, posts=0, likes=0, published_only=True):
+    """
+    Events for the categories and tags of the published posts among
+    `post_ids`, or of all of them (e.g. one being unpublished) when
+    `published_only` is False.
+    """
+    from .models import Post
+
+    events = Counter()
+    published = Post.objects.filter(pk__in=list(post_ids))
+    if published_only:
+        published = published.filter(is_published=True)
+    for category_id in published.filter(category__isnull=False).values_list('category_id', flat=True):
+        events['category', category_id] += 1
+    for tag_id in Post.tags.through.objects.filter(post__in=published).values_list('tag_id', flat=True):
+        events['tag', tag_id] += 1
+    return {key: (posts * count, likes * count) for key, count in events.items()}
+
+
+def record_post_activity(post_ids, posts=0, likes=0):
+    transaction.on_commit(lambda: record_activity(post_activity(post_ids, posts, likes)))
+
+
+_expired_bucket = None
+
+
+def expire_activity_if_due(now=None):
+    # Window cutoffs only move when a new bucket starts, so each process
+    # expires at most once per bucket.
+    global _expired_bucket
+    now = now or timezone.now()
+    current = bucket_start(now)
+    if current != _expired_bucket:
+        expire_activity(now)
+        _expired_bucket = current
+
+
+def expire_activity(now=None):
+    """
+    Subtracts the buckets that left each window since the last call,
+    dropping counters that reached zero, then deletes buckets older than
+    the longest window. The work is proportional to the expired buckets only.
+    A window another process is already expiring is skipped.
+    """
+    from .models import ActivityBucket, ActivityCounter, ActivityWindow
+
+    now = now or timezone.now()
+    windows = settings.ACTIVITY_WINDOWS
+    with transaction.atomic():
+        marks = {
+            mark.span: mark
+            for mark in ActivityWindow.objects.select_for_update(skip_locked=True).filter(span__in=list(windows))
+        }
+        missing = [span for span in windows if span not in marks]
+        if missing:
+            # Nothing has been subtracted yet, so start from the oldest bucket.
+            oldest = ActivityBucket.objects.aggregate(start=Min('start'))['start'] or bucket_start(now)
+            ActivityWindow.objects.bulk_create(
+                [ActivityWindow(span=span, expired_before=oldest) for span in missing], ignore_conflicts=True
+            )
+
+        expired_before = []
+        for span, mark in marks.items():
+            cutoff = bucket_start(now - timedelta(seconds=windows[span]))
+            if cutoff > mark.expired_before:
+                subtract_buckets(span, mark.expired_before, cutoff)
+                mark.expired_before = cutoff
+                mark.save(update_fields=['expired_before'])
+            expired_before.append(mark.expired_before)
+
+        if len(expired_before) == len(windows):
+            ActivityBucket.objects.filter(start__lt=min(expired_before)).delete()
+
+
+def subtract_buckets(span, since, until):
+    from .models import ActivityBucket, ActivityCounter
+
+    rows = [
+        (row['kind'], row['item_id'], row['posts'], row['likes'], activity_score(row['posts'], row['likes']))
+        for row in ActivityBucket.objects.filter(start__gte=since, start__lt=until)
+        .values('kind', 'item_id').annotate(posts=Sum('posts'), likes=Sum('likes')).order_by('kind', 'item_id')
+    ]
+    if not rows:
+        return
+
+    counters = ActivityCounter._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {counters} AS c SET
+                posts = c.posts - e.posts, likes = c.likes - e.likes, score = c.score - e.score
+            FROM (VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))}) AS e (kind, item_id, posts, likes, score)
+            WHERE c.span = %s AND c.kind = e.kind AND c.item_id = e.item_id
+        """, [value for row in rows for value in row] + [span])
+    # Only exact zeros: an unlike is counted when it happens, so a counter
+    # can dip below zero until the bucket holding the like expires as well.
+    ActivityCounter.objects.filter(
+        span=span, item_id__in={row[1] for row in rows}, posts=0, likes=0
+    ).delete()
+
+
+def trending(kind, span, limit):
+    """[(item_id, posts, likes, score), ...] read from the window's counter index."""
+    from .models import ActivityCounter
+
+    return list(ActivityCounter.objects.filter(kind=kind, span=span, score__gt=0).order_by(
+        '-score', 'item_id'
+    ).values_list('item_id', 'posts', 'likes', 'score')[:limit])
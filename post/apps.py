@@ -5,3 +5,5 @@ class PostConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'post'
 
+    def ready(self):
+        from . import signals  # noqa: F401
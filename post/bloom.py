@@ -0,0 +1,79 @@
+import hashlib
+import math
+import struct
+
+import numpy as np
+
+HEADER = struct.Struct('>IHI')
+MASK64 = (1 << 64) - 1
+
+
+def optimal_size(capacity, error_rate):
+    """Returns (bits, hashes) for a filter holding `capacity` keys at `error_rate`."""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def key_hashes(key):
+    return struct.unpack('>QQ', hashlib.blake2b(key.encode(), digest_size=16).digest())
+
+
+def bit_positions(key, bits, hashes):
+    """Double hashing: position i is ((h1 + i * h2) mod 2^64) mod bits."""
+    h1, h2 = key_hashes(key)
+    return [((h1 + i * h2) & MASK64) % bits for i in range(hashes)]
+
+
+def bit_positions_array(keys, bits, hashes):
+    """bit_positions for many keys as a keys x hashes array (uint64 math wraps like MASK64)."""
+    hashed = np.array([key_hashes(key) for key in keys], dtype=np.uint64).reshape(-1, 2)
+    steps = np.arange(hashes, dtype=np.uint64)
+    return (hashed[:, :1] + steps * hashed[:, 1:]) % np.uint64(bits)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys, serialized as a small header
+    followed by the bit array.
+    """
+    def __init__(self, bits, hashes, data=None, count=0):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+        self.count = count
+
+    def add(self, key):
+        """Adds `key` and returns False if it was (probably) already present."""
+        added = False
+        for position in bit_positions(key, self.bits, self.hashes):
+            byte, bit = divmod(position, 8)
+            if not self.data[byte] & (1 << bit):
+                self.data[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key):
+        return all(
+            self.data[position // 8] & (1 << (position % 8))
+            for position in bit_positions(key, self.bits, self.hashes)
+        )
+
+    def contains_positions(self, positions):
+        """
+        Vectorized membership for many keys at once. `positions` is a
+        keys x hashes array of bit positions computed for this filter's size.
+        """
+        bitmap = np.unpackbits(np.frombuffer(bytes(self.data), dtype=np.uint8), bitorder='little')
+        return bitmap[positions].all(axis=1)
+
+    def to_bytes(self):
+        return HEADER.pack(self.bits, self.hashes, self.count) + bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        raw = bytes(raw)
+        bits, hashes, count = HEADER.unpack_from(raw)
+        return cls(bits, hashes, raw[HEADER.size:], count)
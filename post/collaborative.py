@@ -0,0 +1,170 @@
+import os
+import shutil
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+CURRENT_FILE = 'CURRENT'
+ITEM_IDS_FILE = 'item_ids.npy'
+ITEM_FACTORS_FILE = 'item_factors.npy'
+
+
+class NotEnoughData(Exception):
+    pass
+
+
+def read_likes(chunk_size):
+    """
+    Streams (user, post) pairs of published posts into a sparse user x item
+    matrix. Only compact index arrays are kept in memory, never model rows.
+    """
+    from .models import Like
+
+    user_index, item_index = {}, {}
+    user_rows, item_cols = array('i'), array('i')
+    likes = Like.objects.filter(post__is_published=True).values_list('user_id', 'post_id')
+    for user_id, post_id in likes.iterator(chunk_size=chunk_size):
+        user_rows.append(user_index.setdefault(user_id, len(user_index)))
+        item_cols.append(item_index.setdefault(post_id, len(item_index)))
+
+    rows = np.frombuffer(user_rows, dtype=np.int32)
+    cols = np.frombuffer(item_cols, dtype=np.int32)
+    interactions = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(user_index), len(item_index)),
+    )
+    return interactions, list(item_index)
+
+
+def factorize(interactions, factors):
+    """
+    PureSVD on the like matrix with items normalized by popularity, so a
+    user's score for an item is the dot product of the item factors with
+    the sum of the factors of the items the user liked.
+    """
+    k = min(factors, min(interactions.shape) - 1)
+    if k < 1:
+        raise NotEnoughData('Need likes from at least two users on at least two posts')
+
+    item_degree = np.asarray(interactions.sum(axis=0)).ravel()
+    normalized = interactions @ sparse.diags(1.0 / np.sqrt(item_degree))
+    _, _, vt = svds(normalized.astype(np.float64), k=k)
+    return np.ascontiguousarray(vt.T, dtype=np.float32)
+
+
+def train_cf_model(factors, chunk_size, keep=2):
+    """Trains a model from the Like table and publishes it as the current artifact."""
+    interactions, item_ids = read_likes(chunk_size)
+    item_factors = factorize(interactions, factors)
+
+    # Items are stored sorted by post id so workers can look rows up with a
+    # binary search on the mapped array instead of building a dict each.
+    order = np.argsort(np.array(item_ids, dtype='<U16'))
+    item_ids = np.array(item_ids, dtype='<U16')[order]
+    item_factors = item_factors[order]
+
+    model_dir = settings.RECOMMENDATION_CF_MODEL_DIR
+    version = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    version_dir = os.path.join(model_dir, version)
+    os.makedirs(version_dir)
+    np.save(os.path.join(version_dir, ITEM_IDS_FILE), item_ids)
+    np.save(os.path.join(version_dir, ITEM_FACTORS_FILE), item_factors)
+
+    pointer = os.path.join(model_dir, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(pointer + '.tmp', pointer)
+
+    versions = sorted(name for name in os.listdir(model_dir) if name.isdigit())
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(model_dir, old), ignore_errors=True)
+
+    return version, interactions.shape
+
+
+class CFModel:
+    """
+    Item factors memory-mapped read-only, so every gunicorn worker on the
+    host shares the same page cache copy of the artifact.
+    """
+    def __init__(self, version, item_ids, item_factors):
+        self.version = version
+        self.item_ids = item_ids
+        self.item_factors = item_factors
+        self._aligned = None
+
+    @classmethod
+    def load(cls, version):
+        version_dir = os.path.join(settings.RECOMMENDATION_CF_MODEL_DIR, version)
+        return cls(
+            version,
+            np.load(os.path.join(version_dir, ITEM_IDS_FILE), mmap_mode='r'),
+            np.load(os.path.join(version_dir, ITEM_FACTORS_FILE), mmap_mode='r'),
+        )
+
+    def rows_of(self, post_ids):
+        """Returns (rows, found) with rows into the item arrays for `post_ids`."""
+        post_ids = np.asarray(post_ids, dtype='<U16')
+        rows = np.searchsorted(self.item_ids, post_ids)
+        rows[rows == len(self.item_ids)] = 0
+        found = self.item_ids[rows] == post_ids if len(self.item_ids) else np.zeros(len(post_ids), dtype=bool)
+        return rows, found
+
+    def aligned_rows(self, post_ids):
+        # Candidate lists (PostMatrix.post_ids) are reused across requests, so
+        # the lookup is done once per list rather than on every call.
+        aligned = self._aligned
+        if aligned is None or aligned[0] is not post_ids:
+            aligned = (post_ids, *self.rows_of(post_ids))
+            self._aligned = aligned
+        return aligned[1], aligned[2]
+
+    def user_vector(self, liked_post_ids):
+        rows, found = self.rows_of(liked_post_ids)
+        return self.item_factors[rows[found]].sum(axis=0)
+
+    def score(self, liked_post_ids, post_ids):
+        """CF scores aligned with `post_ids`, scaled to [0, 1]; 0 for unknown posts."""
+        scores = np.zeros(len(post_ids))
+        if not len(liked_post_ids) or not len(post_ids):
+            return scores
+
+        user = self.user_vector(liked_post_ids)
+        rows, found = self.aligned_rows(post_ids)
+        scores[found] = self.item_factors[rows[found]] @ user
+        np.clip(scores, 0, None, out=scores)
+        top = scores.max()
+        return scores / top if top > 0 else scores
+
+
+_model = None
+_checked_at = None
+_model_lock = threading.Lock()
+
+
+def get_cf_model():
+    """
+    Returns the current model, or None when none has been trained. The
+    CURRENT pointer is re-read at most every RECOMMENDATION_CF_RELOAD_INTERVAL
+    seconds so workers pick up a retrained model without a restart.
+    """
+    global _model, _checked_at
+    with _model_lock:
+        if _checked_at is not None and time.monotonic() - _checked_at < settings.RECOMMENDATION_CF_RELOAD_INTERVAL:
+            return _model
+        _checked_at = time.monotonic()
+        try:
+            with open(os.path.join(settings.RECOMMENDATION_CF_MODEL_DIR, CURRENT_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            _model = None
+            return None
+        if _model is None or _model.version != version:
+            _model = CFModel.load(version)
+        return _model
@@ -0,0 +1,272 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+
+logger = logging.getLogger(__name__)
+
+
+def interest_terms(interests):
+    """Comma separated ActorDetails.interests -> normalized, de-duplicated terms."""
+    terms = []
+    for term in (interests or '').split(','):
+        term = term.strip().lower()[:100]
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def to_millis(at):
+    return int(at.timestamp() * 1000)
+
+
+def from_millis(millis):
+    return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc)
+
+
+def sync_subscriptions(user_id, interests):
+    """Replaces the user's subscriptions and returns True if they changed."""
+    from .models import InterestSubscription
+
+    terms = interest_terms(interests)
+    with transaction.atomic():
+        current = set(InterestSubscription.objects.filter(user_id=user_id).values_list('term', flat=True))
+        if current == set(terms):
+            return False
+        InterestSubscription.objects.filter(user_id=user_id).exclude(term__in=terms).delete()
+        InterestSubscription.objects.bulk_create(
+            [InterestSubscription(user_id=user_id, term=term) for term in terms if term not in current]
+        )
+    return True
+
+
+_subscriber_counts = {}  # term -> (subscribers, monotonic time counted)
+_subscriber_counts_lock = threading.Lock()
+
+
+def subscriber_counts(terms):
+    """
+    {term: subscribers}, counted at most every FEED_SUBSCRIBER_COUNT_TTL
+    seconds per term and process. The counts only pick push or pull, so
+    being a few minutes behind is harmless.
+    """
+    from .models import InterestSubscription
+
+    now = time.monotonic()
+    ttl = settings.FEED_SUBSCRIBER_COUNT_TTL
+    with _subscriber_counts_lock:
+        cached = {term: _subscriber_counts.get(term) for term in terms}
+    counts = {term: entry[0] for term, entry in cached.items() if entry and now - entry[1] <= ttl}
+    missing = [term for term in terms if term not in counts]
+    if missing:
+        fresh = dict(InterestSubscription.objects.filter(term__in=missing).values('term').annotate(
+            subscribers=Count('id')
+        ).values_list('term', 'subscribers'))
+        fresh = {term: fresh.get(term, 0) for term in missing}
+        with _subscriber_counts_lock:
+            if len(_subscriber_counts) > settings.FEED_SUBSCRIBER_COUNT_MAX_TERMS:
+                _subscriber_counts.clear()
+            _subscriber_counts.update((term, (count, now)) for term, count in fresh.items())
+        counts.update(fresh)
+    return counts
+
+
+def split_terms(terms):
+    """
+    (push, pull): terms with at most FEED_FANOUT_MAX_SUBSCRIBERS subscribers
+    are fanned out on write, more popular ones are read at request time.
+    """
+    terms = list(terms)
+    counts = subscriber_counts(set(terms))
+    push = [term for term in terms if counts.get(term, 0) <= settings.FEED_FANOUT_MAX_SUBSCRIBERS]
+    pull = [term for term in terms if counts.get(term, 0) > settings.FEED_FANOUT_MAX_SUBSCRIBERS]
+    return push, pull
+
+
+def matching_posts(terms):
+    """Published posts whose category or one of whose tags is named like one of `terms`."""
+    from .models import Category, Post, Tag
+
+    tag_ids = Tag.objects.annotate(lower_name=Lower('name')).filter(lower_name__in=terms).values('id')
+    category_ids = Category.objects.annotate(lower_name=Lower('name')).filter(lower_name__in=terms).values('id')
+    return Post.objects.filter(
+        Q(category_id__in=category_ids) | Q(pk__in=Post.tags.through.objects.filter(tag_id__in=tag_ids).values('post_id')),
+        is_published=True,
+    )
+
+
+def fanout_post(post_id):
+    """
+    Merges a published post into the inboxes of the users subscribed to
+    one of its tags or its category, skipping inboxes that already have
+    it. One upsert per FEED_FANOUT_BATCH_SIZE users.
+    """
+    from .models import FeedInbox, InterestSubscription, Post
+
+    post = Post.objects.filter(pk=post_id, is_published=True).select_related('category').first()
+    if post is None:
+        return 0
+    terms = {name.lower() for name in post.tags.values_list('name', flat=True)}
+    if post.category is not None:
+        terms.add(post.category.name.lower())
+    push, pull = split_terms(terms)
+    if not push:
+        return 0
+
+    user_ids = list(InterestSubscription.objects.filter(term__in=push).exclude(user_id=post.user_id).values_list(
+        'user_id', flat=True
+    ).distinct().order_by('user_id'))
+    inbox = FeedInbox._meta.db_table
+    size = settings.FEED_INBOX_SIZE
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    for i in range(0, len(user_ids), batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {inbox} (user_id, post_ids, published, updated_at)
+                SELECT u, ARRAY[%s]::varchar(16)[], ARRAY[%s]::bigint[], now()
+                FROM unnest(%s::integer[]) AS u
+                ON CONFLICT (user_id) DO UPDATE SET
+                    -- A post can be published (or tagged) long after it was
+                    -- created, so it is merged in by time and the inbox is
+                    -- cut in feed order (feed_key), not by array position.
+                    (post_ids, published) = (
+                        SELECT array_agg(post_id ORDER BY t DESC, post_id COLLATE "C"),
+                               array_agg(t ORDER BY t DESC, post_id COLLATE "C")
+                        FROM (
+                            SELECT post_id, t FROM (
+                                SELECT post_id, t FROM unnest({inbox}.post_ids, {inbox}.published) AS e(post_id, t)
+                                UNION ALL
+                                SELECT EXCLUDED.post_ids[1], EXCLUDED.published[1]
+                            ) AS entries
+                            ORDER BY t DESC, post_id COLLATE "C"
+                            LIMIT %s
+                        ) AS kept
+                    ),
+                    updated_at = now()
+                WHERE NOT {inbox}.post_ids @> EXCLUDED.post_ids
+            """, [post.pk, to_millis(post.created_at), user_ids[i:i + batch_size], size])
+    return len(user_ids)
+
+
+def seed_inbox(user_id):
+    """Rebuilds a user's inbox from the latest posts matching their fanned-out terms."""
+    from .models import FeedInbox, InterestSubscription
+
+    push, pull = split_terms(InterestSubscription.objects.filter(user_id=user_id).values_list('term', flat=True))
+    rows = list(matching_posts(push).exclude(user_id=user_id).order_by('-created_at', 'id').values_list(
+        'id', 'created_at'
+    )[:settings.FEED_INBOX_SIZE]) if push else []
+    FeedInbox.objects.update_or_create(user_id=user_id, defaults={
+        'post_ids': [post_id for post_id, created_at in rows],
+        'published': [to_millis(created_at) for post_id, created_at in rows],
+    })
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def run_in_background(func, *args):
+    # Created lazily per process: a forked gunicorn worker doesn't inherit
+    # the parent's executor thread.
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed-fanout')
+            _executor_pid = os.getpid()
+        executor = _executor
+
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Feed task %s%r failed', func.__name__, args)
+        finally:
+            connections.close_all()
+
+    return executor.submit(run)
+
+
+def schedule_fanout(post_id):
+    transaction.on_commit(lambda: run_in_background(fanout_post, post_id))
+
+
+def schedule_seed(user_id):
+    transaction.on_commit(lambda: run_in_background(seed_inbox, user_id))
+
+
+def feed_key(entry):
+    """Feed order of a (time in ms, post id) entry: newest first, then by id."""
+    return -entry[0], entry[1]
+
+
+def feed_entries(user_id, cursor, batch_size):
+    """
+    Yields the (time in ms, post id) entries of a user's feed after
+    `cursor` in feed order: their inbox merged with the latest posts of the
+    tags and categories too popular to fan out, which are read
+    `batch_size` at a time.
+    """
+    from .models import FeedInbox, InterestSubscription
+
+    def after(entry, bound):
+        return bound is None or feed_key(entry) > feed_key(bound)
+
+    inbox = FeedInbox.objects.filter(user_id=user_id).values_list('post_ids', 'published').first() or ([], [])
+    inbox = sorted(
+        [(published, post_id) for post_id, published in zip(*inbox) if after((published, post_id), cursor)],
+        key=feed_key,
+    )
+    push, pull = split_terms(InterestSubscription.objects.filter(user_id=user_id).values_list('term', flat=True))
+
+    yielded, position = set(), cursor
+    while True:
+        pulled, boundary = [], None
+        if pull:
+            rows = matching_posts(pull).exclude(user_id=user_id)
+            if position is not None:
+                rows = rows.filter(created_at__lt=from_millis(position[0] + 1))
+            rows = list(rows.order_by('-created_at', 'id').values_list('id', 'created_at')[:batch_size])
+            pulled = [(to_millis(created_at), post_id) for post_id, created_at in rows]
+            if len(rows) == batch_size and after(pulled[-1], position):
+                # Later pulled posts may sort anywhere past the last one read.
+                boundary = pulled[-1]
+            pulled = [entry for entry in pulled if after(entry, position)]
+
+        ready = [entry for entry in inbox if boundary is None or not after(entry, boundary)]
+        inbox = inbox[len(ready):]
+        for entry in sorted(ready + pulled, key=feed_key):
+            if entry[1] not in yielded:
+                yielded.add(entry[1])
+                yield entry
+        if boundary is None:
+            return
+        position = boundary
+
+
+def feed_page(user_id, cursor, page_size, exclude=None, max_batches=10):
+    """
+    Returns (post_ids, next_cursor_values) for one page of a user's feed,
+    with cursor values [time in ms, post id]. Posts for which
+    exclude(post_id) is true are skipped and the page is filled from
+    further entries, reading at most `max_batches` pages worth of them.
+    """
+    page, scanned = [], 0
+    for entry in feed_entries(user_id, cursor, page_size + 1):
+        scanned += 1
+        if exclude is not None and exclude(entry[1]):
+            if scanned >= page_size * max_batches:
+                return [post_id for published, post_id in page], list(entry)
+            continue
+        if len(page) == page_size:
+            return [post_id for published, post_id in page], list(page[-1])
+        page.append(entry)
+    return [post_id for published, post_id in page], None
@@ -0,0 +1,55 @@
+import multiprocessing
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from post.recommendation import score_recommendations, store_recommendations
+from post.scoring import get_scoring_engine
+
+
+def _build_chunk(user_ids):
+    # Each worker opens its own database connection on first use.
+    results = {user.pk: score_recommendations(user, settings.RECOMMENDATION_STORE_SIZE)
+               for user in User.objects.filter(pk__in=user_ids)}
+    store_recommendations(results)
+    connections.close_all()
+    return len(results)
+
+
+class Command(BaseCommand):
+    help = 'Precomputes stored recommendation lists for recently active users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Number of worker processes')
+        parser.add_argument('--active-days', type=int, default=30,
+                            help='Only users who logged in or liked a post within this many days')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users per worker task')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['active_days'])
+        user_ids = list(User.objects.filter(
+            Q(last_login__gte=since) | Q(likes__created_at__gte=since),
+            is_active=True
+        ).distinct().values_list('pk', flat=True))
+
+        chunk_size = options['chunk_size']
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+        # Build the scoring matrix once so forked workers share it copy-on-write,
+        # then drop the parent's connection so no child inherits its socket.
+        get_scoring_engine()
+        connections.close_all()
+
+        if options['workers'] > 1 and len(chunks) > 1:
+            with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                built = sum(pool.imap_unordered(_build_chunk, chunks))
+        else:
+            built = sum(map(_build_chunk, chunks))
+
+        self.stdout.write(f'Stored recommendations for {built} users')
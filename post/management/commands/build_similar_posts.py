@@ -0,0 +1,55 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from post.models import SimilarPost
+from post.recommendation import save_similar_posts
+from post.scoring import PostMatrix, ScoringEngine
+
+_engine = None
+
+
+def _similar_block(args):
+    rows, limit = args
+    return _engine.similar(rows, limit)
+
+
+class Command(BaseCommand):
+    help = 'Precomputes the top-K similar posts of every published post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Number of worker processes that score posts')
+        parser.add_argument('--limit', type=int, default=settings.SIMILAR_POSTS_PER_POST,
+                            help='Neighbors kept per post')
+        parser.add_argument('--block-size', type=int, default=64,
+                            help='Posts scored together; memory grows with block size x post count')
+
+    def handle(self, *args, **options):
+        global _engine
+        _engine = ScoringEngine(PostMatrix.build())
+        total = len(_engine.matrix)
+        limit = options['limit']
+        block_size = options['block_size']
+        blocks = [(list(range(start, min(start + block_size, total))), limit)
+                  for start in range(0, total, block_size)]
+
+        # Workers only do NumPy work on the inherited matrix; they never touch
+        # the database, so the parent's connection must not leak into them.
+        connections.close_all()
+        neighbors = {}
+        if options['workers'] > 1 and len(blocks) > 1:
+            with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                for block in pool.imap_unordered(_similar_block, blocks):
+                    neighbors.update(block)
+        else:
+            for block in map(_similar_block, blocks):
+                neighbors.update(block)
+
+        with transaction.atomic():
+            SimilarPost.objects.all().delete()
+            save_similar_posts(neighbors)
+
+        self.stdout.write(f'Stored neighbors for {len(neighbors)} posts')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from post.feed import seed_inbox
+from post.models import InterestSubscription
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds feed inboxes from the latest matching posts, e.g. after changing FEED_* settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only these user ids')
+
+    def handle(self, *args, **options):
+        user_ids = options['user'] or InterestSubscription.objects.values_list(
+            'user_id', flat=True
+        ).distinct().order_by('user_id')
+        rebuilt = 0
+        for user_id in user_ids:
+            seed_inbox(user_id)
+            rebuilt += 1
+        self.stdout.write(f'Rebuilt {rebuilt} feed inboxes')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from post.models import Category, Like, Post, published_post_count
+
+
+class Command(BaseCommand):
+    help = 'Recomputes denormalized counters and fixes rows that drifted from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows drifted')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        with transaction.atomic():
+            fixed = self.sync_like_counts(dry_run)
+            self.stdout.write(f'like_count: {fixed} posts drifted')
+            fixed = self.sync_category_post_counts(dry_run)
+            self.stdout.write(f'post_count: {fixed} categories drifted')
+
+        if dry_run:
+            self.stdout.write('Dry run, nothing was written')
+
+    def sync_like_counts(self, dry_run):
+        likes = Like.objects.filter(post=OuterRef('pk')).order_by().values('post')
+        actual = Coalesce(Subquery(likes.annotate(count=Count('pk')).values('count')), 0)
+
+        drifted = Post.objects.annotate(actual_like_count=actual).exclude(
+            like_count=F('actual_like_count')
+        ).values_list('pk', flat=True)
+        if dry_run:
+            return drifted.count()
+        return Post.objects.filter(pk__in=list(drifted)).update(like_count=actual)
+
+    def sync_category_post_counts(self, dry_run):
+        drifted = Category.objects.annotate(actual_post_count=published_post_count()).exclude(
+            post_count=F('actual_post_count')
+        ).values_list('pk', flat=True)
+        if dry_run:
+            return drifted.count()
+        return Category.objects.filter(pk__in=list(drifted)).update(post_count=published_post_count())
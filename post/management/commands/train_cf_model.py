@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from post.collaborative import NotEnoughData, train_cf_model
+
+
+class Command(BaseCommand):
+    help = 'Trains the collaborative filtering model from likes and publishes it for the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=64, help='Latent factors per post')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Likes fetched per database round trip')
+        parser.add_argument('--keep', type=int, default=2, help='Model versions kept on disk')
+
+    def handle(self, *args, **options):
+        try:
+            version, (users, posts) = train_cf_model(
+                options['factors'], options['chunk_size'], keep=max(options['keep'], 1)
+            )
+        except NotEnoughData as e:
+            raise CommandError(str(e))
+        self.stdout.write(f'Trained model {version} from {users} users and {posts} posts')
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from post.models import Post, hot_score_expression
+
+
+class Command(BaseCommand):
+    help = 'Recomputes hot_score of posts liked or viewed recently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=15,
+                            help='Posts active within this many minutes; use at least the job interval')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every post, e.g. after changing HOT_SCORE_* settings')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if not options['all']:
+            posts = posts.filter(activity_at__gte=timezone.now() - timedelta(minutes=options['minutes']))
+        updated = posts.update(hot_score=hot_score_expression())
+        self.stdout.write(f'Updated hot_score of {updated} posts')
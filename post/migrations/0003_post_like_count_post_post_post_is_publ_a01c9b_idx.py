@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+    Like = apps.get_model('post', 'Like')
+    likes = Like.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    Post.objects.update(like_count=Coalesce(
+        Subquery(likes.annotate(count=Count('pk')).values('count')), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0002_post_post_post_is_publ_08e1a7_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_published', '-like_count', '-views', '-created_at', 'id'], name='post_post_is_publ_a01c9b_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_post_count(apps, schema_editor):
+    Category = apps.get_model('post', 'Category')
+    Post = apps.get_model('post', 'Post')
+    posts = Post.objects.filter(category=OuterRef('pk'), is_published=True).order_by().values('category')
+    Category.objects.update(post_count=Coalesce(
+        Subquery(posts.annotate(count=Count('pk')).values('count')), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0003_post_like_count_post_post_post_is_publ_a01c9b_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_post_count, migrations.RunPython.noop),
+    ]
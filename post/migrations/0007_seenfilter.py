@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:31
+
+import hashlib
+import itertools
+import math
+import struct
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of post.bloom and the seen filter settings, so this
+# migration keeps producing the same filters when those change.
+CAPACITY = 5000
+ERROR_RATE = 0.01
+HEADER = struct.Struct('>IHI')
+MASK64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    def __init__(self):
+        self.bits = math.ceil(-CAPACITY * math.log(ERROR_RATE) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.bits / CAPACITY * math.log(2)))
+        self.data = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        h1, h2 = struct.unpack('>QQ', hashlib.blake2b(key.encode(), digest_size=16).digest())
+        return [((h1 + i * h2) & MASK64) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.data[position // 8] & (1 << (position % 8)) for position in self.positions(key))
+
+    def add(self, key):
+        added = False
+        for position in self.positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.data[byte] & (1 << bit):
+                self.data[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+
+    def to_bytes(self):
+        return HEADER.pack(self.bits, self.hashes, self.count) + bytes(self.data)
+
+
+def backfill_seen_filters(apps, schema_editor):
+    Like = apps.get_model('post', 'Like')
+    SeenFilter = apps.get_model('post', 'SeenFilter')
+    likes = Like.objects.order_by('user_id', 'created_at').values_list('user_id', 'post_id')
+    rows = []
+    for user_id, user_likes in itertools.groupby(likes.iterator(chunk_size=2000), key=lambda like: like[0]):
+        current, previous = BloomFilter(), None
+        for _, post_id in user_likes:
+            if post_id in current or (previous is not None and post_id in previous):
+                continue
+            if current.count >= CAPACITY:
+                previous, current = current, BloomFilter()
+            current.add(post_id)
+        rows.append(SeenFilter(
+            user_id=user_id,
+            current=current.to_bytes(),
+            previous=previous.to_bytes() if previous else None,
+        ))
+        if len(rows) >= 500:
+            SeenFilter.objects.bulk_create(rows)
+            rows = []
+    SeenFilter.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('post', '0006_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeenFilter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seen_filter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('current', models.BinaryField()),
+                ('previous', models.BinaryField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_seen_filters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_post_search_vector_post_post_post_search__afdb24_gin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityWindow',
+            fields=[
+                ('span', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('expired_before', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tag', 'Tag'), ('category', 'Category')], max_length=10)),
+                ('item_id', models.BigIntegerField()),
+                ('start', models.DateTimeField()),
+                ('posts', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start'], name='post_activi_start_5e602e_idx')],
+                'unique_together': {('kind', 'item_id', 'start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivityCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tag', 'Tag'), ('category', 'Category')], max_length=10)),
+                ('item_id', models.BigIntegerField()),
+                ('span', models.CharField(max_length=10)),
+                ('posts', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'span', '-score', 'item_id'], name='post_activi_kind_bd3a67_idx')],
+                'unique_together': {('kind', 'span', 'item_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Extract, Log
+
+
+# Frozen copies of the HOT_SCORE_* settings, so this migration keeps
+# producing the same scores when those change (update_hot_scores --all
+# recomputes with the current ones).
+HALF_LIFE_HOURS = 12
+WEIGHTS = {'likes': 1.0, 'views': 0.1}
+
+
+def backfill_hot_score(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+    Post.objects.update(hot_score=(
+        Log(2, 1 + F('like_count') * Value(WEIGHTS['likes']) + F('views') * Value(WEIGHTS['views'])) +
+        Extract('created_at', 'epoch') / Value(HALF_LIFE_HOURS * 60.0 * 60)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0009_activity_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_post_is_publ_a01c9b_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='activity_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_hot_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_published', '-hot_score', 'id'], name='post_post_is_publ_2ea46a_idx'),
+        ),
+    ]
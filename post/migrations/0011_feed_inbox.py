@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:50
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_subscriptions(apps, schema_editor):
+    ActorDetails = apps.get_model('actor', 'ActorDetails')
+    InterestSubscription = apps.get_model('post', 'InterestSubscription')
+    subscriptions = []
+    for user_id, interests in ActorDetails.objects.exclude(interests=None).values_list('actor_id', 'interests'):
+        terms = {term.strip().lower()[:100] for term in interests.split(',')} - {''}
+        subscriptions.extend(InterestSubscription(user_id=user_id, term=term) for term in terms)
+    InterestSubscription.objects.bulk_create(subscriptions, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actor', '0004_alter_actor_id'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('post', '0010_post_hot_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedInbox',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_inbox', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_ids', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=16), default=list, size=None)),
+                ('published', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InterestSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_subscriptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'term')},
+            },
+        ),
+        migrations.RunPython(backfill_subscriptions, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,12 @@
+import math
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Extract, Log
 from django.contrib.auth.models import User
 from media.utils import gen_id
 
@@ -9,6 +17,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    post_count = models.IntegerField(default=0)
 
     class Meta:
         verbose_name_plural = 'categories'
@@ -35,18 +44,75 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     views = models.IntegerField(default=0, db_index=True)
+    like_count = models.IntegerField(default=0)
     is_published = models.BooleanField(default=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    hot_score = models.FloatField(default=0, editable=False)
+    # Last like or view; update_hot_scores only recomputes posts active since its previous run.
+    activity_at = models.DateTimeField(null=True, editable=False, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['-views']),
+            models.Index(fields=['is_published', '-created_at', 'id']),
+            models.Index(fields=['is_published', '-hot_score', 'id']),
+            GinIndex(fields=['search_vector']),
         ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which category counted this post when it was loaded so
+        # post_save can move the count if category or publish state change.
+        if 'category_id' in instance.__dict__ and 'is_published' in instance.__dict__:
+            instance._counted_category_id = instance.counted_category_id()
+            instance._loaded_category_id = instance.category_id
+            instance._loaded_is_published = instance.is_published
+        if 'is_published' in instance.__dict__:
+            instance._activity_published = instance.is_published
+        return instance
+
+    def counted_category_id(self):
+        return self.category_id if self.is_published else None
+
+# 'simple' keeps tokens as-is: there is no Korean stemmer, and English
+# stemming would make mixed-language posts match inconsistently.
+SEARCH_CONFIG = 'simple'
+
+def post_search_vector():
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('content', weight='B', config=SEARCH_CONFIG)
+    )
+
+# Exponential decay written as a time offset: log2(engagement) + created / half-life
+# ranks posts exactly like engagement * 2^(-age / half-life) at any moment, but
+# doesn't change as time passes, so only posts with new likes or views need a
+# recompute and the stored column can be indexed.
+def hot_score(like_count, views, created_at):
+    weights = settings.HOT_SCORE_WEIGHTS
+    engagement = 1 + like_count * weights['likes'] + views * weights['views']
+    return math.log2(engagement) + created_at.timestamp() / (settings.HOT_SCORE_HALF_LIFE_HOURS * 60 * 60)
+
+def hot_score_expression():
+    weights = settings.HOT_SCORE_WEIGHTS
+    engagement = 1 + F('like_count') * Value(float(weights['likes'])) + F('views') * Value(float(weights['views']))
+    return Log(2, engagement) + Extract('created_at', 'epoch') / Value(settings.HOT_SCORE_HALF_LIFE_HOURS * 60.0 * 60)
+
+def published_post_count():
+    posts = Post.objects.filter(category=OuterRef('pk'), is_published=True).order_by().values('category')
+    return Coalesce(Subquery(posts.annotate(count=Count('pk')).values('count')), 0)
+
+def adjust_category_post_counts(deltas):
+    for category_id, delta in deltas.items():
+        if category_id is not None and delta:
+            Category.objects.filter(pk=category_id).update(post_count=F('post_count') + delta)
+
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
@@ -61,6 +127,110 @@ class Like(models.Model):
     def __str__(self):
         return f'{self.user.username} likes {self.post.title}'
 
+class SimilarPost(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='similar_posts')
+    similar = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['post', 'rank']
+        unique_together = ('post', 'rank')
+
+    def __str__(self):
+        return f'{self.post_id} ~ {self.similar_id} (#{self.rank})'
+
+class UserRecommendation(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation')
+    post_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    computed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'Recommendations for {self.user_id} at {self.computed_at}'
+
+class SeenFilter(models.Model):
+    """Serialized post.seen.SeenSet: Bloom filters of the posts a user viewed or liked."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='seen_filter')
+    current = models.BinaryField()
+    previous = models.BinaryField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Seen posts of {self.user_id}'
+
+class InterestSubscription(models.Model):
+    """One normalized term of ActorDetails.interests, matched against tag and category names."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interest_subscriptions')
+    term = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'term')
+
+    def __str__(self):
+        return f'{self.user_id} follows {self.term}'
+
+class FeedInbox(models.Model):
+    """
+    Newest-first ids of the posts fanned out to a user, with their publish
+    times in milliseconds, capped at FEED_INBOX_SIZE entries.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='feed_inbox')
+    post_ids = ArrayField(models.CharField(max_length=16), default=list)
+    published = ArrayField(models.BigIntegerField(), default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Feed inbox of {self.user_id}'
+
+class ActivityBucket(models.Model):
+    """Posts published and likes received by one tag or category in one time bucket."""
+    KIND_CHOICES = [('tag', 'Tag'), ('category', 'Category')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    item_id = models.BigIntegerField()
+    start = models.DateTimeField()
+    posts = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'item_id', 'start')
+        indexes = [
+            models.Index(fields=['start']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.item_id} at {self.start}'
+
+class ActivityCounter(models.Model):
+    """
+    Running totals of a tag or category over one window (ACTIVITY_WINDOWS),
+    incremented on write and decremented as buckets leave the window.
+    """
+    kind = models.CharField(max_length=10, choices=ActivityBucket.KIND_CHOICES)
+    item_id = models.BigIntegerField()
+    span = models.CharField(max_length=10)
+    posts = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'span', 'item_id')
+        indexes = [
+            models.Index(fields=['kind', 'span', '-score', 'item_id']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.item_id} over {self.span}: {self.score}'
+
+class ActivityWindow(models.Model):
+    """Buckets starting before expired_before have been subtracted from the window's counters."""
+    span = models.CharField(max_length=10, primary_key=True)
+    expired_before = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.span} expired before {self.expired_before}'
+
 class Report(models.Model):
     REASON_CHOICES = [
         ('spam', 'Spam'),
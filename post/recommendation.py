@@ -1,103 +1,239 @@
-from django.db.models import Count, Q
-from collections import Counter
 import math
 
-def get_recommended_posts(user, limit=20):
-    from .models import Post, Like
-    
-    liked_posts = Like.objects.filter(user=user).select_related('post')
-    
-    if not liked_posts.exists():
-        return Post.objects.filter(is_published=True).annotate(
-            like_count=Count('likes')
-        ).order_by('-like_count', '-views')[:limit]
-    
-    user_interest_tags = set()
-    user_interest_categories = []
-    
-    for like in liked_posts:
-        post = like.post
-        if post.category:
-            user_interest_categories.append(post.category.id)
-        user_interest_tags.update(post.tags.values_list('name', flat=True))
-    
-    if hasattr(user, 'actor') and user.actor.interests:
-        actor_interests = user.actor.interests.split(',')
-        user_interest_tags.update([interest.strip() for interest in actor_interests])
-    
-    liked_post_ids = [like.post.id for like in liked_posts]
-    
-    candidate_posts = Post.objects.filter(
-        is_published=True
-    ).exclude(
-        id__in=liked_post_ids
-    ).prefetch_related('tags').select_related('category')
-    
+def get_user_interests(user):
+    from actor.models import ActorDetails
+
+    interests = ActorDetails.objects.filter(actor_id=user.pk).values_list('interests', flat=True).first()
+    if not interests:
+        return []
+    return [interest.strip() for interest in interests.split(',') if interest.strip()]
+
+def get_user_profile(user):
+    """Returns (liked post ids, interest tag names, categories of liked posts)."""
+    from .models import Post, Like, Tag
+
+    liked_post_ids = list(Like.objects.filter(user=user).values_list('post_id', flat=True))
+
+    user_interest_tags = set(Tag.objects.filter(
+        posts__id__in=liked_post_ids
+    ).values_list('name', flat=True))
+    user_interest_tags.update(get_user_interests(user))
+
+    user_interest_categories = list(Post.objects.filter(
+        id__in=liked_post_ids, category__isnull=False
+    ).values_list('category_id', flat=True))
+
+    return liked_post_ids, user_interest_tags, user_interest_categories
+
+def hydrate_posts(post_ids):
+    from .models import Post
+
+    posts = Post.objects.filter(is_published=True).select_related('user', 'category').in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+def score_recommendations(user, limit):
+    """
+    Returns [(post_id, score), ...] for `limit` posts: the best scored ones
+    first, then the most popular posts the user hasn't seen (score 0).
+    Liked and viewed posts are masked out in memory via the user's seen set.
+    """
+    from django.conf import settings
+    from .collaborative import get_cf_model
+    from .scoring import get_scoring_engine
+    from .seen import load_seen
+
+    liked_post_ids, user_interest_tags, user_interest_categories = get_user_profile(user)
+
+    engine = get_scoring_engine()
+    mask = engine.exclusion_mask(liked_post_ids, load_seen(user.pk))
+
     scored_posts = []
-    for post in candidate_posts:
-        score = calculate_similarity_score(
-            post, 
-            user_interest_tags, 
-            user_interest_categories
+    if liked_post_ids:
+        cf_model = get_cf_model()
+        boost = None
+        if cf_model is not None and settings.RECOMMENDATION_CF_WEIGHT:
+            boost = cf_model.score(liked_post_ids, engine.matrix.post_ids) * settings.RECOMMENDATION_CF_WEIGHT
+
+        scored_posts = engine.recommend(
+            user_interest_tags,
+            user_interest_categories,
+            limit,
+            boost=boost,
+            mask=mask
+        )
+
+    if len(scored_posts) < limit:
+        for post_id, score in scored_posts:
+            mask[engine.matrix.row_of[post_id]] = False
+        additional_posts = engine.popular(limit - len(scored_posts), mask)
+        scored_posts.extend((post_id, 0.0) for post_id in additional_posts)
+
+    return scored_posts
+
+def store_recommendations(results):
+    """Upserts {user_id: [(post_id, score), ...]} into the recommendation store."""
+    from django.utils import timezone
+    from .models import UserRecommendation
+
+    now = timezone.now()
+    UserRecommendation.objects.bulk_create([
+        UserRecommendation(
+            user_id=user_id,
+            post_ids=[post_id for post_id, score in scored_posts],
+            scores=[score for post_id, score in scored_posts],
+            computed_at=now
         )
-        if score > 0:
-            scored_posts.append((post, score))
-    
-    scored_posts.sort(key=lambda x: x[1], reverse=True)
-    
-    recommended = [post for post, score in scored_posts[:limit]]
-    
-    if len(recommended) < limit:
-        additional_posts = Post.objects.filter(
-            is_published=True
-        ).exclude(
-            id__in=liked_post_ids + [p.id for p in recommended]
-        ).annotate(
-            like_count=Count('likes')
-        ).order_by('-like_count', '-views')[:limit - len(recommended)]
-        
-        recommended.extend(additional_posts)
-    
-    return recommended
+        for user_id, scored_posts in results.items()
+    ], update_conflicts=True, unique_fields=['user'], update_fields=['post_ids', 'scores', 'computed_at'])
+
+def get_recommended_post_ids(user):
+    """
+    Reads the user's stored recommendations, computing and storing them
+    only when the entry is missing or older than RECOMMENDATION_STORE_TTL.
+    Posts seen since the list was stored are dropped on read.
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+    from .models import UserRecommendation
+    from .seen import load_seen
+
+    fresh_after = timezone.now() - timedelta(seconds=settings.RECOMMENDATION_STORE_TTL)
+    post_ids = UserRecommendation.objects.filter(
+        user=user, computed_at__gte=fresh_after
+    ).values_list('post_ids', flat=True).first()
+    if post_ids is not None:
+        seen = load_seen(user.pk)
+        return [post_id for post_id in post_ids if post_id not in seen]
+
+    scored_posts = score_recommendations(user, settings.RECOMMENDATION_STORE_SIZE)
+    store_recommendations({user.pk: scored_posts})
+    return [post_id for post_id, score in scored_posts]
+
+def get_recommended_posts(user, limit=20):
+    return hydrate_posts(get_recommended_post_ids(user)[:limit])
+
+def rerank_after_like(user_id, post_id):
+    """
+    Cheap incremental update of a stored list after a like: drops the liked
+    post and boosts its precomputed neighbors, without rescoring everything.
+    """
+    from django.conf import settings
+    from django.db import transaction
+    from .models import Like, SimilarPost, UserRecommendation
+
+    neighbors = dict(SimilarPost.objects.filter(post_id=post_id).values_list('similar_id', 'score'))
+    liked = set(Like.objects.filter(user_id=user_id, post_id__in=list(neighbors)).values_list('post_id', flat=True))
+
+    with transaction.atomic():
+        stored = UserRecommendation.objects.select_for_update().filter(user_id=user_id).first()
+        if stored is None:
+            return
+
+        scores = dict(zip(stored.post_ids, stored.scores))
+        scores.pop(post_id, None)
+        top = max(neighbors.values(), default=0)
+        for similar_id, score in neighbors.items():
+            if similar_id not in liked and top > 0:
+                scores[similar_id] = scores.get(similar_id, 0.0) + settings.RECOMMENDATION_LIKE_BOOST * score / top
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:settings.RECOMMENDATION_STORE_SIZE]
+        stored.post_ids = [post_id for post_id, score in ranked]
+        stored.scores = [score for post_id, score in ranked]
+        stored.save(update_fields=['post_ids', 'scores'])
 
 def calculate_similarity_score(post, user_tags, user_categories):
+    # Per-post reference of the formula that scoring.ContentScorer batches.
     score = 0.0
-    
+
     post_tags = set(post.tags.values_list('name', flat=True))
     tag_intersection = len(user_tags.intersection(post_tags))
     tag_union = len(user_tags.union(post_tags))
-    
+
     if tag_union > 0:
         tag_similarity = tag_intersection / tag_union
         score += tag_similarity * 10
-    
+
     if post.category and post.category.id in user_categories:
         category_weight = user_categories.count(post.category.id) / len(user_categories)
         score += category_weight * 5
-    
-    like_count = post.likes.count() if hasattr(post, 'likes') else 0
-    score += math.log1p(like_count) * 0.5
-    
+
+    score += math.log1p(post.like_count) * 0.5
+
     score += math.log1p(post.views) * 0.3
-    
+
     return score
 
-def get_similar_posts(post, limit=10):
-    similar_posts = Post.objects.filter(
-        is_published=True
-    ).exclude(
-        id=post.id
-    ).prefetch_related('tags').select_related('category')
-    
+def compute_similar_posts(post, limit):
+    from .scoring import get_scoring_engine
+
     post_tags = set(post.tags.values_list('name', flat=True))
-    post_category_list = [post.category.id] if post.category else []
-    
-    scored_posts = []
-    for candidate in similar_posts:
-        score = calculate_similarity_score(candidate, post_tags, post_category_list)
-        if score > 0:
-            scored_posts.append((candidate, score))
-    
-    scored_posts.sort(key=lambda x: x[1], reverse=True)
-    return [post for post, score in scored_posts[:limit]]
+    post_category_list = [post.category_id] if post.category_id else []
+
+    return get_scoring_engine().recommend(
+        post_tags,
+        post_category_list,
+        limit,
+        exclude_ids=[post.id]
+    )
+
+def save_similar_posts(neighbors):
+    """Replaces the stored neighbor lists of the given posts."""
+    from .models import SimilarPost
+
+    SimilarPost.objects.filter(post_id__in=list(neighbors)).delete()
+    SimilarPost.objects.bulk_create([
+        SimilarPost(post_id=post_id, similar_id=similar_id, rank=rank, score=score)
+        for post_id, similar in neighbors.items()
+        for rank, (similar_id, score) in enumerate(similar)
+    ], batch_size=1000)
+
+def refresh_similar_posts(post_id, block_size=64):
+    """
+    Recomputes the stored neighbors of a post and of the posts most likely
+    to gain or lose it: those whose list currently holds it and its own new
+    neighbors. Other lists only pick the post up at the next
+    build_similar_posts run, and scores come from the process's shared
+    matrix, so stored neighbors are eventually consistent.
+    """
+    from django.conf import settings
+    from django.db import transaction
+    from .models import Post, SimilarPost
+    from .scoring import get_scoring_engine
+
+    limit = settings.SIMILAR_POSTS_PER_POST
+    post = Post.objects.filter(pk=post_id, is_published=True).first()
+    affected = set(SimilarPost.objects.filter(similar_id=post_id).values_list('post_id', flat=True))
+    neighbors = {}
+    if post is not None:
+        neighbors[post.id] = compute_similar_posts(post, limit)
+        affected.update(similar_id for similar_id, score in neighbors[post.id])
+    affected.discard(post_id)
+
+    engine = get_scoring_engine()
+    rows = [engine.matrix.row_of[other_id] for other_id in affected if other_id in engine.matrix.row_of]
+    for start in range(0, len(rows), block_size):
+        neighbors.update(engine.similar(rows[start:start + block_size], limit))
+    if post is None:
+        # The matrix may still hold the unpublished post until it is rebuilt.
+        neighbors = {
+            other_id: [(similar_id, score) for similar_id, score in similar if similar_id != post_id]
+            for other_id, similar in neighbors.items()
+        }
+
+    with transaction.atomic():
+        if post is None:
+            SimilarPost.objects.filter(post_id=post_id).delete()
+        save_similar_posts(neighbors)
+
+def get_similar_posts(post, limit=10):
+    from .models import SimilarPost
+
+    stored = SimilarPost.objects.filter(
+        post=post, similar__is_published=True
+    ).select_related('similar__user', 'similar__category')[:limit]
+    similar_posts = [row.similar for row in stored]
+    if similar_posts:
+        return similar_posts
 
+    return hydrate_posts([post_id for post_id, score in compute_similar_posts(post, limit)])
@@ -0,0 +1,250 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+from scipy import sparse
+
+from .bloom import bit_positions_array
+
+logger = logging.getLogger(__name__)
+
+
+class PostMatrix:
+    """
+    Published posts as sparse post x tag and post x category matrices plus
+    the popularity columns, built with two queries and no model instances.
+
+    Rows keep the default Post ordering (newest first), which is also the
+    tie-break order of the scores.
+    """
+    def __init__(self, post_ids, tag_names, category_ids, tags, categories, like_counts, views):
+        self.post_ids = post_ids
+        self.row_of = {post_id: row for row, post_id in enumerate(post_ids)}
+        self.tag_index = {name: col for col, name in enumerate(tag_names)}
+        self.category_index = {category_id: col for col, category_id in enumerate(category_ids)}
+        self.tags = tags
+        self.categories = categories
+        self.tag_counts = np.asarray(tags.sum(axis=1)).ravel()
+        self.like_counts = like_counts
+        self.views = views
+        self._bloom_positions = {}
+
+    def __len__(self):
+        return len(self.post_ids)
+
+    @classmethod
+    def build(cls):
+        from .models import Post
+
+        rows = list(Post.objects.filter(is_published=True).values_list(
+            'id', 'category_id', 'like_count', 'views'
+        ))
+        post_ids = [row[0] for row in rows]
+        row_of = {post_id: i for i, post_id in enumerate(post_ids)}
+
+        tag_rows, tag_cols, tag_index = [], [], {}
+        for post_id, name in Post.tags.through.objects.filter(
+            post__is_published=True
+        ).values_list('post_id', 'tag__name'):
+            tag_rows.append(row_of[post_id])
+            tag_cols.append(tag_index.setdefault(name, len(tag_index)))
+
+        category_index = {}
+        category_rows, category_cols = [], []
+        for i, row in enumerate(rows):
+            if row[1] is not None:
+                category_rows.append(i)
+                category_cols.append(category_index.setdefault(row[1], len(category_index)))
+
+        n = len(rows)
+        tags = sparse.csr_matrix(
+            (np.ones(len(tag_rows)), (tag_rows, tag_cols)), shape=(n, len(tag_index))
+        )
+        categories = sparse.csr_matrix(
+            (np.ones(len(category_rows)), (category_rows, category_cols)), shape=(n, len(category_index))
+        )
+        return cls(
+            post_ids,
+            list(tag_index),
+            list(category_index),
+            tags,
+            categories,
+            np.array([row[2] for row in rows], dtype=np.float64),
+            np.array([row[3] for row in rows], dtype=np.float64),
+        )
+
+    def bloom_positions(self, bits, hashes):
+        """Bloom bit positions of every row's post id, computed once per filter size."""
+        key = (bits, hashes)
+        if key not in self._bloom_positions:
+            self._bloom_positions[key] = bit_positions_array(self.post_ids, bits, hashes)
+        return self._bloom_positions[key]
+
+    def tag_vector(self, names):
+        vector = np.zeros(len(self.tag_index))
+        for name in names:
+            col = self.tag_index.get(name)
+            if col is not None:
+                vector[col] = 1.0
+        return vector
+
+    def category_vector(self, category_ids):
+        vector = np.zeros(len(self.category_index))
+        if category_ids:
+            for category_id, count in Counter(category_ids).items():
+                col = self.category_index.get(category_id)
+                if col is not None:
+                    vector[col] = count / len(category_ids)
+        return vector
+
+
+class ContentScorer:
+    """
+    Batched form of calculate_similarity_score: tag Jaccard x 10, category
+    share x 5, log popularity of likes and views. Terms are accumulated in
+    the same order so scores (and ties) match the per-post version.
+    """
+    def score(self, matrix, user_tags, user_categories):
+        overlap = matrix.tags @ matrix.tag_vector(user_tags)
+        union = len(user_tags) + matrix.tag_counts - overlap
+        scores = np.divide(overlap, union, out=np.zeros(len(matrix)), where=union > 0) * 10
+        if user_categories:
+            scores += (matrix.categories @ matrix.category_vector(user_categories)) * 5
+        scores += np.log1p(matrix.like_counts) * 0.5
+        scores += np.log1p(matrix.views) * 0.3
+        return scores
+
+    def score_similar(self, matrix, rows):
+        """
+        Scores every post against each post in `rows` at once, using the
+        post's own tags and category as the profile. Returns a dense
+        len(rows) x len(matrix) array.
+        """
+        overlap = (matrix.tags[rows] @ matrix.tags.T).toarray()
+        union = matrix.tag_counts[rows][:, None] + matrix.tag_counts[None, :] - overlap
+        scores = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0) * 10
+        scores += (matrix.categories[rows] @ matrix.categories.T).toarray() * 5
+        scores += np.log1p(matrix.like_counts) * 0.5
+        scores += np.log1p(matrix.views) * 0.3
+        return scores
+
+
+def top_k(scores, k, mask=None):
+    """
+    Indices of the k best positive scores, best first, ties in row order.
+    Uses a partial sort so only the selected rows get fully sorted.
+    """
+    keep = scores > 0
+    if mask is not None:
+        keep &= mask
+    candidates = np.flatnonzero(keep)
+
+    if len(candidates) > k:
+        candidate_scores = scores[candidates]
+        kth = np.partition(candidate_scores, len(candidates) - k)[len(candidates) - k]
+        above = candidates[candidate_scores > kth]
+        ties = candidates[candidate_scores == kth][:k - len(above)]
+        candidates = np.concatenate([above, ties])
+
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class ScoringEngine:
+    def __init__(self, matrix, scorer=None):
+        self.matrix = matrix
+        self.scorer = scorer or import_string(settings.RECOMMENDATION_SCORER)()
+
+    def score(self, user_tags, user_categories):
+        return self.scorer.score(self.matrix, user_tags, user_categories)
+
+    def exclusion_mask(self, exclude_ids=(), seen=None):
+        """Rows still eligible after dropping `exclude_ids` and posts in the `seen` set."""
+        if seen is not None:
+            mask = ~seen.contains_rows(self.matrix)
+        else:
+            mask = np.ones(len(self.matrix), dtype=bool)
+        for post_id in exclude_ids:
+            row = self.matrix.row_of.get(post_id)
+            if row is not None:
+                mask[row] = False
+        return mask
+
+    def recommend(self, user_tags, user_categories, limit, exclude_ids=(), boost=None, mask=None):
+        """
+        Returns [(post_id, score), ...] for the best `limit` posts. `boost`
+        is an optional array aligned with the matrix rows that is added to
+        the content scores (e.g. collaborative filtering scores). A
+        precomputed `mask` replaces `exclude_ids`.
+        """
+        scores = self.score(user_tags, user_categories)
+        if boost is not None:
+            scores = scores + boost
+        if mask is None:
+            mask = self.exclusion_mask(exclude_ids)
+        rows = top_k(scores, limit, mask)
+        return [(self.matrix.post_ids[row], float(scores[row])) for row in rows]
+
+    def popular(self, limit, mask):
+        """Most liked, then most viewed post ids among the `mask` rows."""
+        candidates = np.flatnonzero(mask)
+        order = np.lexsort((candidates, -self.matrix.views[candidates], -self.matrix.like_counts[candidates]))
+        return [self.matrix.post_ids[row] for row in candidates[order[:limit]]]
+
+    def similar(self, rows, limit):
+        """Returns {post_id: [(similar_post_id, score), ...]} for a block of rows."""
+        block = self.scorer.score_similar(self.matrix, rows)
+        mask = np.ones(len(self.matrix), dtype=bool)
+        neighbors = {}
+        for scores, row in zip(block, rows):
+            mask[row] = False
+            neighbors[self.matrix.post_ids[row]] = [
+                (self.matrix.post_ids[col], float(scores[col])) for col in top_k(scores, limit, mask)
+            ]
+            mask[row] = True
+        return neighbors
+
+
+_matrix = None
+_matrix_built_at = 0.0
+_matrix_lock = threading.Lock()
+_matrix_refresh = None
+
+
+def refresh_matrix():
+    global _matrix, _matrix_built_at
+    try:
+        matrix = PostMatrix.build()
+        with _matrix_lock:
+            _matrix = matrix
+            _matrix_built_at = time.monotonic()
+    except Exception:
+        logger.exception('Failed to rebuild the recommendation matrix, keeping the old one')
+        with _matrix_lock:
+            _matrix_built_at = time.monotonic() # retry after another TTL
+    finally:
+        connections.close_all()
+
+
+def get_scoring_engine():
+    """
+    Returns an engine over a PostMatrix shared by the process. Only the
+    first call builds it synchronously; once it is older than
+    RECOMMENDATION_MATRIX_TTL a background thread rebuilds it while
+    requests keep using the stale one.
+    """
+    global _matrix, _matrix_built_at, _matrix_refresh
+    with _matrix_lock:
+        if _matrix is None:
+            _matrix = PostMatrix.build()
+            _matrix_built_at = time.monotonic()
+        elif time.monotonic() - _matrix_built_at > settings.RECOMMENDATION_MATRIX_TTL:
+            # Threads don't survive a fork, so a forked worker starts its own.
+            if _matrix_refresh is None or not _matrix_refresh.is_alive():
+                _matrix_refresh = threading.Thread(target=refresh_matrix, name='post-matrix-refresh', daemon=True)
+                _matrix_refresh.start()
+        return ScoringEngine(_matrix)
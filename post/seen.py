@@ -0,0 +1,145 @@
+import atexit
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from pororohub.counters import WriteBehindBuffer
+from .bloom import BloomFilter, optimal_size
+
+logger = logging.getLogger(__name__)
+
+
+def new_filter():
+    return BloomFilter(*optimal_size(settings.SEEN_FILTER_CAPACITY, settings.SEEN_FILTER_ERROR_RATE))
+
+
+class SeenSet:
+    """
+    Posts a user has viewed or liked, as two Bloom filter generations. Once
+    the current one holds SEEN_FILTER_CAPACITY posts it becomes the previous
+    one and a fresh filter takes over, so storage and lookup cost stay flat
+    and only the oldest history is forgotten.
+    """
+    def __init__(self, current=None, previous=None):
+        self.current = current or new_filter()
+        self.previous = previous
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            BloomFilter.from_bytes(row.current),
+            BloomFilter.from_bytes(row.previous) if row.previous else None,
+        )
+
+    def generations(self):
+        return [f for f in (self.current, self.previous) if f is not None]
+
+    def __contains__(self, post_id):
+        return any(post_id in f for f in self.generations())
+
+    def add(self, post_id):
+        if post_id in self:
+            return False
+        if self.current.count >= settings.SEEN_FILTER_CAPACITY:
+            self.previous, self.current = self.current, new_filter()
+        return self.current.add(post_id)
+
+    def contains_rows(self, matrix):
+        """Membership of every PostMatrix row, vectorized per generation."""
+        seen = None
+        for f in self.generations():
+            rows = f.contains_positions(matrix.bloom_positions(f.bits, f.hashes))
+            seen = rows if seen is None else seen | rows
+        return seen
+
+
+def load_seen(user_id):
+    """The user's seen set, including views this process hasn't written yet."""
+    from .models import SeenFilter
+
+    row = SeenFilter.objects.filter(user_id=user_id).first()
+    seen = SeenSet.from_row(row) if row else SeenSet()
+    for post_id in seen_buffer.pending(user_id):
+        seen.add(post_id)
+    return seen
+
+
+def mark_seen(user_id, post_ids):
+    """Adds posts to the user's seen set; writes only when something is new."""
+    mark_seen_many({user_id: post_ids})
+
+
+def mark_seen_many(post_ids_by_user):
+    """
+    Adds {user_id: post_ids} to the users' seen sets in one transaction,
+    rewriting only the rows that gained something.
+    """
+    from django.contrib.auth.models import User
+    from .models import SeenFilter
+
+    # Users deleted since their views were buffered are skipped.
+    user_ids = sorted(User.objects.filter(pk__in=list(post_ids_by_user)).values_list('pk', flat=True))
+    if not user_ids:
+        return
+
+    with transaction.atomic():
+        SeenFilter.objects.bulk_create(
+            [SeenFilter(user_id=user_id, current=new_filter().to_bytes()) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        changed = []
+        for row in SeenFilter.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id'):
+            seen = SeenSet.from_row(row)
+            if any([seen.add(post_id) for post_id in post_ids_by_user[row.user_id]]):
+                row.current = seen.current.to_bytes()
+                row.previous = seen.previous.to_bytes() if seen.previous else None
+                row.updated_at = timezone.now() # bulk_update skips auto_now
+                changed.append(row)
+        SeenFilter.objects.bulk_update(changed, ['current', 'previous', 'updated_at'])
+
+
+class SeenBuffer(WriteBehindBuffer):
+    """
+    Posts viewed since the last flush, per user. Detail views only touch
+    process memory; a daemon thread merges them into the Bloom filters
+    every SEEN_FILTER_FLUSH_INTERVAL seconds (and at exit) with one
+    transaction for all buffered users.
+    """
+    interval_setting = 'SEEN_FILTER_FLUSH_INTERVAL'
+
+    def __init__(self):
+        super().__init__('seen-filter')
+        self._pending = defaultdict(set)
+
+    def add(self, user_id, post_ids):
+        with self._lock:
+            self._pending[user_id].update(post_ids)
+            buffered = len(self._pending)
+        self._ensure_worker()
+        if buffered >= settings.SEEN_FILTER_MAX_PENDING:
+            self.wake()
+
+    def pending(self, user_id):
+        with self._lock:
+            return set(self._pending.get(user_id, ()))
+
+    def flush(self):
+        with self._lock:
+            batch = self._pending
+            if not batch:
+                return
+            self._pending = defaultdict(set)
+        try:
+            mark_seen_many(batch)
+        except Exception:
+            logger.exception('Failed to flush seen posts of %d users, requeueing', len(batch))
+            with self._lock:
+                for user_id, post_ids in batch.items():
+                    self._pending[user_id].update(post_ids)
+
+
+seen_buffer = SeenBuffer()
+atexit.register(seen_buffer.flush)
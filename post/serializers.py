@@ -1,7 +1,44 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef
+from django.db.models.manager import BaseManager
 from .models import Post, Tag, Category, Like, Report
 
+def annotate_is_liked(queryset, request):
+    if request and request.user.is_authenticated:
+        return queryset.annotate(is_liked=Exists(
+            Like.objects.filter(user=request.user, post=OuterRef('pk'))
+        ))
+    return queryset
+
+class LikedStateListSerializer(serializers.ListSerializer):
+    """
+    Resolves which posts of the page the requesting user liked with a single
+    post_id IN (...) query instead of one EXISTS query per post.
+    """
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, BaseManager) else data)
+        request = self.context.get('request')
+        self.liked_post_ids = set()
+        if request and request.user.is_authenticated and posts:
+            self.liked_post_ids = set(Like.objects.filter(
+                user=request.user,
+                post_id__in=[post.pk for post in posts]
+            ).values_list('post_id', flat=True))
+        return super().to_representation(posts)
+
+class LikedStateMixin:
+    def get_is_liked(self, obj):
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
+        liked_post_ids = getattr(self.parent, 'liked_post_ids', None)
+        if liked_post_ids is not None:
+            return obj.pk in liked_post_ids
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return Like.objects.filter(user=request.user, post=obj).exists()
+        return False
+
 class UserBasicSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -13,34 +50,26 @@ class TagSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class CategorySerializer(serializers.ModelSerializer):
-    post_count = serializers.SerializerMethodField()
-
     class Meta:
         model = Category
         fields = '__all__'
-
-    def get_post_count(self, obj):
-        return obj.posts.filter(is_published=True).count()
+        read_only_fields = ('post_count',)
 
 class CategoryDetailSerializer(serializers.ModelSerializer):
-    post_count = serializers.SerializerMethodField()
     posts = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = '__all__'
-
-    def get_post_count(self, obj):
-        return obj.posts.filter(is_published=True).count()
+        read_only_fields = ('post_count',)
 
     def get_posts(self, obj):
-        from django.db.models import Count
-        posts = obj.posts.filter(is_published=True).annotate(
-            like_count=Count('likes')
-        ).select_related('user', 'category').prefetch_related('tags')[:20]
+        posts = obj.posts.filter(is_published=True).select_related(
+            'user', 'category'
+        ).prefetch_related('tags')[:20]
         return PostListSerializer(posts, many=True, context=self.context).data
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(LikedStateMixin, serializers.ModelSerializer):
     user = UserBasicSerializer(read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -50,14 +79,9 @@ class PostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = '__all__'
-        read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'views')
-
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Like.objects.filter(user=request.user, post=obj).exists()
-        return False
+        exclude = ('search_vector',)
+        read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'views', 'like_count')
+        list_serializer_class = LikedStateListSerializer
 
     def create(self, validated_data):
         tag_ids = validated_data.pop('tag_ids', [])
@@ -71,20 +95,31 @@ class PostSerializer(serializers.ModelSerializer):
         tag_ids = validated_data.pop('tag_ids', None)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        # Only write the edited columns so like_count, views and hot_score
+        # updated concurrently by signals and counters aren't overwritten.
+        instance.save(update_fields=[*validated_data, 'updated_at'])
         if tag_ids is not None:
             tags = Tag.objects.filter(id__in=tag_ids)
             instance.tags.set(tags)
         return instance
 
-class PostListSerializer(serializers.ModelSerializer):
+class PostListSerializer(LikedStateMixin, serializers.ModelSerializer):
     user = UserBasicSerializer(read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     like_count = serializers.IntegerField(read_only=True)
+    is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ('id', 'user', 'title', 'category', 'category_name', 'created_at', 'views', 'like_count', 'image')
+        fields = ('id', 'user', 'title', 'category', 'category_name', 'created_at', 'views', 'like_count', 'is_liked', 'image')
+        list_serializer_class = LikedStateListSerializer
+
+class PostSearchSerializer(PostListSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta(PostListSerializer.Meta):
+        fields = PostListSerializer.Meta.fields + ('rank', 'headline')
 
 class LikeSerializer(serializers.ModelSerializer):
     user = UserBasicSerializer(read_only=True)
@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from actor.models import ActorDetails
+from media.cleanup import file_deleter
+from pororohub.counters import views_flushed
+from .activity import post_activity, record_activity, record_post_activity
+from .feed import schedule_fanout, schedule_seed, sync_subscriptions
+from .models import (
+    ActivityBucket, ActivityCounter, Category, Like, Post, Tag,
+    adjust_category_post_counts, hot_score, post_search_vector, published_post_count
+)
+from .recommendation import refresh_similar_posts, rerank_after_like
+from .seen import seen_buffer
+
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(like_count=F('like_count') + 1, activity_at=Now())
+        transaction.on_commit(lambda: rerank_after_like(instance.user_id, instance.post_id))
+        transaction.on_commit(lambda: seen_buffer.add(instance.user_id, [instance.post_id]))
+        record_post_activity([instance.post_id], likes=1)
+
+
+# Also runs for likes removed by cascading deletes (user or post deletion),
+# inside the same transaction as the delete itself.
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(like_count=F('like_count') - 1, activity_at=Now())
+    record_post_activity([instance.post_id], likes=-1)
+
+
+@receiver(views_flushed, sender=Post)
+def mark_viewed_posts_active(sender, counts, **kwargs):
+    Post.objects.filter(pk__in=sorted(counts)).update(activity_at=Now())
+
+
+# New posts start with the score of zero engagement at their creation time,
+# so they are ranked before update_hot_scores first sees them.
+@receiver(pre_save, sender=Post)
+def set_initial_hot_score(sender, instance, **kwargs):
+    if instance._state.adding and not instance.hot_score:
+        now = timezone.now()
+        instance.hot_score = hot_score(instance.like_count, instance.views, instance.created_at or now)
+        instance.activity_at = now
+
+
+@receiver(post_save, sender=Post)
+def move_category_post_count(sender, instance, created, **kwargs):
+    new = instance.counted_category_id()
+    if created:
+        old = None
+    elif hasattr(instance, '_counted_category_id'):
+        old = instance._counted_category_id
+    else:
+        # Saved without being loaded from the database, so the previous
+        # category is unknown; recount the one the post ends up in.
+        instance._counted_category_id = new
+        if new is not None:
+            Category.objects.filter(pk=new).update(post_count=published_post_count())
+        return
+
+    if old != new:
+        adjust_category_post_counts({old: -1, new: 1})
+    instance._counted_category_id = new
+
+
+@receiver(post_delete, sender=Post)
+def release_category_post_count(sender, instance, **kwargs):
+    old = getattr(instance, '_counted_category_id', instance.counted_category_id())
+    adjust_category_post_counts({old: -1})
+
+
+# Files are removed after commit, batched with the rest of a cascading delete.
+@receiver(post_delete, sender=Post)
+def delete_post_files(sender, instance, **kwargs):
+    file_deleter.delete_on_commit(instance.image)
+    file_deleter.delete_on_commit(instance.video)
+
+
+# Neighbor lists only depend on tags, category and publish state, so the
+# stored row of a post is recomputed when one of those changes.
+@receiver(post_save, sender=Post)
+def refresh_similar_posts_on_save(sender, instance, created, **kwargs):
+    loaded = (
+        getattr(instance, '_loaded_category_id', None),
+        getattr(instance, '_loaded_is_published', None),
+    )
+    current = (instance.category_id, instance.is_published)
+    instance._loaded_category_id, instance._loaded_is_published = current
+    if created or loaded != current:
+        transaction.on_commit(lambda: refresh_similar_posts(instance.pk))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_similar_posts_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    post_ids = (pk_set or ()) if reverse else [instance.pk]
+    for post_id in post_ids:
+        transaction.on_commit(lambda post_id=post_id: refresh_similar_posts(post_id))
+
+
+@receiver(post_save, sender=Post)
+def update_search_vector(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or {'title', 'content'} & set(update_fields):
+        Post.objects.filter(pk=instance.pk).update(search_vector=post_search_vector())
+
+
+# Trending activity: a post counts for its category and tags when it gets
+# published and for tags added while it is published, and is taken back
+# when it gets unpublished or loses a tag.
+@receiver(post_save, sender=Post)
+def record_publish_activity(sender, instance, created, **kwargs):
+    published = getattr(instance, '_activity_published', False)
+    instance._activity_published = instance.is_published
+    # Events are read now rather than at commit: tags added later in the
+    # transaction count through record_tag_activity, and an unpublished post
+    # no longer passes post_activity's published filter.
+    if instance.is_published and (created or not published):
+        events = post_activity([instance.pk], posts=1)
+        schedule_fanout(instance.pk)
+    elif published and not instance.is_published:
+        events = post_activity([instance.pk], posts=-1, published_only=False)
+    else:
+        return
+    transaction.on_commit(lambda: record_activity(events))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def record_tag_activity(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove') and pk_set:
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            post_ids = list(Post.objects.filter(pk__in=pk_set, is_published=True).values_list('pk', flat=True))
+            tag_ids = [instance.pk]
+        else:
+            post_ids = [instance.pk] if instance.is_published else []
+            tag_ids = pk_set
+    elif action == 'pre_clear':
+        # post_clear doesn't say which rows went, so read them before.
+        sign = -1
+        if reverse:
+            post_ids = list(instance.posts.filter(is_published=True).values_list('pk', flat=True))
+            tag_ids = [instance.pk]
+        else:
+            post_ids = [instance.pk] if instance.is_published else []
+            tag_ids = list(instance.tags.values_list('pk', flat=True))
+    else:
+        return
+
+    events = {('tag', tag_id): (sign * len(post_ids), 0) for tag_id in tag_ids} if post_ids else {}
+    transaction.on_commit(lambda: record_activity(events))
+    if sign > 0:
+        # Subscribers of the new tags get the post; inboxes that have it are skipped.
+        for post_id in post_ids:
+            schedule_fanout(post_id)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Category)
+def delete_activity(sender, instance, **kwargs):
+    kind = 'tag' if sender is Tag else 'category'
+    ActivityCounter.objects.filter(kind=kind, item_id=instance.pk).delete()
+    ActivityBucket.objects.filter(kind=kind, item_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=ActorDetails)
+def sync_interest_subscriptions(sender, instance, **kwargs):
+    if sync_subscriptions(instance.actor_id, instance.interests):
+        schedule_seed(instance.actor_id)
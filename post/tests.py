@@ -1,2 +1,647 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIClient
+
+from pororohub.counters import WriteBehindCounter
+from pororohub.pagination import CURSOR_SALT, decode_cursor, encode_cursor, keyset_filter
+from search.engine import get_index
+from .bloom import BloomFilter, bit_positions_array, optimal_size
+from .collaborative import CFModel, NotEnoughData, get_cf_model, train_cf_model
+from .feed import fanout_post, seed_inbox
+from .models import (
+    ActivityCounter, Category, FeedInbox, InterestSubscription, Like, Post, SimilarPost, Tag,
+    UserRecommendation, hot_score,
+)
+from .recommendation import (
+    calculate_similarity_score, get_recommended_post_ids, rerank_after_like, save_similar_posts,
+)
+from .scoring import ContentScorer, PostMatrix, ScoringEngine, top_k
+from .seen import SeenSet, mark_seen, seen_buffer
+from .serializers import PostSerializer
+
+
+class CursorTests(TestCase):
+    ordering = ['-created_at', 'id']
+
+    def test_round_trip(self):
+        values = [datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=dt_timezone.utc), 'abc']
+        self.assertEqual(decode_cursor(encode_cursor(values, self.ordering), self.ordering), values)
+
+    def test_tampered_cursor_is_rejected(self):
+        token = encode_cursor(['2026-01-01', 'abc'], self.ordering)
+        with self.assertRaises(NotFound):
+            decode_cursor(token[:-1] + ('A' if token[-1] != 'A' else 'B'), self.ordering)
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        token = encode_cursor([0.5, 'abc'], ['-hot_score', 'id'])
+        with self.assertRaises(NotFound):
+            decode_cursor(token, self.ordering)
+
+    def test_signed_payload_of_the_wrong_shape_is_rejected(self):
+        token = signing.dumps(['not', 'a', 'dict'], salt=CURSOR_SALT, compress=True)
+        with self.assertRaises(NotFound):
+            decode_cursor(token, self.ordering)
+
+    def test_keyset_pages_over_null_values(self):
+        user = User.objects.create_user('cursor', 'cursor@example.com', 'pw')
+        category = Category.objects.create(name='cursor')
+        for i in range(6):
+            Post.objects.create(user=user, title=str(i), content='c', category=category if i % 2 else None)
+
+        for ordering in (['category', 'id'], ['-category', 'id']):
+            expected = list(Post.objects.order_by(*ordering).values_list('id', flat=True))
+            seen, values = [], None
+            while True:
+                queryset = Post.objects.order_by(*ordering)
+                if values is not None:
+                    queryset = queryset.filter(keyset_filter(ordering, values, Post))
+                page = list(queryset[:2])
+                if not page:
+                    break
+                seen += [post.pk for post in page]
+                values = decode_cursor(encode_cursor([page[-1].category_id, page[-1].pk], ordering), ordering)
+            self.assertEqual(seen, expected)
+
+    def test_api_rejects_a_forged_cursor(self):
+        response = APIClient().get('/post/feed/', {'cursor': 'forged'})
+        self.assertEqual(response.status_code, 404)
+
+
+class LikeCountSignalTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.fan = User.objects.create_user('fan', 'fan@example.com', 'pw')
+        self.post = Post.objects.create(user=self.author, title='t', content='c', is_published=True)
+
+    def like_count(self):
+        return Post.objects.get(pk=self.post.pk).like_count
+
+    def test_like_and_unlike(self):
+        like = Like.objects.create(user=self.fan, post=self.post)
+        self.assertEqual(self.like_count(), 1)
+        like.delete()
+        self.assertEqual(self.like_count(), 0)
+
+    def test_deleting_the_user_removes_their_likes(self):
+        Like.objects.create(user=self.fan, post=self.post)
+        self.fan.delete()
+        self.assertEqual(self.like_count(), 0)
+
+    def test_unlike_is_counted_against_trending_tags(self):
+        tag = Tag.objects.create(name='signals')
+        self.post.tags.add(tag)
+        counter = ActivityCounter.objects.filter(kind='tag', item_id=tag.pk, span='1h')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            like = Like.objects.create(user=self.fan, post=self.post)
+        self.assertEqual(counter.get().likes, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            like.delete()
+        self.assertEqual(counter.get().likes, 0)
+
+    def test_editing_a_post_keeps_concurrent_likes(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        Like.objects.create(user=self.fan, post=self.post)
+
+        serializer = PostSerializer(stale, data={'title': 'edited'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.title, 'edited')
+        self.assertEqual(post.like_count, 1)
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        self.post = Post.objects.create(user=user, title='t', content='c')
+        self.counter = WriteBehindCounter('views')
+        # Flush by hand instead of from the background thread.
+        patcher = mock.patch.object(self.counter, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views(self):
+        return Post.objects.get(pk=self.post.pk).views
+
+    def test_increments_are_merged_into_one_write(self):
+        for expected in (1, 2, 3):
+            self.assertEqual(self.counter.incr(self.post), expected)
+        self.assertEqual(self.views(), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.counter.flush()
+        writes = [q['sql'] for q in queries if '"views" = ' in q['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.views(), 3)
+        self.assertEqual(self.counter.incr(self.post), 1)
+
+    def test_failed_write_is_requeued(self):
+        self.counter.incr(self.post, 2)
+        with mock.patch.object(self.counter, '_write', side_effect=RuntimeError), \
+                self.assertLogs('pororohub.counters', 'ERROR'):
+            self.counter.flush()
+        self.assertEqual(self.views(), 0)
+
+        self.counter.incr(self.post)
+        self.counter.flush()
+        self.assertEqual(self.views(), 3)
+
+
+class LikedStateTests(TestCase):
+    def test_feed_page_resolves_likes_in_one_query(self):
+        author = User.objects.create_user('liked', 'liked@example.com', 'pw')
+        fan = User.objects.create_user('liker', 'liker@example.com', 'pw')
+        posts = [Post.objects.create(user=author, title=str(i), content='c') for i in range(5)]
+        for post in posts[:2]:
+            Like.objects.create(user=fan, post=post)
+
+        client = APIClient()
+        client.force_authenticate(fan)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/post/feed/')
+        self.assertEqual(response.status_code, 200)
+        liked = {item['id'] for item in response.data['results'] if item['is_liked']}
+        self.assertEqual(liked, {post.pk for post in posts[:2]})
+        like_queries = [q['sql'] for q in queries if 'post_like' in q['sql']]
+        self.assertEqual(len(like_queries), 1)
+
+
+class CategoryPostCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('counted', 'counted@example.com', 'pw')
+        self.first = Category.objects.create(name='first')
+        self.second = Category.objects.create(name='second')
+
+    def counts(self):
+        return [Category.objects.get(pk=c.pk).post_count for c in (self.first, self.second)]
+
+    def test_publish_move_and_delete(self):
+        Post.objects.create(user=self.user, title='t', content='c', category=self.first)
+        post = Post.objects.create(user=self.user, title='t', content='c', category=self.first, is_published=False)
+        self.assertEqual(self.counts(), [1, 0])
+
+        post = Post.objects.get(pk=post.pk)
+        post.is_published = True
+        post.save()
+        self.assertEqual(self.counts(), [2, 0])
+
+        post = Post.objects.get(pk=post.pk)
+        post.category = self.second
+        post.save()
+        self.assertEqual(self.counts(), [1, 1])
+
+        Post.objects.get(pk=post.pk).delete()
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_publish_all_applies_per_category_deltas(self):
+        for category in (self.first, self.first, self.second, None):
+            Post.objects.create(user=self.user, title='t', content='c', category=category, is_published=False)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/post/posts/publish-all/')
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(self.counts(), [2, 1])
+
+
+class ContentScorerTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('scored', 'scored@example.com', 'pw')
+        categories = [Category.objects.create(name=f'scored-{i}') for i in range(2)]
+        tags = [Tag.objects.create(name=f'scored-{i}') for i in range(4)]
+        for i in range(8):
+            post = Post.objects.create(
+                user=user, title=str(i), content='c',
+                category=categories[i % 2] if i % 3 else None,
+            )
+            post.tags.set(tags[i % 4:i % 4 + 1 + i % 3])
+            Post.objects.filter(pk=post.pk).update(like_count=i % 4, views=i * 7)
+        Post.objects.create(user=user, title='draft', content='c', is_published=False)
+        self.categories = categories
+        self.matrix = PostMatrix.build()
+
+    def test_scores_match_the_per_post_formula(self):
+        user_tags = {'scored-0', 'scored-2', 'unknown'}
+        user_categories = [self.categories[0].pk, self.categories[0].pk, self.categories[1].pk]
+        scores = ContentScorer().score(self.matrix, user_tags, user_categories)
+
+        posts = Post.objects.filter(is_published=True)
+        self.assertEqual(len(self.matrix), len(posts))
+        expected = {post.pk: calculate_similarity_score(post, user_tags, user_categories) for post in posts}
+        for post_id, row in self.matrix.row_of.items():
+            self.assertAlmostEqual(scores[row], expected[post_id])
+
+        ranked = [self.matrix.post_ids[row] for row in top_k(scores, 5)]
+        self.assertEqual(ranked, sorted(expected, key=lambda pk: -expected[pk])[:5])
+
+    def test_similar_scores_use_the_post_as_the_profile(self):
+        post = Post.objects.filter(is_published=True).exclude(category=None)[0]
+        row = self.matrix.row_of[post.pk]
+        scores = ContentScorer().score_similar(self.matrix, [row])[0]
+
+        user_tags = set(post.tags.values_list('name', flat=True))
+        for candidate in Post.objects.filter(is_published=True):
+            expected = calculate_similarity_score(candidate, user_tags, [post.category_id])
+            self.assertAlmostEqual(scores[self.matrix.row_of[candidate.pk]], expected)
+
+
+class SimilarPostsTests(TestCase):
+    def test_endpoint_serves_the_precomputed_neighbors(self):
+        user = User.objects.create_user('similar', 'similar@example.com', 'pw')
+        shared, other = Tag.objects.create(name='similar-shared'), Tag.objects.create(name='similar-other')
+        post, twin, stranger = [Post.objects.create(user=user, title=str(i), content='c') for i in range(3)]
+        post.tags.set([shared])
+        twin.tags.set([shared])
+        stranger.tags.set([other])
+        Post.objects.filter(pk=stranger.pk).update(views=3)
+        # What build_similar_posts stores, without its worker processes.
+        engine = ScoringEngine(PostMatrix.build())
+        save_similar_posts(engine.similar(list(range(len(engine.matrix))), 20))
+
+        client = APIClient()
+        response = client.get(f'/post/posts/{post.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [twin.pk, stranger.pk])
+
+        response = client.get(f'/post/posts/{post.pk}/similar/', {'limit': 0})
+        self.assertEqual([item['id'] for item in response.data], [twin.pk])
+
+        Post.objects.filter(pk=twin.pk).update(is_published=False)
+        response = client.get(f'/post/posts/{post.pk}/similar/')
+        self.assertEqual([item['id'] for item in response.data], [stranger.pk])
+
+        self.assertEqual(client.get('/post/posts/missing/similar/').status_code, 404)
+
+
+class CollaborativeFilteringTests(TestCase):
+    def setUp(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        settings_override = override_settings(RECOMMENDATION_CF_MODEL_DIR=model_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        author = User.objects.create_user('cf', 'cf@example.com', 'pw')
+        self.posts = [Post.objects.create(user=author, title=str(i), content='c') for i in range(4)]
+        liked = [(0, 1), (0, 1, 2), (2, 3), (1, 0)]
+        for i, rows in enumerate(liked):
+            fan = User.objects.create_user(f'cf-{i}', f'cf-{i}@example.com', 'pw')
+            for row in rows:
+                Like.objects.create(user=fan, post=self.posts[row])
+
+    def test_co_liked_posts_score_highest(self):
+        version, shape = train_cf_model(factors=2, chunk_size=2)
+        self.assertEqual(shape, (4, 4))
+        model = CFModel.load(version)
+
+        post_ids = [post.pk for post in self.posts] + ['unknown']
+        scores = model.score([self.posts[0].pk], post_ids)
+        self.assertEqual(scores.max(), 1.0)
+        self.assertGreater(scores[1], scores[3])
+        self.assertEqual(scores[4], 0.0)
+
+    def test_workers_pick_up_the_current_model(self):
+        with mock.patch('post.collaborative._checked_at', None), \
+                mock.patch('post.collaborative._model', None):
+            self.assertIsNone(get_cf_model())
+            version, shape = train_cf_model(factors=2, chunk_size=100)
+            with mock.patch('post.collaborative._checked_at', None):
+                self.assertEqual(get_cf_model().version, version)
+
+    def test_too_few_likes_is_an_error(self):
+        Like.objects.all().delete()
+        with self.assertRaises(NotEnoughData):
+            train_cf_model(factors=2, chunk_size=100)
+
+
+class RecommendationStoreTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('stored', 'stored@example.com', 'pw')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        self.posts = [Post.objects.create(user=author, title=str(i), content='c') for i in range(4)]
+        # A matrix cached by another test would not hold these posts.
+        patcher = mock.patch('post.scoring._matrix', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lists_are_stored_and_reused_while_fresh(self):
+        post_ids = get_recommended_post_ids(self.reader)
+        self.assertCountEqual(post_ids, [post.pk for post in self.posts])
+        self.assertEqual(UserRecommendation.objects.get(user=self.reader).post_ids, post_ids)
+
+        UserRecommendation.objects.filter(user=self.reader).update(post_ids=post_ids[:1])
+        with mock.patch('post.recommendation.score_recommendations') as score:
+            self.assertEqual(get_recommended_post_ids(self.reader), post_ids[:1])
+        score.assert_not_called()
+
+        UserRecommendation.objects.filter(user=self.reader).update(computed_at=timezone.now() - timedelta(days=1))
+        self.assertCountEqual(get_recommended_post_ids(self.reader), post_ids)
+
+    def test_a_like_drops_the_post_and_boosts_its_neighbors(self):
+        liked, kept, neighbor, _ = [post.pk for post in self.posts]
+        SimilarPost.objects.create(post_id=liked, similar_id=neighbor, rank=0, score=2.0)
+        UserRecommendation.objects.create(
+            user=self.reader, post_ids=[liked, kept], scores=[3.0, 2.0], computed_at=timezone.now()
+        )
+
+        rerank_after_like(self.reader.pk, liked)
+        stored = UserRecommendation.objects.get(user=self.reader)
+        self.assertEqual(stored.post_ids, [neighbor, kept])
+        self.assertEqual(stored.scores, [5.0, 2.0])
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(*optimal_size(1000, 0.01))
+        keys = [f'post-{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{i}' in bloom for i in range(5000))
+        self.assertLess(false_positives, 5000 * 0.03)
+
+    def test_serialization_and_vectorized_lookup(self):
+        bloom = BloomFilter(*optimal_size(100, 0.01))
+        bloom.add('a')
+        bloom.add('b')
+        restored = BloomFilter.from_bytes(bloom.to_bytes())
+        self.assertEqual((restored.bits, restored.hashes, restored.count), (bloom.bits, bloom.hashes, 2))
+
+        keys = ['a', 'b', 'c']
+        positions = bit_positions_array(keys, restored.bits, restored.hashes)
+        self.assertEqual(list(restored.contains_positions(positions)), [key in restored for key in keys])
+
+    @override_settings(SEEN_FILTER_CAPACITY=2)
+    def test_seen_set_keeps_one_previous_generation(self):
+        seen = SeenSet()
+        for post_id in ['a', 'b', 'c', 'd']:
+            seen.add(post_id)
+        self.assertTrue(all(post_id in seen for post_id in 'abcd'))
+        seen.add('e')
+        self.assertNotIn('a', seen)
+        self.assertIn('e', seen)
+
+
+class UnseenFeedTests(TestCase):
+    def test_unseen_skips_seen_posts_across_pages(self):
+        author = User.objects.create_user('unseen', 'unseen@example.com', 'pw')
+        reader = User.objects.create_user('unseen-reader', 'unseen-reader@example.com', 'pw')
+        posts = [Post.objects.create(user=author, title=str(i), content='c') for i in range(7)]
+        newest_first = [post.pk for post in reversed(posts)]
+        mark_seen(reader.pk, newest_first[1:3])
+
+        client = APIClient()
+        client.force_authenticate(reader)
+        with mock.patch.object(seen_buffer, '_pending', defaultdict(set)), \
+                mock.patch.object(seen_buffer, '_ensure_worker'):
+            seen_buffer.add(reader.pk, [newest_first[4]])
+            results, url = [], '/post/feed/me/?unseen=1&page_size=2'
+            while url:
+                response = client.get(url)
+                results += [item['id'] for item in response.data['results']]
+                url = response.data['next']
+
+        self.assertEqual(results, [newest_first[i] for i in (0, 3, 5, 6)])
+
+
+@override_settings(SEARCH_BACKEND='database')
+class DatabaseSearchTests(TestCase):
+    def setUp(self):
+        caches[settings.SEARCH_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user('searcher', 'searcher@example.com', 'pw')
+
+    def search(self, **params):
+        response = APIClient().get('/post/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_title_matches_rank_above_content_matches(self):
+        in_content = Post.objects.create(user=self.user, title='other', content='a walrus appears')
+        in_title = Post.objects.create(user=self.user, title='walrus', content='nothing here')
+        Post.objects.create(user=self.user, title='walrus', content='draft', is_published=False)
+        Post.objects.create(user=self.user, title='unrelated', content='nothing here')
+
+        self.assertEqual([item['id'] for item in self.search(q='walrus')], [in_title.pk, in_content.pk])
+
+    def test_search_vector_follows_edits(self):
+        post = Post.objects.create(user=self.user, title='before', content='c')
+        post = Post.objects.get(pk=post.pk)
+        post.title = 'narwhal'
+        post.save(update_fields=['title'])
+        self.assertEqual([item['id'] for item in self.search(q='narwhal')], [post.pk])
+
+    def test_headlines_escape_the_content(self):
+        Post.objects.create(user=self.user, title='t', content='okapi <script>alert(1)</script> & "okapi"')
+        headline = self.search(q='okapi')[0]['headline']
+        self.assertNotIn('<script>', headline)
+        self.assertIn('&amp; &quot;<mark>okapi</mark>&quot;', headline)
+
+    def test_tag_filters(self):
+        red, blue = Tag.objects.create(name='Red'), Tag.objects.create(name='blue')
+        both = Post.objects.create(user=self.user, title='both', content='c')
+        both.tags.set([red, blue])
+        only_red = Post.objects.create(user=self.user, title='red', content='c')
+        only_red.tags.set([red])
+        Post.objects.create(user=self.user, title='none', content='c')
+
+        self.assertEqual([item['id'] for item in self.search(tags=['red', 'BLUE'])], [both.pk])
+        self.assertEqual(
+            [item['id'] for item in self.search(tags=['red', 'blue'], tag_mode='any')],
+            [only_red.pk, both.pk],
+        )
+
+
+class IndexSearchTests(TestCase):
+    def setUp(self):
+        caches[settings.SEARCH_CACHE_ALIAS].clear()
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir)
+        settings_override = override_settings(SEARCH_BACKEND='index', SEARCH_INDEX_DIR=index_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Built from this test's rows instead of a process-wide index.
+        patcher = mock.patch('search.engine._indexes', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user('indexed', 'indexed@example.com', 'pw')
+        tag = Tag.objects.create(name='indexed')
+        for i in range(3):
+            Post.objects.create(user=user, title=f'ibex {i}', content='c').tags.set([tag])
+
+    def search(self, **params):
+        with mock.patch('post.views.get_index', wraps=get_index) as index:
+            response = APIClient().get('/post/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, index.call_count
+
+    def test_results_and_facets_are_cached(self):
+        data, searches = self.search(q='ibex')
+        self.assertEqual((len(data['results']), searches), (3, 1))
+        self.assertEqual(data['facets']['tags'], [{'value': 'indexed', 'count': 3}])
+
+        cached, searches = self.search(q='ibex')
+        self.assertEqual((cached, searches), (data, 0))
+
+    @override_settings(SEARCH_CACHE_MAX_RESULTS=2)
+    def test_long_hit_lists_are_searched_again(self):
+        self.search(q='ibex')
+        data, searches = self.search(q='ibex')
+        self.assertEqual((len(data['results']), searches), (3, 1))
+        self.assertEqual(data['facets']['tags'], [{'value': 'indexed', 'count': 3}])
+
+
+class TrendingActivityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('trending', 'trending@example.com', 'pw')
+        self.category = Category.objects.create(name='trending')
+        self.tags = [Tag.objects.create(name=f'trending-{i}') for i in range(2)]
+        # The commit hooks also refresh similar posts from the shared matrix.
+        patcher = mock.patch('post.scoring._matrix', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = Post.objects.create(user=self.user, title='t', content='c', category=self.category)
+            self.post.tags.set(self.tags)
+
+    def posts(self, kind, item_id):
+        return ActivityCounter.objects.get(kind=kind, item_id=item_id, span='24h').posts
+
+    def tag_posts(self):
+        return [self.posts('tag', tag.pk) for tag in self.tags]
+
+    def test_unpublishing_takes_the_post_back(self):
+        self.assertEqual((self.posts('category', self.category.pk), self.tag_posts()), (1, [1, 1]))
+        post = Post.objects.get(pk=self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.is_published = False
+            post.save(update_fields=['is_published'])
+        self.assertEqual((self.posts('category', self.category.pk), self.tag_posts()), (0, [0, 0]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.is_published = True
+            post.save(update_fields=['is_published'])
+        self.assertEqual((self.posts('category', self.category.pk), self.tag_posts()), (1, [1, 1]))
+
+    def test_removed_and_cleared_tags(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.remove(self.tags[0])
+        self.assertEqual(self.tag_posts(), [0, 1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.clear()
+        self.assertEqual(self.tag_posts(), [0, 0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.add(*self.tags)
+            self.tags[1].posts.clear()
+            self.tags[0].posts.remove(self.post)
+        self.assertEqual(self.tag_posts(), [0, 0])
+
+    def test_unpublished_posts_do_not_move_tag_counts(self):
+        Post.objects.filter(pk=self.post.pk).update(is_published=False)
+        post = Post.objects.get(pk=self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.clear()
+        self.assertEqual(self.tag_posts(), [1, 1])
+
+
+class HotScoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('hot', 'hot@example.com', 'pw')
+
+    def test_new_posts_start_at_zero_engagement(self):
+        post = Post.objects.create(user=self.user, title='t', content='c')
+        post = Post.objects.get(pk=post.pk)
+        self.assertAlmostEqual(post.hot_score, hot_score(0, 0, post.created_at), places=3)
+
+    def test_update_hot_scores_recomputes_active_posts(self):
+        old = Post.objects.create(user=self.user, title='old', content='c')
+        new = Post.objects.create(user=self.user, title='new', content='c')
+        Post.objects.filter(pk=old.pk).update(like_count=2 ** 20, activity_at=timezone.now())
+        Post.objects.filter(pk=new.pk).update(like_count=2 ** 20, activity_at=timezone.now() - timedelta(days=1))
+        call_command('update_hot_scores', stdout=StringIO())
+
+        old, new = Post.objects.get(pk=old.pk), Post.objects.get(pk=new.pk)
+        self.assertAlmostEqual(old.hot_score, hot_score(2 ** 20, 0, old.created_at))
+        self.assertAlmostEqual(new.hot_score, hot_score(0, 0, new.created_at), places=3)
+        response = APIClient().get('/post/feed/', {'sort': 'popular'})
+        self.assertEqual([item['id'] for item in response.data['results']], [old.pk, new.pk])
+
+    def test_migration_backfill_matches_the_model_formula(self):
+        backfill = import_module('post.migrations.0010_post_hot_score').backfill_hot_score
+        post = Post.objects.create(user=self.user, title='t', content='c')
+        Post.objects.filter(pk=post.pk).update(like_count=3, views=40, hot_score=0)
+        backfill(django_apps, None)
+        post = Post.objects.get(pk=post.pk)
+        self.assertAlmostEqual(post.hot_score, hot_score(3, 40, post.created_at))
+
+
+class FeedInboxTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('inbox-author', 'inbox-author@example.com', 'pw')
+        self.reader = User.objects.create_user('inbox-reader', 'inbox-reader@example.com', 'pw')
+        self.tag = Tag.objects.create(name='inbox-term')
+        InterestSubscription.objects.create(user=self.reader, term='inbox-term')
+
+    def create_post(self, created_at, is_published=True):
+        post = Post.objects.create(user=self.author, title='t', content='c', is_published=is_published)
+        post.tags.set([self.tag])
+        Post.objects.filter(pk=post.pk).update(created_at=created_at)
+        return Post.objects.get(pk=post.pk)
+
+    def inbox(self):
+        return FeedInbox.objects.get(user=self.reader).post_ids
+
+    @override_settings(FEED_INBOX_SIZE=2)
+    def test_fanout_merges_by_time_and_keeps_the_newest(self):
+        now = timezone.now()
+        newest, older, oldest = (self.create_post(now - timedelta(hours=hours)) for hours in (1, 2, 3))
+        draft = self.create_post(now - timedelta(hours=4), is_published=False)
+
+        self.assertEqual(fanout_post(older.pk), 1)
+        fanout_post(newest.pk)
+        fanout_post(older.pk)
+        self.assertEqual(self.inbox(), [newest.pk, older.pk])
+
+        fanout_post(oldest.pk)
+        Post.objects.filter(pk=draft.pk).update(is_published=True)
+        fanout_post(draft.pk)
+        self.assertEqual(self.inbox(), [newest.pk, older.pk])
+
+        seed_inbox(self.reader.pk)
+        self.assertEqual(self.inbox(), [newest.pk, older.pk])
+
+    def test_inbox_pages_by_cursor(self):
+        now = timezone.now()
+        posts = [self.create_post(now - timedelta(minutes=i)) for i in range(5)]
+        for post in reversed(posts):
+            fanout_post(post.pk)
+
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        results, url = [], '/post/feed/me/?page_size=2'
+        while url:
+            response = client.get(url)
+            results += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(results, [post.pk for post in posts])
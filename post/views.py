@@ -1,33 +1,65 @@
+import html
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Coalesce, Lower
 from django.utils import timezone
 from rest_framework import generics, status, views
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from .models import Post, Tag, Category, Like, Report
+from pororohub.counters import view_counter
+from pororohub.pagination import StandardPagination, decode_cursor, encode_cursor
+from search.autocomplete import get_autocomplete
+from search.cache import (
+    bump_generations, cached_result, capped_ids, normalize_query, stats as search_cache_stats
+)
+from search.engine import get_index, record_changes, search_enabled
+from search.text import highlight
+from .models import (
+    Post, Tag, Category, Like, Report, SimilarPost, SEARCH_CONFIG, adjust_category_post_counts
+)
 from .serializers import (
     PostSerializer, PostListSerializer, TagSerializer, 
     CategorySerializer, LikeSerializer, ReportSerializer, 
-    ReportCreateSerializer, UserBasicSerializer
+    ReportCreateSerializer, UserBasicSerializer, PostSearchSerializer, annotate_is_liked
 )
-from .recommendation import get_recommended_posts
+from .activity import expire_activity_if_due, record_post_activity, trending
+from .feed import feed_page, schedule_fanout
+from .recommendation import get_recommended_post_ids, hydrate_posts
+from .seen import load_seen, seen_buffer
+
+# Models whose writes can change post search results
+SEARCH_POST_MODELS = ('post', 'tag', 'category')
+
+# Cursor values of the inbox feed: [time in ms, post id] (see feed_page)
+INBOX_ORDERING = ['published', 'id']
+
+# ts_headline match delimiters, swapped for <mark> after the headline is escaped
+HEADLINE_START, HEADLINE_STOP = '\x02', '\x03'
 
-class StandardPagination(PageNumberPagination):
-    page_size = 20
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+def count_related(model, field):
+    # Stacked Count() joins multiply rows, so count each relation in its own subquery
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(count=Count('pk')).values('count')), 0)
 
 class PostListCreateView(generics.ListCreateAPIView):
     serializer_class = PostListSerializer
     pagination_class = StandardPagination
 
     def get_queryset(self):
-        return Post.objects.filter(is_published=True).annotate(
-            like_count=Count('likes')
-        ).select_related('user', 'category').prefetch_related('tags')
+        queryset = Post.objects.filter(is_published=True).select_related(
+            'user', 'category'
+        ).prefetch_related('tags')
+        if self.request.GET.get('sort') == 'popular':
+            queryset = queryset.order_by('-hot_score', 'id')
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -52,7 +84,7 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = PostSerializer
 
     def get_queryset(self):
-        return Post.objects.annotate(like_count=Count('likes'))
+        return annotate_is_liked(Post.objects.all(), self.request)
 
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -61,8 +93,9 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.views += 1
-        instance.save(update_fields=['views'])
+        instance.views += view_counter.incr(instance)
+        if request.user.is_authenticated:
+            seen_buffer.add(request.user.pk, [instance.pk]) # written in batches like the view count
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -87,26 +120,22 @@ class UserPostsView(generics.ListAPIView):
         return Post.objects.filter(
             user_id=user_id, 
             is_published=True
-        ).annotate(
-            like_count=Count('likes')
         ).select_related('user', 'category')
 
 @api_view(['GET'])
 def feed_view(request):
     sort_by = request.GET.get('sort', 'recent')
     
-    queryset = Post.objects.filter(is_published=True).annotate(
-        like_count=Count('likes')
-    ).select_related('user', 'category')
+    queryset = Post.objects.filter(is_published=True).select_related('user', 'category')
     
     if sort_by == 'popular':
-        queryset = queryset.order_by('-like_count', '-views', '-created_at')
+        queryset = queryset.order_by('-hot_score', 'id')
     else:
         queryset = queryset.order_by('-created_at')
     
     paginator = StandardPagination()
     page = paginator.paginate_queryset(queryset, request)
-    serializer = PostListSerializer(page, many=True)
+    serializer = PostListSerializer(page, many=True, context={'request': request})
     return paginator.get_paginated_response(serializer.data)
 
 @api_view(['GET'])
@@ -115,29 +144,45 @@ def user_feed_view(request):
     sort_by = request.GET.get('sort', 'recent')
     
     user = request.user
-    if hasattr(user, 'actor') and user.actor.interests:
-        user_interests = set(user.actor.interests.split(','))
-        queryset = Post.objects.filter(
-            Q(tags__name__in=user_interests) | Q(is_published=True),
-            is_published=True
-        ).distinct().annotate(
-            like_count=Count('likes')
-        ).select_related('user', 'category')
-    else:
-        queryset = Post.objects.filter(is_published=True).annotate(
-            like_count=Count('likes')
-        ).select_related('user', 'category')
+    if sort_by != 'popular' and user.interest_subscriptions.exists():
+        return inbox_feed_response(request)
+
+    queryset = Post.objects.filter(is_published=True).select_related('user', 'category')
     
     if sort_by == 'popular':
-        queryset = queryset.order_by('-like_count', '-views', '-created_at')
+        queryset = queryset.order_by('-hot_score', 'id')
     else:
         queryset = queryset.order_by('-created_at')
     
     paginator = StandardPagination()
+    if request.GET.get('unseen'):
+        # Skipped before the page is cut, so ?unseen always pages by cursor.
+        seen = load_seen(user.pk)
+        paginator.exclude = lambda post: post.pk in seen
     page = paginator.paginate_queryset(queryset, request)
     serializer = PostListSerializer(page, many=True, context={'request': request})
     return paginator.get_paginated_response(serializer.data)
 
+def inbox_feed_response(request):
+    """Cursor page of the user's fanned-out inbox, shaped like StandardPagination's cursor mode."""
+    paginator = StandardPagination()
+    token = request.GET.get(paginator.cursor_query_param)
+    cursor = decode_cursor(token, INBOX_ORDERING) if token else None
+    exclude = None
+    if request.GET.get('unseen'):
+        seen = load_seen(request.user.pk)
+        exclude = lambda post_id: post_id in seen
+    post_ids, next_values = feed_page(request.user.pk, cursor, paginator.get_page_size(request), exclude)
+
+    page = hydrate_posts(post_ids)
+    serializer = PostListSerializer(page, many=True, context={'request': request})
+
+    next_link = None
+    if next_values is not None:
+        url = remove_query_param(request.build_absolute_uri(), paginator.page_query_param)
+        next_link = replace_query_param(url, paginator.cursor_query_param, encode_cursor(next_values, INBOX_ORDERING))
+    return Response({'next': next_link, 'results': serializer.data})
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def like_post(request, post_id):
@@ -146,7 +191,8 @@ def like_post(request, post_id):
     except Post.DoesNotExist:
         return Response({'detail': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
+    with transaction.atomic():
+        like, created = Like.objects.get_or_create(user=request.user, post=post)
     
     if created:
         serializer = LikeSerializer(like)
@@ -169,18 +215,18 @@ def unlike_post(request, post_id):
     except Post.DoesNotExist:
         return Response({'detail': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    try:
-        like = Like.objects.get(user=request.user, post=post)
-        like.delete()
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
+
+    if deleted:
         return Response({
             'liked': False,
             'message': 'Post unliked successfully'
         }, status=status.HTTP_200_OK)
-    except Like.DoesNotExist:
-        return Response({
-            'liked': False,
-            'message': 'Post was not liked'
-        }, status=status.HTTP_200_OK)
+    return Response({
+        'liked': False,
+        'message': 'Post was not liked'
+    }, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -190,33 +236,144 @@ def toggle_like(request, post_id):
     except Post.DoesNotExist:
         return Response({'detail': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    try:
-        like = Like.objects.get(user=request.user, post=post)
-        like.delete()
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
+        if not deleted:
+            Like.objects.create(user=request.user, post=post)
+
+    if deleted:
         return Response({
             'liked': False,
             'message': 'Post unliked successfully'
         }, status=status.HTTP_200_OK)
-    except Like.DoesNotExist:
-        like = Like.objects.create(user=request.user, post=post)
-        return Response({
-            'liked': True,
-            'message': 'Post liked successfully'
-        }, status=status.HTTP_201_CREATED)
+    return Response({
+        'liked': True,
+        'message': 'Post liked successfully'
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+def similar_posts(request, pk):
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), settings.SIMILAR_POSTS_PER_POST)
+    except ValueError:
+        limit = 10
+
+    stored = SimilarPost.objects.filter(
+        post_id=pk, similar__is_published=True
+    ).select_related('similar__user', 'similar__category')[:limit]
+    posts = [row.similar for row in stored]
+
+    if not posts and not Post.objects.filter(pk=pk).exists():
+        return Response({'detail': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return Response(serializer.data)
+
+def search_posts_from_index(request, query, category_id, tag_names, tag_mode, cache_params):
+    # Matching, filtering and ranking happen in memory; only the page is read from the database.
+    all_of, any_of = [], []
+    try:
+        if category_id:
+            all_of.append(('category', int(category_id)))
+    except (ValueError, TypeError):
+        pass
+    tags = [('tags', tag_name.lower()) for tag_name in tag_names]
+    if tag_mode == 'any':
+        any_of = tags
+    else:
+        all_of += tags
+
+    def search(facet_fields=()):
+        return get_index('posts').search(
+            query,
+            order=None if query else '-created',
+            all_of=all_of,
+            any_of=any_of,
+            facet_fields=facet_fields
+        )
+
+    def compute():
+        # Hit lists past SEARCH_CACHE_MAX_RESULTS are cached as None and
+        # searched again on read; the top facets are small enough to keep.
+        hits, facets = search(('tags', 'category'))
+        return {**capped_ids(hits), 'facets': {
+            'tags': top_facets(facets['tags']),
+            'categories': top_facets(facets['category']),
+        }}
+
+    result = cached_result('posts', cache_params, SEARCH_POST_MODELS, compute)
+    hits = result['hits']
+    if hits is None:
+        hits = search()[0]
+    response = render_search_page(request, hits, query)
+    response.data['facets'] = result['facets']
+    return response
+
+def render_search_page(request, hits, query, search_query=None):
+    """Paginates [(post_id, score), ...] and reads only the page from the database."""
+    paginator = StandardPagination()
+    page_hits = paginator.paginate_queryset(hits, request)
+    scores = dict(page_hits)
+    page_ids = [post_id for post_id, score in page_hits]
+    posts = hydrate_posts(page_ids)
+    if search_query is not None:
+        add_headlines(posts, search_query)
+    else:
+        for post in posts:
+            post.headline = highlight(post.content, query)
+    for post in posts:
+        post.rank = scores[post.pk]
+    serializer = PostSearchSerializer(posts, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+def add_headlines(posts, search_query):
+    """
+    Sets post.headline for one page of posts with a single ts_headline query.
+    Matches are delimited with control characters and the rest is escaped,
+    so markup in the content can't reach the client as HTML.
+    """
+    headlines = dict(Post.objects.filter(pk__in=[post.pk for post in posts]).annotate(
+        headline=SearchHeadline(
+            'content', search_query, config=SEARCH_CONFIG,
+            start_sel=HEADLINE_START, stop_sel=HEADLINE_STOP, max_words=35, min_words=15
+        )
+    ).values_list('id', 'headline'))
+    for post in posts:
+        headline = html.escape(headlines.get(post.pk) or '')
+        post.headline = headline.replace(HEADLINE_START, '<mark>').replace(HEADLINE_STOP, '</mark>')
+
+def top_facets(counts, limit=20):
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+    return [{'value': value, 'count': count} for value, count in ranked]
 
 @api_view(['GET'])
 def search_posts(request):
     query = request.GET.get('q', '').strip()
     category_id = request.GET.get('category')
     tag_names = request.GET.getlist('tags')
+    tag_mode = request.GET.get('tag_mode', 'all')
+    cache_params = {
+        'q': normalize_query(query),
+        'category': category_id,
+        'tags': sorted({tag_name.lower() for tag_name in tag_names}),
+        'tag_mode': tag_mode,
+    }
+    
+    if search_enabled() and (query or category_id or tag_names):
+        return search_posts_from_index(request, query, category_id, tag_names, tag_mode, cache_params)
     
     queryset = Post.objects.filter(is_published=True)
+    serializer_class = PostListSerializer
+    search_query = None
     
     if query:
-        queryset = queryset.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query)
-        )
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            # ts_rank is a real; as double precision it survives the round
+            # trip through a cursor and compares exactly on the next page.
+            rank=Cast(SearchRank(F('search_vector'), search_query), FloatField()),
+        ).order_by('-rank', '-created_at', 'id')
+        serializer_class = PostSearchSerializer
     
     if category_id:
         try:
@@ -225,23 +382,61 @@ def search_posts(request):
             pass
     
     if tag_names:
-        for tag_name in tag_names:
-            queryset = queryset.filter(tags__name__iexact=tag_name)
-    
-    queryset = queryset.distinct().annotate(
-        like_count=Count('likes', distinct=True)
-    ).select_related('user', 'category').prefetch_related('tags')
+        # One post_id IN (...) subquery instead of a join per tag plus DISTINCT.
+        # Tag bitmaps and facets only exist with SEARCH_BACKEND = 'index'.
+        names = {tag_name.lower() for tag_name in tag_names}
+        tagged = Post.tags.through.objects.annotate(
+            tag_name=Lower('tag__name')
+        ).filter(tag_name__in=names).values('post_id')
+        if tag_mode != 'any':
+            tagged = tagged.annotate(
+                n=Count('tag_name', distinct=True)
+            ).filter(n=len(names)).values('post_id')
+        queryset = queryset.filter(pk__in=tagged)
+
+    if query and 'cursor' not in request.GET:
+        result = cached_result('posts', cache_params, SEARCH_POST_MODELS, lambda: capped_ids(
+            queryset.values_list('id', 'rank')
+        ))
+        if result['hits'] is not None:
+            return render_search_page(request, result['hits'], query, search_query)
+    
+    queryset = queryset.select_related('user', 'category').prefetch_related('tags')
     
     paginator = StandardPagination()
     page = paginator.paginate_queryset(queryset, request)
     
     if page is not None:
-        serializer = PostListSerializer(page, many=True, context={'request': request})
+        if search_query is not None:
+            add_headlines(page, search_query)
+        serializer = serializer_class(page, many=True, context={'request': request})
         return paginator.get_paginated_response(serializer.data)
     
-    serializer = PostListSerializer(queryset, many=True, context={'request': request})
+    posts = list(queryset)
+    if search_query is not None:
+        add_headlines(posts, search_query)
+    serializer = serializer_class(posts, many=True, context={'request': request})
     return Response(serializer.data)
 
+def paginate_search(request, namespace, query, queryset, serializer_class, models):
+    """Paginates a name search, caching the ordered ids of non-cursor queries."""
+    queryset = queryset.order_by('pk')
+    paginator = StandardPagination()
+
+    if query and 'cursor' not in request.GET:
+        result = cached_result(namespace, {'q': normalize_query(query)}, models, lambda: capped_ids(
+            queryset.values_list('pk', flat=True)
+        ))
+        if result['hits'] is not None:
+            page_ids = paginator.paginate_queryset(result['hits'], request)
+            objects = queryset.model.objects.in_bulk(page_ids)
+            serializer = serializer_class([objects[pk] for pk in page_ids if pk in objects], many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
 @api_view(['GET'])
 def search_categories(request):
     query = request.GET.get('q', '')
@@ -254,10 +449,7 @@ def search_categories(request):
             Q(description__icontains=query)
         )
     
-    paginator = StandardPagination()
-    page = paginator.paginate_queryset(queryset, request)
-    serializer = CategorySerializer(page, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    return paginate_search(request, 'categories', query, queryset, CategorySerializer, ('category',))
 
 @api_view(['GET'])
 def search_tags(request):
@@ -268,20 +460,55 @@ def search_tags(request):
     if query:
         queryset = queryset.filter(name__icontains=query)
     
-    paginator = StandardPagination()
-    page = paginator.paginate_queryset(queryset, request)
-    serializer = TagSerializer(page, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    return paginate_search(request, 'tags', query, queryset, TagSerializer, ('tag',))
+
+@api_view(['GET'])
+def autocomplete(request):
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 5)), 20))
+    except ValueError:
+        limit = 5
+
+    results = get_autocomplete().complete(query, limit)
+    return Response({
+        kind: [{'id': item_id, 'text': text, 'score': score} for item_id, text, score in items]
+        for kind, items in results.items()
+    })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recommended_posts(request):
-    posts = get_recommended_posts(request.user)
+    post_ids = get_recommended_post_ids(request.user)
     paginator = StandardPagination()
-    page = paginator.paginate_queryset(posts, request)
+    page = hydrate_posts(paginator.paginate_queryset(post_ids, request))
     serializer = PostListSerializer(page, many=True, context={'request': request})
     return paginator.get_paginated_response(serializer.data)
 
+@api_view(['GET'])
+def trending_tags(request):
+    span = request.GET.get('window', '24h')
+    if span not in settings.ACTIVITY_WINDOWS:
+        return Response(
+            {'detail': f"window must be one of {', '.join(settings.ACTIVITY_WINDOWS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 50))
+    except ValueError:
+        limit = 10
+
+    expire_activity_if_due()
+    results = {'window': span}
+    for key, kind, model in (('tags', 'tag', Tag), ('categories', 'category', Category)):
+        rows = trending(kind, span, limit)
+        names = model.objects.in_bulk([row[0] for row in rows])
+        results[key] = [
+            {'id': item_id, 'name': names[item_id].name, 'posts': posts, 'likes': likes, 'score': score}
+            for item_id, posts, likes, score in rows if item_id in names
+        ]
+    return Response(results)
+
 class TagListCreateView(generics.ListCreateAPIView):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -337,8 +564,6 @@ def category_posts(request, category_id):
     queryset = Post.objects.filter(
         category_id=category_id,
         is_published=True
-    ).annotate(
-        like_count=Count('likes')
     ).select_related('user', 'category').prefetch_related('tags')
     
     paginator = StandardPagination()
@@ -395,17 +620,21 @@ def update_report_status(request, report_id):
     serializer = ReportSerializer(report)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_search_cache_stats(request):
+    return Response(search_cache_stats())
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_posts_list(request):
     queryset = Post.objects.all().annotate(
-        like_count=Count('likes'),
         report_count=Count('reports')
     ).select_related('user', 'category')
     
     paginator = StandardPagination()
     page = paginator.paginate_queryset(queryset, request)
-    serializer = PostListSerializer(page, many=True)
+    serializer = PostListSerializer(page, many=True, context={'request': request})
     return paginator.get_paginated_response(serializer.data)
 
 @api_view(['DELETE'])
@@ -422,10 +651,10 @@ def admin_delete_post(request, post_id):
 @permission_classes([IsAdminUser])
 def admin_users_list(request):
     users = User.objects.all().annotate(
-        post_count=Count('posts'),
-        like_count=Count('likes'),
-        report_count=Count('reports_made')
-    )
+        post_count=count_related(Post, 'user'),
+        like_count=count_related(Like, 'user'),
+        report_count=count_related(Report, 'reporter')
+    ).order_by('id')
     
     paginator = StandardPagination()
     page = paginator.paginate_queryset(users, request)
@@ -488,7 +717,16 @@ def unpublish_post(request, post_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def publish_all_my_posts(request):
-    updated = Post.objects.filter(user=request.user, is_published=False).update(is_published=True)
+    with transaction.atomic():
+        posts = Post.objects.select_for_update().filter(user=request.user, is_published=False)
+        rows = list(posts.values_list('id', 'category_id'))
+        updated = posts.update(is_published=True)
+        adjust_category_post_counts(Counter(category_id for post_id, category_id in rows))
+        record_changes('posts', [post_id for post_id, category_id in rows])
+        record_post_activity([post_id for post_id, category_id in rows], posts=1)
+        for post_id, category_id in rows:
+            schedule_fanout(post_id)
+        bump_generations('post')
     return Response({
         'message': f'Published {updated} posts successfully',
         'count': updated
@@ -0,0 +1,147 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .text import normalize
+
+WORD_START_RE = re.compile(r'\S+')
+# Word starts indexed per label, so "고양" also completes "오늘의 고양이".
+MAX_WORD_KEYS = 8
+# Keys examined per lookup; bounds the cost of one- or two-letter prefixes.
+SCAN_LIMIT = 2000
+
+
+class PrefixIndex:
+    """
+    Sorted array of (key, id) pairs searched with bisect. Each label is
+    indexed under the suffixes starting at its first MAX_WORD_KEYS words,
+    and a lookup returns the most popular labels with a key starting with
+    the prefix.
+    """
+    def __init__(self, entries=()):
+        self.entries = {}
+        pairs = []
+        for item_id, label, score in entries:
+            keys = self.keys_for(label)
+            self.entries[item_id] = (label, score, keys)
+            pairs.extend((key, item_id) for key in keys)
+        pairs.sort()
+        self.keys = pairs
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def keys_for(label):
+        text = normalize(label).strip()
+        starts = [m.start() for m in WORD_START_RE.finditer(text)][:MAX_WORD_KEYS]
+        return sorted({text[start:] for start in starts})
+
+    def add(self, item_id, label, score):
+        self.remove(item_id)
+        keys = self.keys_for(label)
+        self.entries[item_id] = (label, score, keys)
+        for key in keys:
+            insort(self.keys, (key, item_id))
+
+    def remove(self, item_id):
+        entry = self.entries.pop(item_id, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            i = bisect_left(self.keys, (key, item_id))
+            if i < len(self.keys) and self.keys[i] == (key, item_id):
+                del self.keys[i]
+
+    def complete(self, prefix, limit):
+        """[(id, label, score), ...] best first: popularity, then shorter labels."""
+        prefix = normalize(prefix).strip()
+        if not prefix:
+            return []
+        matched = set()
+        i = bisect_left(self.keys, (prefix,))
+        for key, item_id in self.keys[i:i + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            matched.add(item_id)
+        best = heapq.nsmallest(limit, matched, key=lambda item_id: (
+            -self.entries[item_id][1], len(self.entries[item_id][0]), self.entries[item_id][0]
+        ))
+        return [(item_id, *self.entries[item_id][:2]) for item_id in best]
+
+
+class Autocomplete:
+    """Prefix indexes of tag names, category names and published post titles."""
+    def __init__(self, tags, categories, posts):
+        self.tags = tags
+        self.categories = categories
+        self.posts = posts
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls):
+        from post.models import Category, Post, Tag
+
+        return cls(
+            PrefixIndex(Tag.objects.annotate(
+                post_count=Count('posts', filter=Q(posts__is_published=True))
+            ).values_list('id', 'name', 'post_count')),
+            PrefixIndex(Category.objects.values_list('id', 'name', 'post_count')),
+            PrefixIndex(Post.objects.filter(is_published=True).values_list('id', 'title', 'like_count')),
+        )
+
+    def complete(self, prefix, limit):
+        with self.lock:
+            return {
+                'tags': self.tags.complete(prefix, limit),
+                'categories': self.categories.complete(prefix, limit),
+                'posts': self.posts.complete(prefix, limit),
+            }
+
+
+_autocomplete = None
+_autocomplete_lock = threading.Lock()
+
+
+def get_autocomplete():
+    """
+    Returns the process's Autocomplete, rebuilt at most every
+    SEARCH_AUTOCOMPLETE_TTL seconds to pick up writes from other processes
+    and fresh popularity counts. Writes in this process apply immediately.
+    """
+    global _autocomplete
+    with _autocomplete_lock:
+        if _autocomplete is None or time.monotonic() - _autocomplete.built_at > settings.SEARCH_AUTOCOMPLETE_TTL:
+            _autocomplete = Autocomplete.build()
+        return _autocomplete
+
+
+def loaded_autocomplete():
+    return _autocomplete
+
+
+def update_entry(kind, item_id, label=None, score=None):
+    """
+    Adds, renames (keeping the score when `score` is None) or, with no
+    label, removes an entry of the loaded Autocomplete once the write commits.
+    """
+    def apply():
+        autocomplete = loaded_autocomplete()
+        if autocomplete is None:
+            return
+        index = getattr(autocomplete, kind)
+        with autocomplete.lock:
+            if label is None:
+                index.remove(item_id)
+            else:
+                current = index.entries.get(item_id)
+                index.add(item_id, label, score if score is not None else (current[1] if current else 0))
+
+    transaction.on_commit(apply)
@@ -0,0 +1,239 @@
+import sys
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+ARRAY_MAX = 4096
+CHUNK_BITS = 16
+LOW_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+
+
+def _to_container(values):
+    """Picks the container for a chunk: a sorted uint16 array when sparse, else a bitset int."""
+    if len(values) <= ARRAY_MAX:
+        return array('H', sorted(values))
+    bits = 0
+    for value in values:
+        bits |= 1 << value
+    return bits
+
+
+def _values(container):
+    if isinstance(container, array):
+        return container
+    # Walked one 64-bit word at a time: clearing bits of the whole 2^16-bit
+    # int would copy it once per value.
+    words = array('Q', container.to_bytes(CHUNK_BYTES, 'little'))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    values = []
+    for i, word in enumerate(words):
+        base = i << 6
+        while word:
+            low = word & -word
+            values.append(base + low.bit_length() - 1)
+            word ^= low
+    return values
+
+
+def _cardinality(container):
+    return len(container) if isinstance(container, array) else container.bit_count()
+
+
+def _contains(container, value):
+    if isinstance(container, array):
+        i = bisect_left(container, value)
+        return i < len(container) and container[i] == value
+    return bool(container >> value & 1)
+
+
+def _intersect(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        bits = a & b
+        return _to_container(_values(bits)) if bits.bit_count() <= ARRAY_MAX else bits
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return array('H', [value for value in a if b >> value & 1])
+    return array('H', sorted(set(a).intersection(b)))
+
+
+def _union(a, b):
+    if isinstance(a, int) or isinstance(b, int):
+        bits = (a if isinstance(a, int) else _to_int(a)) | (b if isinstance(b, int) else _to_int(b))
+        return bits
+    return _to_container(set(a).union(b))
+
+
+def _copy(container):
+    return container if isinstance(container, int) else array('H', container)
+
+
+def _to_int(values):
+    bits = 0
+    for value in values:
+        bits |= 1 << value
+    return bits
+
+
+class Bitmap:
+    """
+    Compressed set of non-negative ints in the style of roaring bitmaps:
+    values are split into 2^16 chunks by their high bits, and each chunk is
+    stored as a sorted uint16 array while it holds at most 4096 values and
+    as a bitset (a Python int) once it is denser. Intersections only visit
+    chunks present on both sides.
+    """
+    __slots__ = ('chunks',)
+
+    def __init__(self, values=()):
+        grouped = defaultdict(list)
+        for value in values:
+            grouped[value >> CHUNK_BITS].append(value & LOW_MASK)
+        self.chunks = {high: _to_container(set(lows)) for high, lows in grouped.items()}
+
+    @classmethod
+    def _from_chunks(cls, chunks):
+        bitmap = cls()
+        bitmap.chunks = {high: c for high, c in chunks.items() if _cardinality(c)}
+        return bitmap
+
+    def add(self, value):
+        high, low = value >> CHUNK_BITS, value & LOW_MASK
+        container = self.chunks.get(high)
+        if container is None:
+            self.chunks[high] = array('H', [low])
+        elif isinstance(container, int):
+            self.chunks[high] = container | (1 << low)
+        elif not _contains(container, low):
+            if len(container) < ARRAY_MAX:
+                insort(container, low)
+            else:
+                self.chunks[high] = _to_int(container) | (1 << low)
+
+    def discard(self, value):
+        high, low = value >> CHUNK_BITS, value & LOW_MASK
+        container = self.chunks.get(high)
+        if container is None or not _contains(container, low):
+            return
+        if isinstance(container, int):
+            container &= ~(1 << low)
+            if container.bit_count() <= ARRAY_MAX:
+                container = _to_container(_values(container))
+        else:
+            del container[bisect_left(container, low)]
+        if _cardinality(container):
+            self.chunks[high] = container
+        else:
+            del self.chunks[high]
+
+    def __contains__(self, value):
+        container = self.chunks.get(value >> CHUNK_BITS)
+        return container is not None and _contains(container, value & LOW_MASK)
+
+    def __len__(self):
+        return sum(_cardinality(container) for container in self.chunks.values())
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def __iter__(self):
+        for high in sorted(self.chunks):
+            base = high << CHUNK_BITS
+            for low in _values(self.chunks[high]):
+                yield base | low
+
+    def __and__(self, other):
+        return Bitmap._from_chunks({
+            high: _intersect(container, other.chunks[high])
+            for high, container in self.chunks.items() if high in other.chunks
+        })
+
+    def __or__(self, other):
+        # Arrays are updated in place by add/discard, so none are shared with the operands.
+        chunks = {high: _copy(container) for high, container in self.chunks.items()}
+        for high, container in other.chunks.items():
+            chunks[high] = _union(chunks[high], container) if high in chunks else _copy(container)
+        return Bitmap._from_chunks(chunks)
+
+    def intersection_len(self, other):
+        return sum(
+            _cardinality(_intersect(container, other.chunks[high]))
+            for high, container in self.chunks.items() if high in other.chunks
+        )
+
+    @classmethod
+    def intersection(cls, bitmaps):
+        bitmaps = sorted(bitmaps, key=len)
+        if not bitmaps:
+            return cls()
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            if not result:
+                break
+            result = result & bitmap
+        return result
+
+    @classmethod
+    def union(cls, bitmaps):
+        result = cls()
+        for bitmap in bitmaps:
+            result = result | bitmap
+        return result
+
+
+class FacetIndex:
+    """
+    Bitmaps of document ordinals per (field, value) of the indexed metadata,
+    e.g. ('tags', 'python') or ('category', 3). List-valued fields index
+    every element.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+        self.bitmaps = {field: {} for field in fields}
+
+    def _field_values(self, meta, field):
+        value = meta.get(field)
+        if value is None:
+            return []
+        return value if isinstance(value, (list, tuple, set)) else [value]
+
+    def add(self, ordinal, meta):
+        for field in self.fields:
+            for value in self._field_values(meta, field):
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is None:
+                    bitmap = self.bitmaps[field][value] = Bitmap()
+                bitmap.add(ordinal)
+
+    def remove(self, ordinal, meta):
+        for field in self.fields:
+            for value in self._field_values(meta, field):
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is not None:
+                    bitmap.discard(ordinal)
+                    if not bitmap:
+                        del self.bitmaps[field][value]
+
+    def get(self, field, value):
+        return self.bitmaps[field].get(value) or Bitmap()
+
+    def counts(self, field, ordinals, meta):
+        """
+        {value: documents among `ordinals` having it}. Walks the result's
+        metadata when the result is smaller than the number of distinct
+        values, and intersects the value bitmaps otherwise.
+        """
+        values = self.bitmaps[field]
+        counts = defaultdict(int)
+        if len(ordinals) < len(values):
+            for ordinal in ordinals:
+                for value in self._field_values(meta[ordinal], field):
+                    counts[value] += 1
+        else:
+            for value, bitmap in values.items():
+                n = ordinals.intersection_len(bitmap)
+                if n:
+                    counts[value] = n
+        return dict(counts)
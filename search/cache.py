@@ -0,0 +1,112 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .text import normalize
+
+NAMESPACES = ('posts', 'media', 'tags', 'categories')
+GENERATION_KEY = 'search:gen:{}'
+RESULT_KEY = 'search:result:{}'
+STATS_KEY = 'search:stats:{}:{}'
+
+
+def get_cache():
+    return caches[settings.SEARCH_CACHE_ALIAS]
+
+
+def normalize_query(query):
+    return ' '.join(normalize(query).split())
+
+
+def generations(models):
+    """
+    Current generation of each model. A missing counter (never set, or
+    evicted) restarts from the clock rather than from 1, so entries cached
+    under an earlier generation can never match again.
+    """
+    cache = get_cache()
+    keys = [GENERATION_KEY.format(model) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump_generations(*models):
+    """Invalidates cached results that depend on `models` once the write commits."""
+    def bump():
+        cache = get_cache()
+        for model in models:
+            key = GENERATION_KEY.format(model)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def record(namespace, outcome):
+    cache = get_cache()
+    key = STATS_KEY.format(namespace, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def cached_result(namespace, params, models, compute):
+    """
+    Returns compute() for this (namespace, params), reusing a cached result
+    while none of `models` has been written since. `params` must already be
+    normalized (query via normalize_query, lists sorted). compute() may
+    return None for results too large to cache; None is returned as is.
+    """
+    cache = get_cache()
+    payload = json.dumps(
+        [namespace, settings.SEARCH_BACKEND, params, generations(models)],
+        sort_keys=True, default=str
+    )
+    key = RESULT_KEY.format(hashlib.sha1(payload.encode()).hexdigest())
+
+    result = cache.get(key)
+    if result is not None:
+        record(namespace, 'hits')
+        return result
+
+    record(namespace, 'misses')
+    result = compute()
+    if result is not None:
+        cache.set(key, result, settings.SEARCH_CACHE_TIMEOUT)
+    return result
+
+
+def capped_ids(queryset):
+    """
+    {'hits': [...]} with the rows of a queryset or index hit list, or
+    {'hits': None} when there are more than SEARCH_CACHE_MAX_RESULTS.
+    Caching the None lets the next request go straight to the paginated
+    queryset (or a fresh index search) instead of fetching the ids again.
+    """
+    rows = list(queryset[:settings.SEARCH_CACHE_MAX_RESULTS + 1])
+    return {'hits': rows if len(rows) <= settings.SEARCH_CACHE_MAX_RESULTS else None}
+
+
+def stats():
+    cache = get_cache()
+    keys = [STATS_KEY.format(namespace, outcome) for namespace in NAMESPACES for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    result = {}
+    for namespace in NAMESPACES:
+        hits = values.get(STATS_KEY.format(namespace, 'hits'), 0)
+        misses = values.get(STATS_KEY.format(namespace, 'misses'), 0)
+        total = hits + misses
+        result[namespace] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+    return result
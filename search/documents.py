@@ -0,0 +1,69 @@
+from collections import Counter
+
+from media.models import normalize_category, split_tags
+
+from .text import tokenize
+
+TITLE_WEIGHT = 2
+
+
+def weighted_terms(*fields):
+    """Counter of terms over (text, weight) pairs; title terms count double."""
+    terms = Counter()
+    for text, weight in fields:
+        for term in tokenize(text):
+            terms[term] += weight
+    return terms
+
+
+class PostDocuments:
+    name = 'posts'
+    facet_fields = ('category', 'tags')
+
+    def queryset(self):
+        from post.models import Post
+
+        return Post.objects.filter(is_published=True).order_by('created_at', 'id').only(
+            'id', 'title', 'content', 'category_id', 'created_at'
+        ).prefetch_related('tags')
+
+    def document(self, post):
+        terms = weighted_terms((post.title, TITLE_WEIGHT), (post.content, 1))
+        meta = {
+            'category': post.category_id,
+            'tags': sorted({tag.name.lower() for tag in post.tags.all()}),
+            'created': post.created_at.timestamp(),
+        }
+        return terms, meta
+
+
+class MediaDocuments:
+    name = 'media'
+    facet_fields = ('category', 'tags')
+
+    def queryset(self):
+        from media.models import Media
+
+        return Media.objects.order_by('uploaded_at', 'id').only(
+            'id', 'title', 'description', 'category', 'tags', 'is_video', 'views', 'likes', 'length',
+            'actor_id', 'uploaded_at'
+        )
+
+    def document(self, media):
+        terms = weighted_terms(
+            (media.title, TITLE_WEIGHT), (media.description, 1), (media.tags, 1), (media.category, 1)
+        )
+        meta = {
+            'is_video': media.is_video,
+            'views': media.views,
+            'likes': media.likes,
+            'length': media.length,
+            'uploaded_at': media.uploaded_at.timestamp(),
+            'actor': media.actor_id,
+            'category': normalize_category(media.category) or None,
+            'tags': split_tags(media.tags),
+        }
+        return terms, meta
+
+
+SOURCES = {source.name: source for source in (PostDocuments(), MediaDocuments())}
@@ -0,0 +1,189 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bitmap import Bitmap
+from .documents import SOURCES
+from .index import InvertedIndex
+from .text import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Changes are re-read from a little before the last sync, so a transaction
+# that committed late with an older created_at is not missed.
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+
+def search_enabled():
+    return settings.SEARCH_BACKEND == 'index'
+
+
+def snapshot_path(name):
+    return os.path.join(settings.SEARCH_INDEX_DIR, f'{name}.snapshot')
+
+
+class SearchIndex:
+    """
+    One source's InvertedIndex plus the time it was last synced with the
+    database. Reads and incremental updates share a lock.
+    """
+    def __init__(self, source, index, synced_at):
+        self.source = source
+        self.index = index
+        self.synced_at = synced_at
+        self.checked_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls, source, chunk_size=2000):
+        synced_at = timezone.now()
+        index = InvertedIndex(source.facet_fields)
+        for obj in source.queryset().iterator(chunk_size=chunk_size):
+            index.add(obj.pk, *source.document(obj))
+        return cls(source, index, synced_at)
+
+    @classmethod
+    def load(cls, source):
+        with open(snapshot_path(source.name), 'rb') as f:
+            snapshot = pickle.load(f)
+        index = InvertedIndex.load(snapshot['documents'], source.facet_fields)
+        return cls(source, index, snapshot['synced_at'])
+
+    def save(self):
+        with self.lock:
+            snapshot = {'synced_at': self.synced_at, 'documents': self.index.dump()}
+        path = snapshot_path(self.source.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def search(self, query, where=None, order=None, all_of=(), any_of=(), facet_fields=()):
+        """
+        Returns ([(doc_id, score), ...], facets) for documents matching every
+        query term, by relevance or by the metadata field named in `order`
+        ('-views' for descending), ties staying in relevance order.
+
+        `all_of` and `any_of` are (field, value) pairs of facet fields the
+        documents must all have / have at least one of; they are resolved
+        as bitmap intersections and unions before any scoring. `facets`
+        holds {field: {value: count}} over the whole result for each of
+        `facet_fields`.
+        """
+        terms = tokenize(query)
+        if not terms and not all_of and not any_of:
+            return [], {}
+        with self.lock:
+            facets = self.index.facets
+            within = None
+            if all_of or any_of:
+                bitmaps = [facets.get(field, value) for field, value in all_of]
+                if any_of:
+                    bitmaps.append(Bitmap.union(facets.get(field, value) for field, value in any_of))
+                within = Bitmap.intersection(bitmaps)
+
+            results = self.index.search(terms, where, within)
+            if order:
+                field = order.lstrip('-')
+                meta = self.index.meta
+                results.sort(key=lambda item: meta[item[0]].get(field, 0), reverse=order.startswith('-'))
+
+            counts = {}
+            if facet_fields:
+                ordinals = Bitmap(ordinal for ordinal, score in results)
+                counts = {field: facets.counts(field, ordinals, self.index.meta) for field in facet_fields}
+            return [(self.index.doc_ids[ordinal], score) for ordinal, score in results], counts
+
+    def refresh(self, doc_ids):
+        """Re-reads documents from the database; missing ones are removed."""
+        doc_ids = set(doc_ids)
+        objs = {obj.pk: obj for obj in self.source.queryset().filter(pk__in=doc_ids)}
+        with self.lock:
+            for doc_id in doc_ids:
+                if doc_id in objs:
+                    self.index.add(doc_id, *self.source.document(objs[doc_id]))
+                else:
+                    self.index.remove(doc_id)
+            if self.index.holes > len(self.index.doc_ids) * settings.SEARCH_INDEX_MAX_HOLE_RATIO:
+                # Replaced and removed documents leave empty ordinals behind.
+                self.index = self.index.compacted()
+
+    def catch_up(self):
+        from .models import IndexChange
+
+        started_at = timezone.now()
+        doc_ids = set(IndexChange.objects.filter(
+            index=self.source.name, created_at__gte=self.synced_at - CATCH_UP_OVERLAP
+        ).values_list('doc_id', flat=True))
+        if doc_ids:
+            self.refresh(doc_ids)
+        self.synced_at = started_at
+        self.checked_at = time.monotonic()
+
+    def is_stale(self):
+        # Older than the change log retention: changes may have been pruned.
+        retention = timedelta(seconds=settings.SEARCH_INDEX_CHANGE_RETENTION)
+        return timezone.now() - self.synced_at > retention
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name):
+    """
+    Returns the process's index for `name`, loading the snapshot (or
+    building from the database) on first use and tailing the change log at
+    most every SEARCH_INDEX_REFRESH_INTERVAL seconds after that.
+    """
+    with _indexes_lock:
+        search_index = _indexes.get(name)
+        if search_index is None:
+            source = SOURCES[name]
+            try:
+                search_index = SearchIndex.load(source)
+            except FileNotFoundError:
+                search_index = None
+            if search_index is None or search_index.is_stale():
+                search_index = SearchIndex.build(source)
+            else:
+                search_index.catch_up()
+            _indexes[name] = search_index
+        elif time.monotonic() - search_index.checked_at > settings.SEARCH_INDEX_REFRESH_INTERVAL:
+            if search_index.is_stale():
+                search_index = _indexes[name] = SearchIndex.build(search_index.source)
+            else:
+                search_index.catch_up()
+        return search_index
+
+
+def loaded_index(name):
+    """The process's index for `name` if it has been loaded, without loading it."""
+    return _indexes.get(name)
+
+
+def record_changes(name, doc_ids):
+    """
+    Logs written documents for other processes and, once the write
+    commits, re-reads them into this process's index if one is loaded.
+    """
+    from .models import IndexChange
+
+    doc_ids = list(doc_ids)
+    if not search_enabled() or not doc_ids:
+        return
+    IndexChange.objects.bulk_create([IndexChange(index=name, doc_id=doc_id) for doc_id in doc_ids])
+
+    def apply():
+        search_index = loaded_index(name)
+        if search_index is not None:
+            search_index.refresh(doc_ids)
+
+    transaction.on_commit(apply)
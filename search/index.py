@@ -0,0 +1,171 @@
+import math
+from collections import Counter, defaultdict
+
+from .bitmap import Bitmap, FacetIndex
+from .text import is_cjk
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking.
+
+    Documents get dense ordinals; postings map term -> {ordinal: weighted
+    term frequency}. The per-document term counts are kept as well so a
+    document can be removed or replaced without a full scan. Removed
+    ordinals are left empty and dropped when the index is compacted.
+
+    A lone CJK character is only a term where it stands alone (runs are
+    indexed as bigrams), so for queries it is widened to the indexed
+    bigrams containing it, kept per character in `cjk_bigrams`.
+
+    Metadata fields listed in `facet_fields` are also indexed as bitmaps
+    of ordinals, for filtering and facet counts.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, facet_fields=()):
+        self.doc_ids = []
+        self.ordinal_of = {}
+        self.doc_terms = []
+        self.doc_lengths = []
+        self.meta = []
+        self.postings = defaultdict(dict)
+        self.cjk_bigrams = defaultdict(set)
+        self.total_length = 0
+        self.live = Bitmap()
+        self.facets = FacetIndex(facet_fields)
+
+    def __len__(self):
+        return len(self.ordinal_of)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.ordinal_of
+
+    @property
+    def holes(self):
+        """Ordinals left empty by removed or replaced documents."""
+        return len(self.doc_ids) - len(self.ordinal_of)
+
+    def add(self, doc_id, terms, meta=None):
+        """Indexes a document; `terms` is a Counter of term -> weighted frequency."""
+        self.remove(doc_id)
+        ordinal = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.ordinal_of[doc_id] = ordinal
+        self.doc_terms.append(terms)
+        length = sum(terms.values())
+        self.doc_lengths.append(length)
+        self.meta.append(meta or {})
+        self.total_length += length
+        self.live.add(ordinal)
+        self.facets.add(ordinal, self.meta[ordinal])
+        for term, tf in terms.items():
+            if term not in self.postings and len(term) == 2 and is_cjk(term):
+                for char in term:
+                    self.cjk_bigrams[char].add(term)
+            self.postings[term][ordinal] = tf
+        return ordinal
+
+    def remove(self, doc_id):
+        ordinal = self.ordinal_of.pop(doc_id, None)
+        if ordinal is None:
+            return None
+        for term in self.doc_terms[ordinal]:
+            postings = self.postings[term]
+            postings.pop(ordinal, None)
+            if not postings:
+                del self.postings[term]
+                if term in self.cjk_bigrams.get(term[0], ()):
+                    for char in set(term):
+                        self.cjk_bigrams[char].discard(term)
+                        if not self.cjk_bigrams[char]:
+                            del self.cjk_bigrams[char]
+        self.total_length -= self.doc_lengths[ordinal]
+        self.live.discard(ordinal)
+        self.facets.remove(ordinal, self.meta[ordinal])
+        self.doc_ids[ordinal] = None
+        self.doc_terms[ordinal] = Counter()
+        self.doc_lengths[ordinal] = 0
+        self.meta[ordinal] = {}
+        return ordinal
+
+    def term_postings(self, term):
+        """{ordinal: tf} of a query term, widened for a lone CJK character."""
+        postings = self.postings.get(term)
+        bigrams = self.cjk_bigrams.get(term) if len(term) == 1 else None
+        if not bigrams:
+            return postings
+        widened = dict(postings or {})
+        for bigram in bigrams:
+            for ordinal, tf in self.postings[bigram].items():
+                widened[ordinal] = widened.get(ordinal, 0) + tf
+        return widened
+
+    def match(self, terms):
+        """Ordinals of the documents containing every term, rarest term first."""
+        postings = [self.term_postings(term) for term in set(terms)]
+        if not postings or not all(postings):
+            return set()
+        postings.sort(key=len)
+        matched = set(postings[0])
+        for other in postings[1:]:
+            matched.intersection_update(other)
+            if not matched:
+                break
+        return matched
+
+    def score(self, terms, ordinals):
+        """BM25 scores {ordinal: score} of `ordinals` for the query terms."""
+        n = len(self)
+        avgdl = self.total_length / n if n else 0.0
+        scores = dict.fromkeys(ordinals, 0.0)
+        for term, qtf in Counter(terms).items():
+            postings = self.term_postings(term) or {}
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for ordinal in ordinals:
+                tf = postings.get(ordinal)
+                if tf:
+                    norm = 1 - self.b + self.b * self.doc_lengths[ordinal] / avgdl if avgdl else 1.0
+                    scores[ordinal] += qtf * idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def search(self, terms, where=None, within=None):
+        """
+        Returns [(ordinal, score), ...] for the documents matching all terms
+        (every live document when there are none), best first, ties in
+        ordinal (indexing) order. `within` restricts the result to a Bitmap
+        of ordinals and `where` filters on the document metadata.
+        """
+        if terms:
+            ordinals = self.match(terms)
+            if within is not None:
+                ordinals = {ordinal for ordinal in ordinals if ordinal in within}
+        else:
+            ordinals = set(self.live if within is None else within)
+        if where is not None:
+            ordinals = {ordinal for ordinal in ordinals if where(self.meta[ordinal])}
+        scores = self.score(terms, ordinals)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def compacted(self):
+        """A copy without the holes left by removed documents."""
+        index = type(self)(self.facets.fields)
+        for ordinal, doc_id in enumerate(self.doc_ids):
+            if doc_id is not None:
+                index.add(doc_id, self.doc_terms[ordinal], self.meta[ordinal])
+        return index
+
+    def dump(self):
+        return [
+            (doc_id, dict(self.doc_terms[ordinal]), self.meta[ordinal])
+            for ordinal, doc_id in enumerate(self.doc_ids) if doc_id is not None
+        ]
+
+    @classmethod
+    def load(cls, documents, facet_fields=()):
+        index = cls(facet_fields)
+        for doc_id, terms, meta in documents:
+            index.add(doc_id, Counter(terms), meta)
+        return index
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from search.documents import SOURCES
+from search.engine import SearchIndex
+from search.models import IndexChange
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search index snapshots from the database and prunes the change log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', choices=sorted(SOURCES), action='append',
+                            help='Index to rebuild (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        for name in options['index'] or sorted(SOURCES):
+            search_index = SearchIndex.build(SOURCES[name], options['chunk_size'])
+            search_index.save()
+            self.stdout.write(f'Indexed {len(search_index.index)} {name} documents')
+
+        retention = timedelta(seconds=settings.SEARCH_INDEX_CHANGE_RETENTION)
+        pruned, _ = IndexChange.objects.filter(created_at__lt=timezone.now() - retention).delete()
+        self.stdout.write(f'Pruned {pruned} change log entries')
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class IndexChange(models.Model):
+    """
+    Documents written since the last snapshot. Every process tails this log
+    to bring its in-memory index up to date with writes handled by others.
+    """
+    index = models.CharField(max_length=20)
+    doc_id = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.index}:{self.doc_id}'
@@ -0,0 +1,102 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from media.models import Media
+from pororohub.counters import views_flushed
+from post.models import Category, Post, Tag
+
+from .autocomplete import update_entry
+from .cache import bump_generations
+from .engine import loaded_index, record_changes
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def index_post(sender, instance, **kwargs):
+    record_changes('posts', [instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        record_changes('posts', [instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        record_changes('posts', pk_set)
+    elif reverse and action == 'pre_clear':
+        record_changes('posts', instance.posts.values_list('pk', flat=True))
+
+
+# Posts carry tag names for filtering, so renaming or deleting a tag
+# re-reads the posts that have it.
+@receiver(post_save, sender=Tag)
+def index_tag_posts(sender, instance, created, **kwargs):
+    if not created:
+        record_changes('posts', instance.posts.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def index_deleted_tag_posts(sender, instance, **kwargs):
+    record_changes('posts', instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Media)
+@receiver(post_delete, sender=Media)
+def index_media(sender, instance, **kwargs):
+    record_changes('media', [instance.pk])
+
+
+@receiver(views_flushed, sender=Media)
+def update_media_views(sender, counts, **kwargs):
+    # View counts only order results, so they are bumped in place in the
+    # flushing process and refreshed elsewhere on the next document change.
+    search_index = loaded_index('media')
+    if search_index is None:
+        return
+    with search_index.lock:
+        for doc_id, amount in counts.items():
+            ordinal = search_index.index.ordinal_of.get(doc_id)
+            if ordinal is not None:
+                search_index.index.meta[ordinal]['views'] += amount
+
+
+@receiver(post_save, sender=Tag)
+def autocomplete_tag(sender, instance, **kwargs):
+    update_entry('tags', instance.pk, instance.name)
+
+
+@receiver(post_save, sender=Category)
+def autocomplete_category(sender, instance, **kwargs):
+    update_entry('categories', instance.pk, instance.name, instance.post_count)
+
+
+@receiver(post_save, sender=Post)
+def autocomplete_post(sender, instance, **kwargs):
+    if instance.is_published:
+        update_entry('posts', instance.pk, instance.title, instance.like_count)
+    else:
+        update_entry('posts', instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Post)
+def autocomplete_delete(sender, instance, **kwargs):
+    kind = {Tag: 'tags', Category: 'categories', Post: 'posts'}[sender]
+    update_entry(kind, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Media)
+@receiver(post_delete, sender=Media)
+def invalidate_cached_results(sender, **kwargs):
+    if sender is Post.tags.through:
+        if not kwargs['action'].startswith('post_'):
+            return
+        sender = Post
+    bump_generations({Post: 'post', Tag: 'tag', Category: 'category', Media: 'media'}[sender])
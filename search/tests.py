@@ -0,0 +1,201 @@
+import math
+import random
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from post.models import Post, Tag
+from .autocomplete import PrefixIndex
+from .cache import bump_generations, cached_result, capped_ids, get_cache
+from .bitmap import ARRAY_MAX, Bitmap
+from .index import InvertedIndex
+from .text import highlight, tokenize
+
+
+def build_index(documents):
+    index = InvertedIndex()
+    for doc_id, text in documents.items():
+        index.add(doc_id, Counter(tokenize(text)))
+    return index
+
+
+class BM25Tests(SimpleTestCase):
+    def test_score_matches_the_formula(self):
+        index = build_index({'a': 'cat cat dog', 'b': 'cat bird bird bird', 'c': 'dog'})
+        n, avgdl = 3, 8 / 3
+        df = 2
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        def expected(tf, length):
+            norm = 1 - index.b + index.b * length / avgdl
+            return idf * tf * (index.k1 + 1) / (tf + index.k1 * norm)
+
+        results = dict((index.doc_ids[ordinal], score) for ordinal, score in index.search(['cat']))
+        self.assertAlmostEqual(results['a'], expected(2, 3))
+        self.assertAlmostEqual(results['b'], expected(1, 4))
+        self.assertEqual([index.doc_ids[ordinal] for ordinal, score in index.search(['cat'])], ['a', 'b'])
+
+    def test_every_term_must_match(self):
+        index = build_index({'a': 'cat dog', 'b': 'cat', 'c': 'dog'})
+        self.assertEqual([index.doc_ids[ordinal] for ordinal, score in index.search(['cat', 'dog'])], ['a'])
+        self.assertEqual(index.search(['cat', 'fish']), [])
+
+    def test_removed_documents_leave_holes_until_compacted(self):
+        index = build_index({'a': 'cat', 'b': 'cat dog', 'c': 'dog'})
+        index.add('a', Counter(['dog']))
+        index.remove('b')
+        self.assertEqual(index.holes, 2)
+
+        compacted = index.compacted()
+        self.assertEqual(compacted.holes, 0)
+        for terms in (['cat'], ['dog']):
+            self.assertEqual(
+                sorted((index.doc_ids[o], round(s, 9)) for o, s in index.search(terms)),
+                sorted((compacted.doc_ids[o], round(s, 9)) for o, s in compacted.search(terms)),
+            )
+
+    def test_single_cjk_character_matches_bigrams(self):
+        index = build_index({'a': '고양이가 좋아', 'b': '사고 났다', 'c': 'cat'})
+        self.assertEqual(sorted(index.doc_ids[o] for o, s in index.search(tokenize('고'))), ['a', 'b'])
+        index.remove('b')
+        self.assertEqual([index.doc_ids[o] for o, s in index.search(tokenize('고'))], ['a'])
+        self.assertNotIn('사', index.cjk_bigrams)
+
+
+class HighlightTests(SimpleTestCase):
+    def test_text_is_escaped_and_words_are_marked(self):
+        self.assertEqual(
+            highlight('<b>Cat</b> & cat', 'cat'),
+            '&lt;b&gt;<mark>Cat</mark>&lt;/b&gt; &amp; <mark>cat</mark>',
+        )
+
+    def test_without_query_words(self):
+        self.assertEqual(highlight('<script>', ''), '&lt;script&gt;')
+
+
+class BitmapTests(SimpleTestCase):
+    def setUp(self):
+        self.random = random.Random(7)
+
+    def sample(self, size, high=300000):
+        return set(self.random.sample(range(high), size))
+
+    def test_matches_set_operations(self):
+        # Sizes that put chunks on both sides of ARRAY_MAX, i.e. arrays and bitsets.
+        for a_size, b_size in ((10, 10), (ARRAY_MAX * 2, 50), (ARRAY_MAX * 5, ARRAY_MAX * 6)):
+            a, b = self.sample(a_size), self.sample(b_size)
+            left, right = Bitmap(a), Bitmap(b)
+            self.assertEqual(list(left), sorted(a))
+            self.assertEqual(list(left & right), sorted(a & b))
+            self.assertEqual(list(left | right), sorted(a | b))
+            self.assertEqual(left.intersection_len(right), len(a & b))
+            self.assertEqual(len(left), len(a))
+
+    def test_add_and_discard_across_container_kinds(self):
+        values = set()
+        bitmap = Bitmap()
+        for value in self.random.sample(range(1 << 16), ARRAY_MAX + 100):
+            bitmap.add(value)
+            values.add(value)
+        self.assertIsInstance(bitmap.chunks[0], int)
+        self.assertEqual(list(bitmap), sorted(values))
+
+        for value in self.random.sample(sorted(values), 2000):
+            bitmap.discard(value)
+            values.discard(value)
+        self.assertEqual(list(bitmap), sorted(values))
+        self.assertNotIsInstance(bitmap.chunks[0], int)
+        bitmap.discard(max(values) + 1)
+        self.assertEqual(len(bitmap), len(values))
+
+    def test_union_does_not_share_containers(self):
+        left, right = Bitmap([1, 2]), Bitmap([70000])
+        union = left | right
+        left.add(3)
+        right.add(70001)
+        self.assertEqual(list(union), [1, 2, 70000])
+
+    def test_intersection_of_many(self):
+        sets = [self.sample(5000, 20000) for _ in range(3)]
+        self.assertEqual(list(Bitmap.intersection([Bitmap(s) for s in sets])), sorted(set.intersection(*sets)))
+        self.assertEqual(list(Bitmap.union([Bitmap(s) for s in sets])), sorted(set.union(*sets)))
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def test_matches_word_starts_by_popularity(self):
+        index = PrefixIndex([(1, 'Cat videos', 3), (2, '오늘의 고양이', 5), (3, 'catalog', 9), (4, 'dog', 1)])
+        self.assertEqual([item_id for item_id, label, score in index.complete('cat', 5)], [3, 1])
+        self.assertEqual([item_id for item_id, label, score in index.complete('고양', 5)], [2])
+        self.assertEqual(index.complete('vid', 5), [(1, 'Cat videos', 3)])
+        self.assertEqual(index.complete('  ', 5), [])
+
+    def test_add_rename_and_remove(self):
+        index = PrefixIndex([(1, 'alpha', 1)])
+        index.add(1, 'beta', 1)
+        index.add(2, 'alpine', 2)
+        self.assertEqual([item_id for item_id, label, score in index.complete('al', 5)], [2])
+        index.remove(2)
+        self.assertEqual(index.complete('al', 5), [])
+        self.assertEqual(len(index.keys), 1)
+
+
+class AutocompleteEndpointTests(TestCase):
+    def test_local_writes_apply_without_a_rebuild(self):
+        user = User.objects.create_user('typeahead', 'typeahead@example.com', 'pw')
+        Post.objects.create(user=user, title='Quokka diaries', content='c')
+        with mock.patch('search.autocomplete._autocomplete', None):
+            client = APIClient()
+            response = client.get('/post/search/autocomplete/', {'q': 'quok'})
+            self.assertEqual([item['text'] for item in response.data['posts']], ['Quokka diaries'])
+            self.assertEqual(response.data['tags'], [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Tag.objects.create(name='quokkas')
+            response = client.get('/post/search/autocomplete/', {'q': 'QUOK', 'limit': 'x'})
+            self.assertEqual([item['text'] for item in response.data['tags']], ['quokkas'])
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def test_results_are_reused_until_a_model_generation_changes(self):
+        compute = mock.Mock(side_effect=[{'hits': [1]}, {'hits': [2]}])
+        lookup = lambda: cached_result('posts', {'q': 'x'}, ('post', 'tag'), compute)
+        self.assertEqual(lookup(), {'hits': [1]})
+        self.assertEqual(lookup(), {'hits': [1]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_generations('media')
+        self.assertEqual(lookup(), {'hits': [1]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_generations('tag')
+        self.assertEqual(lookup(), {'hits': [2]})
+        self.assertEqual(compute.call_count, 2)
+
+    def test_evicted_generations_never_match_old_entries(self):
+        compute = mock.Mock(side_effect=[{'hits': [1]}, {'hits': [2]}])
+        lookup = lambda: cached_result('posts', {'q': 'x'}, ('post',), compute)
+        lookup()
+        get_cache().delete('search:gen:post')
+        self.assertEqual(lookup(), {'hits': [2]})
+
+    @override_settings(SEARCH_CACHE_MAX_RESULTS=2)
+    def test_long_result_lists_are_not_stored(self):
+        self.assertEqual(capped_ids([1, 2]), {'hits': [1, 2]})
+        self.assertEqual(capped_ids([1, 2, 3]), {'hits': None})
+
+    @override_settings(SEARCH_BACKEND='database')
+    def test_writes_invalidate_cached_searches(self):
+        user = User.objects.create_user('cached', 'cached@example.com', 'pw')
+        client = APIClient()
+        Post.objects.create(user=user, title='gecko', content='c')
+        self.assertEqual(len(client.get('/post/search/', {'q': 'gecko'}).data['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(user=user, title='gecko again', content='c')
+        self.assertEqual(len(client.get('/post/search/', {'q': 'gecko'}).data['results']), 2)
@@ -0,0 +1,56 @@
+import html
+import re
+import unicodedata
+
+WORD_RE = re.compile(r'[^\W_]+')
+# Hangul syllables and jamo, CJK ideographs, kana
+CJK_RUN_RE = re.compile(r'([ᄀ-ᇿ぀-ヿ㄰-㆏㐀-鿿가-힣]+)')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """
+    Splits text into index terms. Latin and digit runs are kept as words;
+    CJK runs become overlapping bigrams, so '고양이가' yields '고양', '양이',
+    '이가' and a query for '고양이' matches without a morphological analyzer.
+    """
+    terms = []
+    for word in WORD_RE.findall(normalize(text)):
+        for i, run in enumerate(CJK_RUN_RE.split(word)):
+            if not run:
+                continue
+            if i % 2 == 0 or len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[j:j + 2] for j in range(len(run) - 1))
+    return terms
+
+
+def is_cjk(term):
+    return CJK_RUN_RE.fullmatch(term) is not None
+
+
+def highlight(text, query, width=120, start_sel='<mark>', stop_sel='</mark>'):
+    """
+    HTML snippet of `text` around the first query word, with query words
+    marked. The text itself is escaped; only the markers are markup.
+    """
+    text = text or ''
+    words = sorted({word for word in normalize(query).split() if word}, key=len, reverse=True)
+    if not words:
+        return html.escape(text[:width])
+
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(0, match.start() - width // 3) if match else 0
+    snippet = text[start:start + width]
+    parts, end = [], 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[end:match.start()]))
+        parts.append(f'{start_sel}{html.escape(match.group(0))}{stop_sel}')
+        end = match.end()
+    parts.append(html.escape(snippet[end:]))
+    return ''.join(parts)